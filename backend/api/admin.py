@@ -0,0 +1,81 @@
+from fastapi import APIRouter, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import logging
+from backend.models.schemas import ProfileRequest
+from backend.core.profiling import profiler
+from backend.core.reindex import Reindexer, in_progress, read_status
+from backend.config import Config
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# Global variables (will be set by main.py)
+vector_store = None
+reindexer = None
+
+def set_dependencies(vs):
+    global vector_store
+    vector_store = vs
+
+def _check_token(token: Optional[str]):
+    if not Config.ADMIN_TOKEN or token != Config.ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin token required")
+
+@router.post("/admin/profile")
+async def arm_profiler(request: ProfileRequest, x_admin_token: Optional[str] = Header(None)):
+    """Profile the next N /api/chat or /api/upload requests"""
+    _check_token(x_admin_token)
+    profiler.arm(request.requests)
+    logger.info(f"Profiling armed for the next {request.requests} requests")
+    return {"armed": request.requests}
+
+@router.get("/admin/profiles")
+async def list_profiles(x_admin_token: Optional[str] = Header(None)):
+    """List stored request profiles, newest first"""
+    _check_token(x_admin_token)
+    return {"armed": profiler.armed, "profiles": profiler.list_profiles()}
+
+@router.get("/admin/profiles/{profile_id}", response_class=PlainTextResponse)
+async def get_profile(profile_id: str, x_admin_token: Optional[str] = Header(None)):
+    """Folded stacks for flamegraph.pl or speedscope"""
+    _check_token(x_admin_token)
+    path = profiler.profile_path(profile_id)
+    if not path:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    with open(path, "r", encoding="utf-8") as f:
+        return PlainTextResponse(f.read())
+
+@router.post("/admin/reindex")
+async def start_reindex(x_admin_token: Optional[str] = Header(None)):
+    """Rebuild the index under the current settings, then swap it in"""
+    global reindexer
+    _check_token(x_admin_token)
+    if Config.SHARD_COUNT:
+        raise HTTPException(status_code=409, detail="Re-indexing a sharded store is not supported")
+    if in_progress(read_status()):
+        raise HTTPException(status_code=409, detail="A re-index is already running")
+    
+    if vector_store.read_only:
+        # Only the index writer may swap the index; it runs the job
+        vector_store.enqueue_job({"op": "reindex"})
+        logger.info("Queued a re-index for the index writer")
+        return {"started": False, "queued": True}
+    
+    reindexer = reindexer or Reindexer(vector_store)
+    if not reindexer.start():
+        raise HTTPException(status_code=409, detail="A re-index is already running")
+    logger.info("Re-index started")
+    return {"started": True, "queued": False}
+
+@router.get("/admin/reindex")
+async def reindex_status(x_admin_token: Optional[str] = Header(None)):
+    """Re-index phase, progress and throughput, and settings the live index is behind on"""
+    _check_token(x_admin_token)
+    status = read_status()
+    status["stale_settings"] = {
+        key: {"index": index_value, "config": config_value}
+        for key, (index_value, config_value) in vector_store.stale_settings().items()
+    } if not Config.SHARD_COUNT else {}
+    return status
\ No newline at end of file
@@ -1,7 +1,14 @@
-from fastapi import APIRouter, HTTPException
-from backend.models.schemas import ChatRequest, ChatResponse
+from fastapi import APIRouter, HTTPException, Query
+from backend.models.schemas import ChatRequest, ChatResponse, ChatHistoryPage
 from datetime import datetime
+from typing import List, Optional
+import asyncio
 import logging
+import math
+from backend.core.admission import AdmissionRejected
+from backend.core.metrics import request_timings, REQUEST_SECONDS
+from backend.core.resilience import DeadlineExceeded, deadline_scope
+from backend.config import Config
 
 logger = logging.getLogger(__name__)
 
@@ -9,11 +16,16 @@ router = APIRouter()
 
 # Dependencies - would normally be injected
 workflow = None
+history = None
 
 def set_workflow(wf):
     global workflow
     workflow = wf
 
+def set_history(store):
+    global history
+    history = store
+
 @router.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """Handle chat requests"""
@@ -21,28 +33,92 @@ async def chat(request: ChatRequest):
     if not workflow:
         raise HTTPException(status_code=500, detail="Workflow not initialized")
     
+    timeout = Config.CHAT_DEADLINE_SECONDS
+    client_set = bool(request.timeout_seconds) and request.timeout_seconds < timeout
+    if client_set:
+        timeout = request.timeout_seconds
+    
     try:
-        # Process query through workflow
-        result = await workflow.process_query(
-            query=request.query,
-            mode=request.mode,
-            student_id=request.student_id,
-            file_ids=request.file_ids
-        )
+        # Process query through workflow, collecting per-stage timings;
+        # the deadline follows the request into retrieval and generation
+        with request_timings() as timings, deadline_scope(timeout, client_set):
+            result = await workflow.process_query(
+                query=request.query,
+                mode=request.mode,
+                student_id=request.student_id,
+                file_ids=request.file_ids
+            )
+        REQUEST_SECONDS.labels(endpoint="chat").observe(timings["total"] / 1000)
         
-        # Format sources for response
+        # Format sources for response with their retrieval relevance
         sources = [
-            {"source": source, "relevance": 0.8} 
-            for source in result.get("sources", [])
+            {"source": source, "relevance": round(score, 3)}
+            for source, score in zip(result.get("sources", []), result.get("source_scores", []))
         ]
+        content = result.get("content", "No response generated")
+        message_ids = await _record_turn(request, content, sources)
         
         return ChatResponse(
-            response=result.get("content", "No response generated"),
+            response=content,
             sources=sources,
             mode=request.mode,
-            timestamp=datetime.now()
+            timestamp=datetime.now(),
+            timings=timings if request.include_timings else None,
+            degraded=result.get("degraded", False),
+            model_tier=result.get("model_tier"),
+            message_ids=message_ids
         )
         
+    except AdmissionRejected as e:
+        logger.warning(f"Chat request shed: {e}")
+        raise HTTPException(
+            status_code=429,
+            detail=str(e),
+            headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+        )
+    except DeadlineExceeded as e:
+        logger.error(f"Chat deadline exceeded: {e}")
+        raise HTTPException(status_code=504, detail="Chat request timed out")
     except Exception as e:
         logger.error(f"Chat error: {e}")
-        raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Chat processing failed: {str(e)}")
+
+async def _record_turn(request: ChatRequest, content: str, sources: list) -> Optional[List[int]]:
+    """Persist the exchange and return its message ids; best effort, never fails a chat"""
+    if not history:
+        return None
+    try:
+        return await asyncio.to_thread(
+            history.append_turn, request.student_id, request.query, content, request.mode, sources
+        )
+    except Exception as e:
+        logger.error(f"Chat history write error: {e}")
+        return None
+
+@router.get("/chat/history/{student_id}", response_model=ChatHistoryPage)
+async def get_history(
+    student_id: str,
+    before: Optional[int] = Query(None, description="Return messages older than this id"),
+    limit: int = Query(Config.CHAT_HISTORY_PAGE_SIZE, ge=1, le=Config.CHAT_HISTORY_MAX_PAGE_SIZE)
+):
+    """A page of a student's chat history, newest page first"""
+    if not history:
+        raise HTTPException(status_code=503, detail="Chat history not initialized")
+    try:
+        messages, has_more = await asyncio.to_thread(history.page, student_id, before, limit)
+        return ChatHistoryPage(messages=messages, has_more=has_more)
+    except Exception as e:
+        logger.error(f"Chat history read error: {e}")
+        raise HTTPException(status_code=500, detail=f"Could not load chat history: {str(e)}")
+
+@router.delete("/chat/history/{student_id}")
+async def clear_history(student_id: str):
+    """Delete a student's chat history"""
+    if not history:
+        raise HTTPException(status_code=503, detail="Chat history not initialized")
+    try:
+        deleted = await asyncio.to_thread(history.clear, student_id)
+        return {"student_id": student_id, "messages_removed": deleted}
+    except Exception as e:
+        logger.error(f"Chat history delete error: {e}")
+        raise HTTPException(status_code=500, detail=f"Could not clear chat history: {str(e)}")
\ No newline at end of file
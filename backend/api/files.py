@@ -0,0 +1,86 @@
+from fastapi import APIRouter, UploadFile, File, HTTPException
+import asyncio
+import glob
+import os
+import logging
+from backend.models.schemas import UploadResponse, DeleteResponse
+from backend.api.upload import prepare_upload
+from backend.config import Config
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# This would normally be injected via dependency injection
+vector_store = None
+summary_builder = None
+
+def set_dependencies(vs, sb=None):
+    global vector_store, summary_builder
+    vector_store = vs
+    summary_builder = sb
+
+@router.delete("/files/{file_id}", response_model=DeleteResponse)
+async def delete_file(file_id: str):
+    """Remove an uploaded file and all of its chunks from the index"""
+    
+    try:
+        chunks_removed = await asyncio.to_thread(vector_store.delete_file, file_id)
+    except Exception as e:
+        logger.error(f"Delete error: {e}")
+        raise HTTPException(status_code=500, detail=f"Delete failed: {str(e)}")
+    
+    if not chunks_removed:
+        raise HTTPException(status_code=404, detail=f"File {file_id} not found")
+    
+    remove_stored_upload(file_id)
+    if summary_builder:
+        summary_builder.store.delete_file(file_id)
+    
+    return DeleteResponse(
+        success=True,
+        message="File deleted successfully",
+        file_id=file_id,
+        chunks_removed=chunks_removed
+    )
+
+@router.put("/files/{file_id}", response_model=UploadResponse)
+async def replace_file(file_id: str, file: UploadFile = File(...)):
+    """Replace an uploaded file (e.g. a corrected edition) with a new PDF"""
+    
+    if not file.filename.endswith('.pdf'):
+        raise HTTPException(status_code=400, detail="Only PDF files are supported")
+    
+    try:
+        result, documents = await prepare_upload(file)
+        
+        if not documents:
+            raise HTTPException(status_code=400, detail=result.message)
+        
+        success = await asyncio.to_thread(vector_store.replace_file, file_id, documents)
+        
+        if not success:
+            raise HTTPException(status_code=500, detail="Failed to replace file")
+        
+        if result.file_id != file_id:
+            remove_stored_upload(file_id)
+        if summary_builder:
+            summary_builder.store.delete_file(file_id)
+            summary_builder.schedule([result.file_id])
+        
+        result.message = f"File {file_id} replaced successfully"
+        return result
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Replace error: {e}")
+        raise HTTPException(status_code=500, detail=f"Replace failed: {str(e)}")
+
+def remove_stored_upload(file_id: str):
+    """Delete the saved PDF(s) for a file ID from the upload directory"""
+    for path in glob.glob(os.path.join(Config.UPLOAD_DIR, f"{glob.escape(file_id)}_*")):
+        try:
+            os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not remove {path}: {e}")
\ No newline at end of file
@@ -1,10 +1,15 @@
 from fastapi import APIRouter, UploadFile, File, HTTPException
-from PyPDF2 import PdfReader
+from langchain.docstore.document import Document
+from typing import Iterator, List, Tuple
+import asyncio
 import hashlib
 import os
+import uuid
 import logging
-from backend.models.schemas import UploadResponse
+from backend.models.schemas import UploadResponse, BatchUploadResponse, IngestProgress
 from backend.config import Config
+from backend.core.metrics import track_stage, REQUEST_SECONDS
+from backend.core.parents import parent_batches_of
 
 logger = logging.getLogger(__name__)
 
@@ -13,11 +18,13 @@ router = APIRouter()
 # This would normally be injected via dependency injection
 vector_store = None
 embedding_manager = None
+summary_builder = None
 
-def set_dependencies(vs, em):
-    global vector_store, embedding_manager
+def set_dependencies(vs, em, sb=None):
+    global vector_store, embedding_manager, summary_builder
     vector_store = vs
     embedding_manager = em
+    summary_builder = sb
 
 @router.post("/upload", response_model=UploadResponse)
 async def upload_file(file: UploadFile = File(...)):
@@ -27,59 +34,179 @@ async def upload_file(file: UploadFile = File(...)):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
     
     try:
-        # Generate file ID
-        content = await file.read()
-        file_id = hashlib.md5(content).hexdigest()[:10]
-        
-        # Save file
-        file_path = os.path.join(Config.UPLOAD_DIR, f"{file_id}_{file.filename}")
-        with open(file_path, "wb") as f:
-            f.write(content)
-        
-        # Extract text from PDF
-        text = extract_text_from_pdf(content)
-        
-        if not text.strip():
-            raise HTTPException(status_code=400, detail="Could not extract text from PDF")
-        
-        # Create chunks
-        metadata = {
-            "source": file.filename,
-            "file_id": file_id,
-            "file_path": file_path
-        }
-        
-        documents = embedding_manager.create_chunks(text, metadata)
-        
-        # Add to vector store
-        success = vector_store.add_documents(documents)
+        with REQUEST_SECONDS.labels(endpoint="upload").time():
+            result, documents = await prepare_upload(file)
+            
+            if not documents:
+                raise HTTPException(status_code=400, detail=result.message)
+            
+            # Add to vector store
+            with track_stage("index_add"):
+                success = await asyncio.to_thread(vector_store.add_documents, documents)
         
         if success:
-            return UploadResponse(
-                success=True,
-                message="File uploaded and processed successfully",
-                file_id=file_id,
-                chunks_created=len(documents)
-            )
+            if summary_builder:
+                summary_builder.schedule([result.file_id])
+            return result
         else:
             raise HTTPException(status_code=500, detail="Failed to process file")
             
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Upload error: {e}")
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
-def extract_text_from_pdf(content: bytes) -> str:
-    """Extract text from PDF content"""
+@router.post("/upload/batch", response_model=BatchUploadResponse)
+async def upload_batch(files: List[UploadFile] = File(...)):
+    """Upload and process many PDF files in one request"""
+    
+    if not files:
+        raise HTTPException(status_code=400, detail="No files provided")
+    
+    # Bound parallelism so a large course pack cannot exhaust the worker
+    semaphore = asyncio.Semaphore(Config.UPLOAD_CONCURRENCY)
+    
+    async def prepare(file: UploadFile) -> Tuple[UploadResponse, List[Document]]:
+        if not file.filename.endswith('.pdf'):
+            return _failed(file.filename, "Only PDF files are supported"), []
+        async with semaphore:
+            try:
+                return await prepare_upload(file)
+            except HTTPException as e:
+                return _failed(file.filename, e.detail), []
+            except Exception as e:
+                logger.error(f"Batch upload error for {file.filename}: {e}")
+                return _failed(file.filename, f"Upload failed: {str(e)}"), []
+    
+    with REQUEST_SECONDS.labels(endpoint="upload_batch").time():
+        prepared = await asyncio.gather(*(prepare(file) for file in files))
+        
+        # Identical files share a file ID; index only the first copy
+        first_copy, duplicate_of = {}, {}
+        for position, (result, documents) in enumerate(prepared):
+            if not documents:
+                continue
+            if result.file_id in first_copy:
+                duplicate_of[position] = first_copy[result.file_id]
+                for batch in parent_batches_of(documents):
+                    vector_store.parents.delete_batch(batch)
+                prepared[position] = (result, [])
+            else:
+                first_copy[result.file_id] = result.filename
+        
+        # One embedding pass and one index commit for the whole batch
+        all_documents = [doc for _, documents in prepared for doc in documents]
+        committed = False
+        if all_documents:
+            try:
+                with track_stage("index_add"):
+                    committed = await asyncio.to_thread(vector_store.add_documents, all_documents)
+            except Exception as e:
+                logger.error(f"Batch index commit error: {e}")
+    
+    results = []
+    for position, (result, documents) in enumerate(prepared):
+        first = duplicate_of.get(position)
+        if (documents or first) and not committed:
+            result = _failed(result.filename, "Failed to add file to vector store")
+        elif first:
+            result.message = f"Duplicate of {first} in this batch; indexed once"
+            result.chunks_created = 0
+        results.append(result)
+    if committed and summary_builder:
+        summary_builder.schedule(result.file_id for result, documents in prepared if documents)
+    
+    succeeded = sum(1 for result in results if result.success)
+    return BatchUploadResponse(
+        success=succeeded == len(results),
+        message=f"Processed {succeeded} of {len(results)} files successfully",
+        results=results,
+        chunks_created=sum(result.chunks_created or 0 for result in results)
+    )
+
+@router.get("/upload/progress", response_model=List[IngestProgress])
+async def list_upload_progress():
+    """Embedding progress of every upload with checkpoint state"""
+    return vector_store.embedder.progress()
+
+@router.get("/upload/progress/{file_id}", response_model=IngestProgress)
+async def get_upload_progress(file_id: str):
+    """Embedding progress of one upload; the file ID is the upload's content hash"""
+    reports = vector_store.embedder.progress(file_id)
+    if not reports:
+        raise HTTPException(status_code=404, detail=f"No upload in progress for {file_id}")
+    return reports[0]
+
+async def prepare_upload(file: UploadFile) -> Tuple[UploadResponse, List[Document]]:
+    """Save, extract and chunk an uploaded PDF without indexing it"""
+    # Stream to disk, generating the file ID as we go
+    with track_stage("upload_save"):
+        file_id, file_path = await save_upload(file)
+    
+    # Metadata shared by every chunk; the chunker adds page and offsets
+    metadata = {
+        "source": file.filename,
+        "file_id": file_id
+    }
+    
+    # Extract and chunk page by page off the event loop so other files keep moving
+    documents = await asyncio.to_thread(
+        embedding_manager.create_chunks_from_pages,
+        iter_pdf_pages(file_path),
+        metadata
+    )
+    
+    if not documents:
+        return _failed(file.filename, "Could not extract text from PDF"), []
+    
+    return UploadResponse(
+        success=True,
+        message="File uploaded and processed successfully",
+        file_id=file_id,
+        filename=file.filename,
+        chunks_created=len(documents)
+    ), documents
+
+async def save_upload(file: UploadFile) -> Tuple[str, str]:
+    """Spool an upload to disk in fixed-size chunks, hashing incrementally"""
+    os.makedirs(Config.UPLOAD_DIR, exist_ok=True)
+    temp_path = os.path.join(Config.UPLOAD_DIR, f".{uuid.uuid4().hex}.part")
+    md5 = hashlib.md5()
+    size = 0
+    
     try:
-        from io import BytesIO
-        pdf_file = BytesIO(content)
-        reader = PdfReader(pdf_file)
+        with open(temp_path, "wb") as f:
+            while chunk := await file.read(Config.UPLOAD_READ_CHUNK_BYTES):
+                size += len(chunk)
+                if size > Config.MAX_UPLOAD_BYTES:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds the {Config.MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit"
+                    )
+                md5.update(chunk)
+                f.write(chunk)
         
-        text = ""
+        file_id = md5.hexdigest()[:10]
+        file_path = os.path.join(Config.UPLOAD_DIR, f"{file_id}_{file.filename}")
+        os.replace(temp_path, file_path)
+        return file_id, file_path
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def _failed(filename: str, message: str) -> UploadResponse:
+    return UploadResponse(success=False, message=message, filename=filename)
+
+def iter_pdf_pages(file_path: str) -> Iterator[str]:
+    """Yield the text of each page of a PDF on disk"""
+    from PyPDF2 import PdfReader
+    
+    try:
+        # PdfReader seeks within the file instead of holding it in memory
+        reader = PdfReader(file_path)
         for page in reader.pages:
-            text += page.extract_text() + "\n"
-        
-        return text
+            yield page.extract_text() or ""
     except Exception as e:
-        logger.error(f"PDF extraction error: {e}")
-        return ""
\ No newline at end of file
+        logger.error(f"PDF extraction error: {e}")
\ No newline at end of file
@@ -11,23 +11,152 @@ class Config:
     # Model Settings
     GEMINI_MODEL: str = "gemini-2.0-flash"
     EMBEDDING_MODEL: str = "models/embedding-001"
+    # "gemini", or "fake" for a local model with injected latency
+    LLM_BACKEND: str = os.getenv("LLM_BACKEND", "gemini")
+    FAKE_LLM_LATENCY_SECONDS: float = float(os.getenv("FAKE_LLM_LATENCY_SECONDS", "0.5"))
+    FAKE_LLM_JITTER_SECONDS: float = float(os.getenv("FAKE_LLM_JITTER_SECONDS", "0.5"))
+    # "gemini", or "fake" for deterministic local hashed bag-of-words vectors
+    EMBEDDING_BACKEND: str = os.getenv("EMBEDDING_BACKEND", "gemini")
+    FAKE_EMBEDDING_DIMENSION: int = 256
+    
+    # Model tiers chosen per request by EdTechWorkflow._route_query
+    MODEL_TIERS: dict = {
+        "fast": {"model": "gemini-2.0-flash-lite", "max_output_tokens": 512, "temperature": 0.2},
+        "full": {"model": GEMINI_MODEL, "max_output_tokens": 2048, "temperature": 0.3},
+    }
+    FAST_TIER_MAX_QUERY_TOKENS: int = 24
+    FAST_TIER_MIN_CONFIDENCE: float = 0.8
+    
+    # LLM Resilience Settings
+    CHAT_DEADLINE_SECONDS: float = float(os.getenv("CHAT_DEADLINE_SECONDS", "30"))
+    LLM_MIN_BUDGET_SECONDS: float = 1.0  # don't start generation with less left
+    LLM_HEDGE_ENABLED: bool = True
+    LLM_HEDGE_PERCENTILE: float = 0.95  # hedge delay once enough samples exist
+    LLM_HEDGE_DELAY_SECONDS: float = 8.0  # hedge delay before that
+    LLM_BREAKER_FAILURES: int = 5
+    LLM_BREAKER_RESET_SECONDS: float = 30.0
+    
+    # Admission control in front of agent execution
+    LLM_MAX_CONCURRENT: int = int(os.getenv("LLM_MAX_CONCURRENT", "8"))
+    ADMISSION_MAX_QUEUE: int = int(os.getenv("ADMISSION_MAX_QUEUE", "32"))
+    STUDENT_RATE_PER_MINUTE: float = 20.0
+    STUDENT_BURST: float = 10.0
+    # Identical concurrent chat requests share one pipeline run
+    CHAT_COALESCING_ENABLED: bool = os.getenv("CHAT_COALESCING_ENABLED", "true").lower() == "true"
+    # Lower runs first; interactive learn traffic ahead of bulk generation
+    AGENT_PRIORITY: dict = {"teacher": 0, "quiz": 1, "revision": 1}
+    # Bucket tokens charged per request
+    AGENT_COST: dict = {"teacher": 1.0, "quiz": 3.0, "revision": 3.0}
+    
+    # Request profiling; the admin endpoints and middleware need a token
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+    PROFILE_DIR: str = "data/profiles"
+    PROFILE_SAMPLE_INTERVAL: float = 0.005
+    PROFILES_TO_KEEP: int = 50
     
     # Storage Paths
     UPLOAD_DIR: str = "data/uploads"
     EMBEDDINGS_DIR: str = "data/embeddings"
     VECTOR_STORE_PATH: str = "data/embeddings/faiss_index"
+    INDEX_VERSIONS_TO_KEEP: int = 3
+    INGEST_QUEUE_DIR: str = "data/ingest_queue"
+    EXTRACTION_CACHE_DIR: str = "data/extracted"  # page text by file ID, for bulk ingest
+    # Memory-budget mode: "none", "sq8" (4x smaller), "sq4" (8x) or "pq";
+    # candidates are re-ranked against float32 vectors memory-mapped from disk
+    INDEX_QUANTIZATION: str = os.getenv("INDEX_QUANTIZATION", "none")
+    PQ_M: int = 96  # codes per vector, must divide the embedding dimension
+    PQ_BITS: int = 8
+    QUANTIZE_MIN_VECTORS: int = 10000  # stay exact until there is enough to train on
+    RERANK_FACTOR: int = 4  # candidates fetched per result before exact re-ranking
+    # Rebuild the index once this many chunks (and this share of it) are deleted
+    COMPACTION_MIN_TOMBSTONES: int = 500
+    COMPACTION_RATIO: float = 0.1
+    # Background re-index (POST /admin/reindex): a shadow index is rebuilt
+    # from the stored uploads under the current settings, checked against
+    # sample queries, then swapped in
+    REINDEX_STATUS_PATH: str = "data/embeddings/reindex.json"
+    REINDEX_FILES_PER_COMMIT: int = 20
+    REINDEX_VERIFY_QUERIES: int = 50
+    REINDEX_VERIFY_K: int = 5
+    REINDEX_MIN_HIT_RATE: float = 0.8  # share of sample queries finding their own file
+    REINDEX_MAX_REGRESSION: float = 0.1  # allowed drop in hit rate against the live index
     
-    # Chunking Settings
-    CHUNK_SIZE: int = 1000
-    CHUNK_OVERLAP: int = 200
+    # Upload Settings
+    UPLOAD_CONCURRENCY: int = int(os.getenv("UPLOAD_CONCURRENCY", "4"))
+    UPLOAD_READ_CHUNK_BYTES: int = 1024 * 1024
+    MAX_UPLOAD_BYTES: int = int(os.getenv("MAX_UPLOAD_MB", "50")) * 1024 * 1024
+    # Large uploads are embedded in checkpointed batches, so a crash or quota
+    # error only costs the batches that had not finished
+    EMBED_BATCH_SIZE: int = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+    EMBED_CONCURRENCY: int = int(os.getenv("EMBED_CONCURRENCY", "4"))
+    EMBED_MAX_RETRIES: int = 4
+    EMBED_CHECKPOINT_DIR: str = "data/embeddings/checkpoints"
+    
+    # Chunking Settings (in model tokens)
+    CHUNK_TOKENS: int = 256
+    CHUNK_OVERLAP_TOKENS: int = 48
+    # Small-to-big: embed small child chunks, hand their parent sections to the LLM
+    PARENT_DOCUMENT_MODE: bool = os.getenv("PARENT_DOCUMENT_MODE", "false").lower() == "true"
+    PARENT_CHUNK_TOKENS: int = 1024
+    CHILD_CHUNK_TOKENS: int = 128
+    CHILD_OVERLAP_TOKENS: int = 16
+    PARENT_MAX_SECTIONS: int = 4
+    PARENT_STORE_PATH: str = "data/embeddings/parents.sqlite3"
+    
+    # Summary tree: chunk groups summarized level by level up to the whole
+    # document at ingest, so revision prompts can cover a topic of any size.
+    # Opt-in: each upload then costs extra fast-tier calls, which share the
+    # admission slots and circuit breaker with live chat
+    SUMMARY_TREE_ENABLED: bool = os.getenv("SUMMARY_TREE_ENABLED", "false").lower() == "true"
+    SUMMARY_STORE_PATH: str = "data/embeddings/summaries.sqlite3"
+    SUMMARY_GROUP_TOKENS: int = 3000  # passages per summary call
+    SUMMARY_TOKENS: int = 300  # asked-for length of each summary
+    SUMMARY_MAX_LEVELS: int = 5  # the last level is forced into one document summary
+    SUMMARY_CONCURRENCY: int = 4
+    SUMMARY_CONTEXT_TOKENS: int = 3000  # revision prompt budget for summaries
+    SUMMARY_WAIT_SECONDS: float = 120.0  # for the index writer to commit an upload
     
     # Retrieval Settings
     TOP_K_DOCS: int = 5
     SIMILARITY_THRESHOLD: float = 0.7
+    # Stop adding chunks once relevance falls this far below the best hit
+    SCORE_DROPOFF: float = 0.15
+    QUERY_EMBEDDING_CACHE_SIZE: int = 1024
+    # Two-stage retrieval: pick files by centroid, then search their chunks
+    ROUTING_ENABLED: bool = os.getenv("ROUTING_ENABLED", "true").lower() == "true"
+    ROUTING_MIN_FILES: int = 16  # below this, scanning everything is cheap enough
+    ROUTING_TOP_FILES: int = 6
+    # (min_k, max_k) chunks handed to each agent
+    RETRIEVAL_K_RANGE: dict = {
+        "teacher": (2, 5),
+        "quiz": (3, 8),
+        "revision": (4, 10),
+    }
+    
+    # Chat history, persisted server-side and fetched a page at a time
+    CHAT_HISTORY_URL: str = os.getenv("CHAT_HISTORY_URL", "sqlite:///data/chat_history.sqlite3")
+    CHAT_HISTORY_PAGE_SIZE: int = 20
+    CHAT_HISTORY_MAX_PAGE_SIZE: int = 100
     
     # Server Settings
     HOST: str = "0.0.0.0"
     PORT: int = 8000
+    WORKERS: int = int(os.getenv("WORKERS", "1"))
+    # "standalone" serves and writes in one process; "reader" workers map
+    # the index read-only and leave writes to the index writer process
+    SERVE_ROLE: str = os.getenv("SERVE_ROLE", "standalone")
+    INDEX_POLL_SECONDS: float = 2.0
+    INGEST_MAX_JOBS_PER_COMMIT: int = 64
+    # A job that fails on its own this many times is set aside as .failed
+    INGEST_MAX_ATTEMPTS: int = 5
+    # Sharded mode: files are hash-partitioned across SHARD_COUNT shard
+    # processes and every query is scattered to all of them (0 = one index)
+    SHARD_COUNT: int = int(os.getenv("SHARD_COUNT", "0"))
+    SHARD_ADDRESSES: str = os.getenv("SHARD_ADDRESSES", "")  # "host:port,..." for remote shards
+    SHARD_BASE_PORT: int = 8100  # local shards listen on 127.0.0.1:SHARD_BASE_PORT + n
+    SHARD_AUTHKEY: str = os.getenv("SHARD_AUTHKEY", "")
+    SHARD_TIMEOUT_SECONDS: float = 2.0  # a slower shard is left out of the answer
+    SHARD_STORE_ROOT: str = "data/embeddings/shards"
     
     @classmethod
     def validate_config(cls):
@@ -36,4 +165,5 @@ class Config:
         
         # Create directories
         os.makedirs(cls.UPLOAD_DIR, exist_ok=True)
-        os.makedirs(cls.EMBEDDINGS_DIR, exist_ok=True)
\ No newline at end of file
+        os.makedirs(cls.EMBEDDINGS_DIR, exist_ok=True)
+        os.makedirs(cls.INGEST_QUEUE_DIR, exist_ok=True)
\ No newline at end of file
@@ -0,0 +1,177 @@
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Tuple
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+import logging
+
+from backend.core.metrics import registry
+from backend.core.resilience import run_with_deadline
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_REJECTED = registry.counter(
+    "edute_admission_rejected_total",
+    "Chat requests shed by the admission controller",
+    ["reason"]
+)
+ADMISSION_QUEUE_DEPTH = registry.gauge(
+    "edute_admission_queue_depth",
+    "Requests waiting for an LLM slot"
+)
+ADMISSION_ACTIVE = registry.gauge(
+    "edute_admission_active",
+    "Requests currently holding an LLM slot"
+)
+ADMISSION_WAIT_SECONDS = registry.histogram(
+    "edute_admission_wait_seconds",
+    "Time spent queued for an LLM slot by priority",
+    ["priority"]
+)
+
+class AdmissionRejected(Exception):
+    """The request was shed; the client should retry after retry_after seconds"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+class TokenBucket:
+    """Refills at rate tokens per second up to capacity"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def take(self, cost: float = 1.0) -> float:
+        """Spend cost tokens; returns 0 on success, else seconds until affordable"""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= cost:
+            self.tokens -= cost
+            return 0.0
+        return (cost - self.tokens) / self.rate
+
+class AdmissionController:
+    """Per-student rate limits plus a global, priority-ordered LLM slot pool
+
+    Lower priority numbers are served first; ties are served in arrival
+    order. Limits are per process, so with N workers the effective global
+    cap is N * max_concurrent.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        max_queue: int,
+        student_rate: float,
+        student_burst: float,
+        max_students: int = 10000
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.student_rate = student_rate
+        self.student_burst = student_burst
+        self.max_students = max_students
+
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._buckets_lock = threading.Lock()
+        self._active = 0
+        self._queue: List[Tuple[int, int, asyncio.Future]] = []
+        self._sequence = itertools.count()
+        self._hold_seconds = 5.0  # moving average of slot hold time
+
+    def admit(self, student_id: str, cost: float = 1.0):
+        """Charge the student's bucket, raising AdmissionRejected when it is empty"""
+        with self._buckets_lock:
+            bucket = self._buckets.get(student_id)
+            if bucket is None:
+                bucket = TokenBucket(self.student_rate, self.student_burst)
+                self._buckets[student_id] = bucket
+                if len(self._buckets) > self.max_students:
+                    # Dropping the least recently seen student only refills their bucket
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(student_id)
+            wait = bucket.take(min(cost, self.student_burst))
+
+        if wait:
+            ADMISSION_REJECTED.labels(reason="student_rate").inc()
+            raise AdmissionRejected(f"Rate limit exceeded for student {student_id}", wait)
+
+    @asynccontextmanager
+    async def slot(self, priority: int = 0) -> AsyncIterator[None]:
+        """Hold one of the max_concurrent LLM slots for the duration of the block
+
+        Waiting is bounded by the current request deadline; a request that
+        runs out of time leaves the queue with DeadlineExceeded.
+        """
+        started = time.monotonic()
+        if self._active < self.max_concurrent and not self._queue:
+            self._active += 1
+        else:
+            if len(self._queue) >= self.max_queue:
+                ADMISSION_REJECTED.labels(reason="queue_full").inc()
+                raise AdmissionRejected("Server is busy", self.retry_after())
+
+            waiter = asyncio.get_running_loop().create_future()
+            heapq.heappush(self._queue, (priority, next(self._sequence), waiter))
+            self._update_gauges()
+            try:
+                # The releasing request hands its slot over by resolving the future
+                await run_with_deadline(waiter, "LLM slot")
+            except BaseException:
+                if waiter.done() and not waiter.cancelled():
+                    self._release()
+                else:
+                    waiter.cancel()
+                    self._queue = [entry for entry in self._queue if entry[2] is not waiter]
+                    heapq.heapify(self._queue)
+                self._update_gauges()
+                raise
+
+        ADMISSION_WAIT_SECONDS.labels(priority=priority).observe(time.monotonic() - started)
+        self._update_gauges()
+        held_from = time.monotonic()
+        try:
+            yield
+        finally:
+            self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * (time.monotonic() - held_from)
+            self._release()
+
+    def _release(self):
+        while self._queue:
+            _, _, waiter = heapq.heappop(self._queue)
+            if not waiter.done():
+                waiter.set_result(None)
+                self._update_gauges()
+                return
+        self._active -= 1
+        self._update_gauges()
+
+    def retry_after(self) -> float:
+        """Rough time until the current queue drains"""
+        waves = (len(self._queue) + 1) / max(1, self.max_concurrent)
+        return max(1.0, waves * self._hold_seconds)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "active": self._active,
+            "queued": len(self._queue),
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue
+        }
+
+    @property
+    def saturated(self) -> bool:
+        return len(self._queue) >= self.max_queue
+
+    def _update_gauges(self):
+        ADMISSION_ACTIVE.set(self._active)
+        ADMISSION_QUEUE_DEPTH.set(len(self._queue))
\ No newline at end of file
@@ -1,9 +1,9 @@
-from langchain.schema import HumanMessage, SystemMessage
-from langchain.prompts import PromptTemplate
 from langchain.docstore.document import Document
 from typing import List, Dict, Any, Optional
 import os
 import logging
+from backend.core.metrics import track_stage
+from backend.core.resilience import LLMUnavailableError
 
 logger = logging.getLogger(__name__)
 
@@ -28,23 +28,31 @@ class BaseAgent:
         self, 
         query: str, 
         context_docs: List[Document], 
-        student_info: Optional[Dict] = None
+        student_info: Optional[Dict] = None,
+        model_tier: str = "full"
     ) -> Dict[str, Any]:
         """Process student query with context"""
-        context = self._format_context(context_docs)
+        from langchain_core.messages import HumanMessage, SystemMessage
         
-        formatted_prompt = self.prompt_template.format(
-            query=query,
-            context=context,
-            student_info=student_info or {}
-        )
+        with track_stage("prompt_format"):
+            context = self._format_context(context_docs)
+            
+            formatted_prompt = self.prompt_template.format(
+                query=query,
+                context=context,
+                student_info=student_info or {}
+            )
+            
+            messages = [
+                SystemMessage(content="You are an expert educational tutor."),
+                HumanMessage(content=formatted_prompt)
+            ]
         
-        messages = [
-            SystemMessage(content="You are an expert educational tutor."),
-            HumanMessage(content=formatted_prompt)
-        ]
-        
-        response = await self.llm.generate_response(messages)
+        try:
+            response = await self.llm.generate_response(messages, tier=model_tier)
+        except LLMUnavailableError as e:
+            logger.warning(f"{self.__class__.__name__} degraded to retrieved context: {e}")
+            return self._degraded_response(context_docs)
         
         return {
             "content": response,
@@ -53,13 +61,40 @@ class BaseAgent:
             "sources": [doc.metadata.get("source", "Unknown") for doc in context_docs]
         }
     
+    def _degraded_response(self, context_docs: List[Document]) -> Dict[str, Any]:
+        """Fallback answer built from the retrieved passages alone"""
+        if context_docs:
+            content = (
+                "I can't reach the tutor model right now, so here are the most "
+                "relevant passages from your materials:\n\n"
+                + self._format_context(context_docs)
+            )
+        else:
+            content = "I can't reach the tutor model right now. Please try again in a moment."
+        
+        return {
+            "content": content,
+            "agent_type": self.__class__.__name__,
+            "confidence": 0.0,
+            "sources": [doc.metadata.get("source", "Unknown") for doc in context_docs],
+            "degraded": True
+        }
+    
     def _format_context(self, documents: List[Document]) -> str:
         """Format retrieved documents as context"""
         if not documents:
             return "No relevant context found."
         
+        # Several child chunks can share a parent section; send it once
+        unique, seen = [], set()
+        for doc in documents:
+            key = doc.metadata.get("parent_id") or doc.page_content
+            if key not in seen:
+                seen.add(key)
+                unique.append(doc)
+        
         context_parts = []
-        for i, doc in enumerate(documents, 1):
+        for i, doc in enumerate(unique, 1):
             source = doc.metadata.get("source", "Unknown")
             context_parts.append(f"Context {i} (from {source}):\n{doc.page_content}")
         
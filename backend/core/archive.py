@@ -0,0 +1,179 @@
+from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain.docstore.document import Document
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+import argparse
+import json
+import os
+import shutil
+import logging
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_FORMAT_VERSION = 1
+
+class EmbeddingArchive:
+    """Embedded chunks in a portable, pickle-free layout
+
+    A directory holding manifest.json (model id, dimension, count),
+    vectors.npy (float16, one row per chunk) and chunks.jsonl (id, text and
+    metadata, in the same row order).
+    """
+
+    def __init__(
+        self,
+        model: str,
+        vectors: np.ndarray,
+        ids: List[str],
+        texts: List[str],
+        metadatas: List[Dict[str, Any]],
+        manifest: Optional[Dict[str, Any]] = None
+    ):
+        self.model = model
+        self.vectors = vectors
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.manifest = manifest or {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def dimension(self) -> int:
+        return int(self.vectors.shape[1]) if self.vectors.ndim == 2 else 0
+
+    @classmethod
+    def from_store(
+        cls,
+        store: FAISS,
+        model: str,
+        skip_ids: Iterable[str] = (),
+        full_vectors=None
+    ) -> "EmbeddingArchive":
+        """Read vectors back out of a live index, leaving out skip_ids and the placeholder
+
+        For a quantized index pass its FullPrecisionVectors, so the archive
+        holds the original vectors rather than decoded approximations.
+        """
+        skip_ids = set(skip_ids)
+        rows, ids, texts, metadatas = [], [], [], []
+        for position, doc_id in sorted(store.index_to_docstore_id.items()):
+            doc = store.docstore._dict.get(doc_id)
+            if doc is None or doc_id in skip_ids or doc.metadata.get("source") == "init":
+                continue
+            rows.append(position)
+            ids.append(doc_id)
+            texts.append(doc.page_content)
+            metadatas.append(doc.metadata)
+
+        if rows and full_vectors is not None:
+            found = full_vectors.lookup(ids)
+            vectors = np.vstack([
+                found[doc_id] if doc_id in found else store.index.reconstruct(int(row))
+                for doc_id, row in zip(ids, rows)
+            ])
+        elif rows:
+            vectors = store.index.reconstruct_n(0, store.index.ntotal)[rows]
+        else:
+            vectors = np.zeros((0, store.index.d), dtype="float32")
+        return cls(model, vectors.astype("float16"), ids, texts, metadatas)
+
+    def save(self, path: str):
+        """Write the archive to a directory, replacing it atomically"""
+        temp_dir = f"{path.rstrip(os.sep)}.tmp"
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+
+        np.save(os.path.join(temp_dir, "vectors.npy"), self.vectors.astype("float16"), allow_pickle=False)
+        with open(os.path.join(temp_dir, "chunks.jsonl"), "w", encoding="utf-8") as f:
+            for doc_id, text, metadata in zip(self.ids, self.texts, self.metadatas):
+                f.write(json.dumps({"id": doc_id, "text": text, "metadata": metadata}, ensure_ascii=False) + "\n")
+        manifest = {
+            "format_version": ARCHIVE_FORMAT_VERSION,
+            "model": self.model,
+            "dimension": self.dimension,
+            "count": len(self),
+            "dtype": "float16",
+            "created": datetime.now().isoformat()
+        }
+        with open(os.path.join(temp_dir, "manifest.json"), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(temp_dir, path)
+        self.manifest = manifest
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = False) -> "EmbeddingArchive":
+        """Read an archive; nothing in it is unpickled"""
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("format_version") != ARCHIVE_FORMAT_VERSION:
+            raise ValueError(f"Unsupported archive format {manifest.get('format_version')}")
+
+        vectors = np.load(
+            os.path.join(path, "vectors.npy"),
+            mmap_mode="r" if mmap else None,
+            allow_pickle=False
+        )
+        ids, texts, metadatas = [], [], []
+        with open(os.path.join(path, "chunks.jsonl"), "r", encoding="utf-8") as f:
+            for line in f:
+                chunk = json.loads(line)
+                ids.append(chunk["id"])
+                texts.append(chunk["text"])
+                metadatas.append(chunk["metadata"])
+
+        if len(ids) != len(vectors):
+            raise ValueError(f"Archive has {len(vectors)} vectors but {len(ids)} chunks")
+        return cls(manifest["model"], vectors, ids, texts, metadatas, manifest)
+
+    def build_store(self, embeddings, index_factory: str = "Flat") -> FAISS:
+        """Build a FAISS store of any factory type without embedding anything"""
+        vectors = np.ascontiguousarray(self.vectors, dtype="float32")
+        index = faiss.index_factory(self.dimension, index_factory, faiss.METRIC_L2)
+        if not index.is_trained:
+            index.train(vectors)
+        index.add(vectors)
+
+        docstore = InMemoryDocstore({
+            doc_id: Document(page_content=text, metadata=metadata)
+            for doc_id, text, metadata in zip(self.ids, self.texts, self.metadatas)
+        })
+        return FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=docstore,
+            index_to_docstore_id=dict(enumerate(self.ids))
+        )
+
+def main():
+    """Export the live index to an archive, or rebuild the index from one"""
+    from backend.config import Config
+    from backend.core.vectorstore import VectorStoreManager
+
+    parser = argparse.ArgumentParser(description="Embedding archive export/import")
+    parser.add_argument("command", choices=["export", "import"])
+    parser.add_argument("path", help="Archive directory")
+    parser.add_argument(
+        "--index-factory",
+        default=None,
+        help="FAISS index_factory string for import (default: configured quantization, else Flat)"
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    vector_store = VectorStoreManager()
+    if args.command == "export":
+        count = vector_store.export_archive(args.path)
+        print(f"Exported {count} chunks to {args.path}")
+    else:
+        count = vector_store.import_archive(args.path, index_factory=args.index_factory)
+        print(f"Imported {count} chunks into {Config.VECTOR_STORE_PATH}")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,179 @@
+"""Offline bulk ingestion of a directory of PDFs into the vector store
+
+    python -m backend.core.bulk_ingest path/to/library --workers 8
+
+Extraction and chunking run across a process pool, embedding runs in large
+checkpointed batches in this process while the pool keeps extracting, and
+every new chunk is committed as a single index version. Page text is cached
+by content hash under Config.EXTRACTION_CACHE_DIR, so re-runs (or a run that
+died mid-embedding) skip straight to the work that is left. Files already in
+the index are skipped. Run it with the API server and index writer stopped:
+it writes the index directly. Build the new files' summary trees afterwards
+with python -m backend.core.summaries.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from langchain.docstore.document import Document
+from typing import Dict, List, Optional, Set, Tuple
+import argparse
+import hashlib
+import json
+import os
+import time
+import logging
+import numpy as np
+from backend.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Per-process state of the pool workers, set up once by _init_worker
+_embedding_manager = None
+_skip_file_ids: Set[str] = set()
+
+def find_pdfs(directory: str) -> List[str]:
+    paths = []
+    for root, _, names in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in names if name.lower().endswith(".pdf"))
+    return sorted(paths)
+
+def file_id_for(path: str) -> str:
+    """Same content-hash ID that /api/upload assigns"""
+    md5 = hashlib.md5()
+    with open(path, "rb") as f:
+        while chunk := f.read(Config.UPLOAD_READ_CHUNK_BYTES):
+            md5.update(chunk)
+    return md5.hexdigest()[:10]
+
+def extract_pages(path: str, file_id: str) -> List[str]:
+    """Page texts of a PDF, served from the extraction cache when present"""
+    from backend.api.upload import iter_pdf_pages
+
+    cache_path = os.path.join(Config.EXTRACTION_CACHE_DIR, f"{file_id}.json")
+    if os.path.exists(cache_path):
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f"Ignoring unreadable extraction cache {cache_path}: {e}")
+
+    pages = list(iter_pdf_pages(path))
+    if not any(page.strip() for page in pages):
+        return pages  # never cache a failed extraction
+    os.makedirs(Config.EXTRACTION_CACHE_DIR, exist_ok=True)
+    temp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(pages, f, ensure_ascii=False)
+    os.replace(temp_path, cache_path)
+    return pages
+
+def _init_worker(skip_file_ids: Set[str]):
+    global _embedding_manager, _skip_file_ids
+    from backend.core.embeddings import EmbeddingManager
+
+    _embedding_manager = EmbeddingManager()
+    _skip_file_ids = skip_file_ids
+
+def _prepare(path: str) -> Tuple[str, Optional[str], List[Document], Optional[str]]:
+    """(path, file_id, chunks, error); no chunks and no error means skipped"""
+    try:
+        file_id = file_id_for(path)
+        if file_id in _skip_file_ids:
+            return path, file_id, [], None
+        pages = extract_pages(path, file_id)
+        metadata = {"source": os.path.basename(path), "file_id": file_id}
+        documents = _embedding_manager.create_chunks_from_pages(pages, metadata)
+        if not documents:
+            return path, file_id, [], "Could not extract text from PDF"
+        return path, file_id, documents, None
+    except Exception as e:
+        return path, None, [], str(e)
+
+def bulk_ingest(
+    directory: str,
+    workers: int = None,
+    batch_size: int = 256,
+    concurrency: int = 8,
+    embed_group_chunks: int = 4096
+) -> Dict[str, int]:
+    """Index every PDF under directory in one commit; returns counts"""
+    from backend.core.parents import parent_batch_of
+    from backend.core.vectorstore import VectorStoreManager
+
+    vector_store = VectorStoreManager()
+    vector_store.embedder.batch_size = batch_size
+    vector_store.embedder.concurrency = concurrency
+    # Live files only: a deleted file still awaiting compaction is re-indexed
+    existing = vector_store.file_ids()
+
+    paths = find_pdfs(directory)
+    logger.info(f"Found {len(paths)} PDFs under {directory}")
+    counts = {"files": len(paths), "indexed": 0, "skipped": 0, "failed": 0, "chunks": 0}
+    documents: List[Document] = []
+    vectors: List[np.ndarray] = []
+    group: List[Document] = []
+    seen: Dict[str, Optional[str]] = {}  # file_id -> parent batch kept for it
+    started = time.perf_counter()
+
+    def embed_group():
+        # Float32 arrays keep a large library's vectors at 4 bytes per dimension
+        vectors.append(np.asarray(vector_store.embedder.embed(group), dtype=np.float32))
+        documents.extend(group)
+        logger.info(f"Embedded {len(documents)} chunks ({time.perf_counter() - started:.0f}s)")
+        group.clear()
+
+    with ProcessPoolExecutor(
+        max_workers=workers or os.cpu_count(),
+        initializer=_init_worker,
+        initargs=(existing,)
+    ) as pool:
+        # Workers keep extracting while this process waits on the embedding API
+        for path, file_id, chunks, error in pool.map(_prepare, paths, chunksize=4):
+            if error:
+                counts["failed"] += 1
+                logger.error(f"Skipping {path}: {error}")
+                continue
+            if not chunks:
+                counts["skipped"] += 1
+                continue
+            if file_id in seen:
+                # Same content twice in the library: drop the copy's parents
+                counts["skipped"] += 1
+                vector_store.parents.delete_file(file_id, keep_batch=seen[file_id])
+                continue
+            seen[file_id] = parent_batch_of(chunks)
+            counts["indexed"] += 1
+            group.extend(chunks)
+            if len(group) >= embed_group_chunks:
+                embed_group()
+    if group:
+        embed_group()
+
+    if documents:
+        all_vectors = np.concatenate(vectors)
+        if not vector_store.apply_changes([{"documents": documents, "vectors": all_vectors}]):
+            raise RuntimeError("Index commit failed; embeddings are checkpointed, re-run to resume")
+        vector_store.embedder.complete(list(seen))
+        for file_id, batch in seen.items():
+            # Parents chunked by an earlier run that died before committing
+            vector_store.parents.delete_file(file_id, keep_batch=batch)
+    counts["chunks"] = len(documents)
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest a directory of PDFs into the vector store")
+    parser.add_argument("directory", help="Directory searched recursively for PDFs")
+    parser.add_argument("--workers", type=int, default=None, help="Extraction processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks per embedding request")
+    parser.add_argument("--concurrency", type=int, default=8, help="Embedding requests in flight")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    counts = bulk_ingest(args.directory, args.workers, args.batch_size, args.concurrency)
+    print(
+        f"Indexed {counts['indexed']} of {counts['files']} files ({counts['chunks']} chunks), "
+        f"skipped {counts['skipped']}, failed {counts['failed']} "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -0,0 +1,260 @@
+from langchain.docstore.document import Document
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Iterable, Iterator, List, Optional, Tuple
+import numpy as np
+import re
+
+# Approximates a subword tokenizer: words are split into pieces of at most
+# four characters and punctuation counts as its own token. That tracks
+# Gemini's ~4 characters per token closely enough to size chunks, and it
+# runs entirely in the C regex engine. Every non-space character belongs to
+# exactly one token, which lets us keep only token end offsets per page.
+TOKEN_PATTERN = re.compile(r"\w{1,4}|[^\w\s]")
+# Each token with the whitespace before it; these pieces tile the page, so
+# summing their lengths gives token end offsets without a Python-level loop
+TOKEN_PIECE = re.compile(r"\s*(?:\w{1,4}|[^\w\s])")
+WHITESPACE = re.compile(r"\s*")
+
+# ASCII char classes for the vectorized tokenizer, taken from the regex
+# engine itself so both paths agree
+_WORD = np.array([bool(re.match(r"\w", chr(c))) for c in range(128)], dtype=np.int8)
+_PUNCT = np.array([not re.match(r"[\w\s]", chr(c)) for c in range(128)])
+# Pages are tokenized together in batches of about this many chars, since a
+# numpy pass over a single page is mostly call overhead
+BATCH_CHARS = 32768
+
+def count_tokens(text: str) -> int:
+    """Approximate the number of model tokens in text"""
+    return len(TOKEN_PATTERN.findall(text))
+
+def token_ends(text: str) -> List[int]:
+    """End offset of each token TOKEN_PATTERN finds in text"""
+    if not text.isascii():
+        return list(accumulate(map(len, TOKEN_PIECE.findall(text))))
+    
+    codes = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+    edges = np.diff(_WORD[codes], prepend=0, append=0)
+    starts = np.flatnonzero(edges == 1)
+    stops = np.flatnonzero(edges == -1)
+    # A word run of n chars also ends a token every four chars before its
+    # last piece, (n - 1) // 4 of them
+    inner = (stops - starts - 1) // 4
+    long = inner > 0
+    counts = inner[long]
+    steps = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + 1
+    ends = np.concatenate([
+        stops,
+        np.repeat(starts[long], counts) + 4 * steps,
+        np.flatnonzero(_PUNCT[codes]) + 1
+    ])
+    ends.sort()
+    return ends.tolist()
+
+class _Page:
+    """A page within a tokenized batch of pages
+
+    text and ends belong to the whole batch (pages joined by newlines), so
+    offsets are batch offsets; base is where the page starts in text and its
+    tokens are ends[first:first + size]. Token indices passed in are per page.
+    """
+    __slots__ = ("number", "text", "ends", "base", "first", "size")
+    
+    def __init__(self, number: int, text: str, ends: List[int], base: int, first: int, size: int):
+        self.number = number
+        self.text = text
+        self.ends = ends
+        self.base = base
+        self.first = first
+        self.size = size
+    
+    def start(self, i: int) -> int:
+        """Char offset where token i begins"""
+        return WHITESPACE.match(self.text, self.ends[self.first + i - 1] if i else self.base).end()
+    
+    def end(self, i: int) -> int:
+        """Char offset where token i ends"""
+        return self.ends[self.first + i]
+    
+    def last_sentence_end(self, lo: int, hi: int) -> Optional[int]:
+        """The last token in [lo, hi) that ends a sentence"""
+        # Scan the chars with rfind; sentence punctuation is always a token
+        # of its own, so bisect maps its end offset back to the token
+        start, end = self.start(lo), self.end(hi - 1)
+        text = self.text
+        found = max(text.rfind(".", start, end), text.rfind("?", start, end), text.rfind("!", start, end))
+        if found < 0:
+            return None
+        return bisect_left(self.ends, found + 1, self.first + lo, self.first + hi) - self.first
+    
+    def is_word_end(self, i: int) -> bool:
+        # The newline joining pages is not alphanumeric, so page ends count
+        end = self.end(i)
+        return end == len(self.text) or not self.text[end].isalnum()
+    
+    def is_word_start(self, i: int) -> bool:
+        return i == 0 or self.is_word_end(i - 1)
+
+def _tokenize_pages(pages: Iterable[str]) -> Iterator[_Page]:
+    """Yield the non-empty pages, tokenizing them a batch at a time"""
+    batch: List[str] = []
+    chars = 0
+    number = 1
+    for text in pages:
+        batch.append(text)
+        chars += len(text)
+        if chars >= BATCH_CHARS:
+            yield from _tokenize_batch(batch, number)
+            number += len(batch)
+            batch = []
+            chars = 0
+    yield from _tokenize_batch(batch, number)
+
+def _tokenize_batch(batch: List[str], number: int) -> Iterator[_Page]:
+    # No token crosses the joining newline, so each page owns a run of ends
+    text = "\n".join(batch)
+    ends = token_ends(text)
+    base = first = 0
+    for page_text in batch:
+        stop = bisect_right(ends, base + len(page_text), first)
+        if stop > first:
+            yield _Page(number, text, ends, base, first, stop - first)
+        base += len(page_text) + 1
+        first = stop
+        number += 1
+
+class TokenChunker:
+    """Streaming, page-aware chunker that sizes chunks in tokens
+
+    Pages are consumed a small batch at a time and only the pages still
+    referenced by the current window are kept, so memory stays bounded by
+    the chunk size rather than the document size. Each chunk records the
+    page it starts on, the page it ends on (when different) and the char
+    offsets within them.
+    """
+    
+    def __init__(self, chunk_tokens: int, overlap_tokens: int):
+        if overlap_tokens >= chunk_tokens:
+            raise ValueError("overlap_tokens must be smaller than chunk_tokens")
+        self.chunk_tokens = chunk_tokens
+        self.overlap_tokens = overlap_tokens
+        # Look for a clean cut point within the last fifth of a full window
+        self.min_cut = max(overlap_tokens + 1, int(chunk_tokens * 0.8))
+    
+    def split_pages(
+        self,
+        pages: Iterable[str],
+        metadata: Optional[dict] = None
+    ) -> Iterator[Document]:
+        """Yield chunk Documents from an iterable of page texts"""
+        base = dict(metadata or {})
+        # The window is a short list of [page, first token, end token) ranges
+        window: List[list] = []
+        size = 0
+        fresh = 0  # tokens in the window not yet emitted in any chunk
+        chunk_id = 0
+        
+        for page in _tokenize_pages(pages):
+            pos = 0
+            while pos < page.size:
+                take = min(self.chunk_tokens - size, page.size - pos)
+                window.append([page, pos, pos + take])
+                size += take
+                fresh += take
+                pos += take
+                if size < self.chunk_tokens:
+                    continue
+                
+                cut = self._cut_point(window, size)
+                yield self._make_document(self._slice(window, 0, cut), base, chunk_id)
+                chunk_id += 1
+                
+                keep = self._overlap_start(window, cut)
+                fresh = size - cut
+                window = self._slice(window, keep, size)
+                size -= keep
+        
+        if window and fresh > 0:
+            yield self._make_document(window, base, chunk_id)
+    
+    def _cut_point(self, window: List[list], size: int) -> int:
+        """Prefer ending the chunk after a sentence, else at a word boundary
+
+        Only cuts keeping at least min_cut tokens are considered.
+        """
+        position = size  # tokens kept when cutting after the range's last token
+        for page, lo, hi in reversed(window):
+            first = max(lo, hi - 1 - (position - self.min_cut))
+            if first < hi:
+                i = page.last_sentence_end(first, hi)
+                if i is not None:
+                    return position - (hi - 1 - i)
+            position -= hi - lo
+            if position < self.min_cut:
+                break
+        
+        # No sentence end in reach; the last word end usually is a token or two back
+        position = size
+        for page, lo, hi in reversed(window):
+            for i in range(hi - 1, lo - 1, -1):
+                if position < self.min_cut:
+                    return size
+                if page.is_word_end(i):
+                    return position
+                position -= 1
+        return size
+    
+    def _overlap_start(self, window: List[list], cut: int) -> int:
+        """First token of the next chunk's overlap, aligned to a word start"""
+        keep = max(cut - self.overlap_tokens, 0)
+        while keep < cut:
+            page, i = self._locate(window, keep)
+            if page.is_word_start(i):
+                break
+            keep += 1
+        return keep
+    
+    @staticmethod
+    def _locate(window: List[list], position: int) -> Tuple[_Page, int]:
+        for page, lo, hi in window:
+            if position < hi - lo:
+                return page, lo + position
+            position -= hi - lo
+        raise IndexError(position)
+    
+    @staticmethod
+    def _slice(window: List[list], start: int, stop: int) -> List[list]:
+        """Take tokens [start, stop) of the window as a new list of ranges"""
+        result = []
+        offset = 0
+        for page, lo, hi in window:
+            length = hi - lo
+            a, b = max(start - offset, 0), min(stop - offset, length)
+            if a < b:
+                result.append([page, lo + a, lo + b])
+            offset += length
+        return result
+    
+    def _make_document(self, window: List[list], base: dict, chunk_id: int) -> Document:
+        # Ranges on the same page are contiguous; merge them and slice each
+        # page's span straight out of its batch text
+        merged: List[list] = []
+        for page, lo, hi in window:
+            if merged and merged[-1][0] is page and merged[-1][2] == lo:
+                merged[-1][2] = hi
+            else:
+                merged.append([page, lo, hi])
+        parts = [page.text[page.start(lo):page.end(hi - 1)] for page, lo, hi in merged]
+        
+        first, last = merged[0], merged[-1]
+        metadata = {
+            **base,
+            "chunk_id": chunk_id,
+            "page": first[0].number,
+            "start": first[0].start(first[1]) - first[0].base,
+            "end": last[0].end(last[2] - 1) - last[0].base,
+            "tokens": sum(hi - lo for _, lo, hi in merged)
+        }
+        if last[0] is not first[0]:
+            metadata["page_end"] = last[0].number
+        return Document(page_content="\n".join(parts), metadata=metadata)
\ No newline at end of file
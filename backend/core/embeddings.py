@@ -1,49 +1,128 @@
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain.docstore.document import Document
-from typing import List
+from langchain_core.embeddings import Embeddings
+from typing import Iterable, List, Optional
+import threading
+import uuid
 import logging
-from backend.config import Config 
+from backend.config import Config
+from backend.core.chunking import TokenChunker
+from backend.core.metrics import track_stage
+from backend.core.parents import ParentStore
 
 logger = logging.getLogger(__name__)
 
+class LazyGeminiEmbeddings(Embeddings):
+    """Gemini embeddings whose client (and its ~1s import) is created on first use"""
+    
+    def __init__(self, model: Optional[str] = None):
+        self.model = model or Config.EMBEDDING_MODEL
+        self._client = None
+        self._lock = threading.Lock()
+    
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from langchain_google_genai import GoogleGenerativeAIEmbeddings
+                    self._client = GoogleGenerativeAIEmbeddings(
+                        google_api_key=Config.GEMINI_API_KEY,
+                        model=self.model
+                    )
+        return self._client
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.client.embed_documents(texts)
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.client.embed_query(text)
+    
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await self.client.aembed_documents(texts)
+    
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.client.aembed_query(text)
+
+def make_embeddings(model: Optional[str] = None) -> Embeddings:
+    """The configured embedding backend (Config.EMBEDDING_BACKEND), optionally another model"""
+    if Config.EMBEDDING_BACKEND == "fake":
+        from backend.core.fakes import FakeEmbeddings
+        return FakeEmbeddings(Config.FAKE_EMBEDDING_DIMENSION)
+    return LazyGeminiEmbeddings(model)
+
+def embedding_model_name() -> str:
+    """Model id recorded in archives; vectors from different models never mix"""
+    if Config.EMBEDDING_BACKEND == "fake":
+        return f"fake-hash-{Config.FAKE_EMBEDDING_DIMENSION}"
+    return Config.EMBEDDING_MODEL
+
 class EmbeddingManager:
     def __init__(self):
         """Initialize with config values directly"""
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            google_api_key=Config.GEMINI_API_KEY,
-            model=Config.EMBEDDING_MODEL
-        )
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=Config.CHUNK_SIZE,
-            chunk_overlap=Config.CHUNK_OVERLAP,
-            separators=["\n\n", "\n", ". ", " ", ""]
-        )
+        self.embeddings = make_embeddings()
+        if Config.PARENT_DOCUMENT_MODE:
+            self.chunker = TokenChunker(
+                chunk_tokens=Config.CHILD_CHUNK_TOKENS,
+                overlap_tokens=Config.CHILD_OVERLAP_TOKENS
+            )
+            self.parent_chunker = TokenChunker(
+                chunk_tokens=Config.PARENT_CHUNK_TOKENS,
+                overlap_tokens=0
+            )
+            self.parent_store = ParentStore(Config.PARENT_STORE_PATH)
+        else:
+            self.chunker = TokenChunker(
+                chunk_tokens=Config.CHUNK_TOKENS,
+                overlap_tokens=Config.CHUNK_OVERLAP_TOKENS
+            )
+            self.parent_chunker = None
     
     def create_chunks(self, text: str, metadata: dict = None) -> List[Document]:
         """Split text into chunks and create Document objects"""
+        return self.create_chunks_from_pages([text], metadata)
+    
+    def create_chunks_from_pages(
+        self,
+        pages: Iterable[str],
+        metadata: dict = None
+    ) -> List[Document]:
+        """Chunk pages as they are produced, recording page and char offsets"""
         try:
-            chunks = self.text_splitter.split_text(text)
-            documents = []
-            
-            for i, chunk in enumerate(chunks):
-                doc_metadata = metadata.copy() if metadata else {}
-                doc_metadata['chunk_id'] = i
-                documents.append(Document(
-                    page_content=chunk,
-                    metadata=doc_metadata
-                ))
-            
-            return documents
+            # Pages are pulled lazily, so this covers PDF extraction too
+            with track_stage("extract_chunk"):
+                if self.parent_chunker:
+                    return self._split_parent_child(pages, metadata)
+                return list(self.chunker.split_pages(pages, metadata))
         except Exception as e:
             logger.error(f"Chunking error: {e}")
             return []
     
+    def _split_parent_child(self, pages: Iterable[str], metadata: dict = None) -> List[Document]:
+        """Cut parent sections, store them, and return their child chunks to embed"""
+        batch = uuid.uuid4().hex[:12]
+        parents, children = [], []
+        for parent in self.parent_chunker.split_pages(pages, metadata):
+            parent_id = f"{batch}-{parent.metadata['chunk_id']}"
+            parent.metadata["parent_id"] = parent_id
+            parents.append(parent)
+            
+            location = {key: parent.metadata[key] for key in ("page", "page_end") if key in parent.metadata}
+            for child in self.chunker.split_pages([parent.page_content], metadata):
+                # Child offsets are relative to the parent, so keep only its pages
+                child.metadata.pop("start", None)
+                child.metadata.pop("end", None)
+                child.metadata.update(location, chunk_id=len(children), parent_id=parent_id)
+                children.append(child)
+        
+        self.parent_store.put_many(parents)
+        return children
+    
     async def embed_documents(self, documents: List[Document]) -> List[List[float]]:
         """Generate embeddings for documents"""
         try:
             texts = [doc.page_content for doc in documents]
-            embeddings = await self.embeddings.aembed_documents(texts)
+            with track_stage("embed_documents"):
+                embeddings = await self.embeddings.aembed_documents(texts)
             return embeddings
         except Exception as e:
             logger.error(f"Embedding generation error: {e}")
@@ -52,7 +131,8 @@ class EmbeddingManager:
     async def embed_query(self, query: str) -> List[float]:
         """Generate embedding for a single query"""
         try:
-            return await self.embeddings.aembed_query(query)
+            with track_stage("embed_query"):
+                return await self.embeddings.aembed_query(query)
         except Exception as e:
             logger.error(f"Query embedding error: {e}")
             return []
\ No newline at end of file
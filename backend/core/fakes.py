@@ -0,0 +1,99 @@
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, BaseMessage
+from typing import List, Optional
+import asyncio
+import hashlib
+import random
+import re
+import time
+import numpy as np
+
+class FakeChatModel:
+    """Local stand-in for ChatGoogleGenerativeAI with injectable latency
+
+    Each call sleeps for latency plus up to jitter seconds. A stall_rate
+    share of calls hang for stall_seconds (a stuck upstream) and a
+    failure_rate share raise, which makes deadlines, hedging and the circuit
+    breaker exercisable without network access or API quota.
+    """
+    
+    def __init__(
+        self,
+        latency: float = 0.2,
+        jitter: float = 0.0,
+        failure_rate: float = 0.0,
+        stall_rate: float = 0.0,
+        stall_seconds: float = 3600.0,
+        seed: Optional[int] = None
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.stall_rate = stall_rate
+        self.stall_seconds = stall_seconds
+        self.calls = 0
+        self._random = random.Random(seed)
+    
+    def _plan(self):
+        self.calls += 1
+        if self._random.random() < self.stall_rate:
+            return self.stall_seconds, False
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        return delay, self._random.random() < self.failure_rate
+    
+    def _respond(self, messages: List[BaseMessage], fail: bool) -> AIMessage:
+        if fail:
+            raise RuntimeError("Injected LLM failure")
+        prompt = str(messages[-1].content) if messages else ""
+        return AIMessage(
+            content=f"[fake answer] {prompt[-200:]}",
+            usage_metadata={
+                "input_tokens": len(prompt) // 4,
+                "output_tokens": 50,
+                "total_tokens": len(prompt) // 4 + 50
+            }
+        )
+    
+    async def ainvoke(self, messages: List[BaseMessage], **kwargs) -> AIMessage:
+        delay, fail = self._plan()
+        await asyncio.sleep(delay)
+        return self._respond(messages, fail)
+    
+    def invoke(self, messages: List[BaseMessage], **kwargs) -> AIMessage:
+        delay, fail = self._plan()
+        time.sleep(delay)
+        return self._respond(messages, fail)
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic local embeddings: hashed bag of words and word pairs
+
+    Texts sharing words land close together, which is enough signal to
+    compare chunking, k and index settings offline without API calls.
+    Hashing uses md5 so vectors are identical across processes and runs.
+    """
+    
+    STOPWORDS = frozenset(
+        "a an and are as at be by for from in is it of on or that the this to was what which who with".split()
+    )
+    
+    def __init__(self, dimension: int = 256):
+        self.dimension = dimension
+    
+    def _features(self, text: str) -> List[str]:
+        words = [w for w in re.findall(r"\w+", text.lower()) if w not in self.STOPWORDS]
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for feature in self._features(text):
+            digest = hashlib.md5(feature.encode("utf-8")).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
\ No newline at end of file
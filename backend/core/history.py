@@ -0,0 +1,108 @@
+from datetime import datetime
+from sqlalchemy import (
+    Column, DateTime, Index, Integer, MetaData, String, Table, Text,
+    create_engine, delete, event, insert, select
+)
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+metadata = MetaData()
+
+chat_messages = Table(
+    "chat_messages",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("student_id", String(128), nullable=False),
+    Column("role", String(16), nullable=False),  # user, assistant
+    Column("content", Text, nullable=False),
+    Column("mode", String(16)),
+    Column("sources", Text),  # JSON list of {"source", "relevance"}
+    Column("created_at", DateTime, nullable=False),
+    # Every page fetch is a range scan of one student's newest ids
+    Index("chat_messages_student_id", "student_id", "id"),
+)
+
+def _sqlite_pragmas(conn, _):
+    # WAL lets API workers append while others page through history
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+
+class ChatHistoryStore:
+    """Chat turns persisted through SQLAlchemy (SQLite by default)
+
+    Pages are fetched newest first and keyed on message id
+    (id < before ORDER BY id DESC LIMIT n) rather than offsets, so any page
+    costs the same however long a student's history grows.
+    """
+
+    def __init__(self, url: str):
+        if url.startswith("sqlite:///"):
+            directory = os.path.dirname(url[len("sqlite:///"):])
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.engine = create_engine(url, connect_args={"check_same_thread": False})
+            event.listen(self.engine, "connect", _sqlite_pragmas)
+        else:
+            self.engine = create_engine(url, pool_pre_ping=True)
+        metadata.create_all(self.engine)
+
+    def append_turn(
+        self,
+        student_id: str,
+        query: str,
+        response: str,
+        mode: str,
+        sources: List[Dict[str, Any]]
+    ) -> List[int]:
+        """Store a question and its answer; returns their message ids"""
+        now = datetime.now()
+        ids = []
+        with self.engine.begin() as conn:
+            for role, content, role_sources in (("user", query, []), ("assistant", response, sources)):
+                result = conn.execute(insert(chat_messages).values(
+                    student_id=student_id,
+                    role=role,
+                    content=content,
+                    mode=mode,
+                    sources=json.dumps(role_sources, ensure_ascii=False),
+                    created_at=now
+                ))
+                ids.append(result.inserted_primary_key[0])
+        return ids
+
+    def page(
+        self,
+        student_id: str,
+        before: Optional[int] = None,
+        limit: int = 20
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """Up to limit messages older than before, oldest first, and whether more exist"""
+        query = select(chat_messages).where(chat_messages.c.student_id == student_id)
+        if before is not None:
+            query = query.where(chat_messages.c.id < before)
+        # One extra row tells us whether there is an earlier page
+        query = query.order_by(chat_messages.c.id.desc()).limit(limit + 1)
+        with self.engine.connect() as conn:
+            rows = conn.execute(query).mappings().all()
+        return [self._message(row) for row in reversed(rows[:limit])], len(rows) > limit
+
+    def clear(self, student_id: str) -> int:
+        """Delete a student's history; returns the number of messages removed"""
+        with self.engine.begin() as conn:
+            result = conn.execute(delete(chat_messages).where(chat_messages.c.student_id == student_id))
+        return result.rowcount
+
+    @staticmethod
+    def _message(row) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "role": row["role"],
+            "content": row["content"],
+            "mode": row["mode"],
+            "sources": json.loads(row["sources"] or "[]"),
+            "timestamp": row["created_at"],
+        }
\ No newline at end of file
@@ -0,0 +1,179 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional
+import hashlib
+import json
+import os
+import threading
+import time
+import logging
+import numpy as np
+from langchain.docstore.document import Document
+from backend.core.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+EMBED_BATCHES = registry.counter(
+    "edute_embed_batches_total",
+    "Embedding batches by result (embedded, checkpoint, retry, failed)",
+    ["result"]
+)
+
+class BatchedEmbedder:
+    """Embeds chunks in bounded, concurrent batches with per-file checkpoints
+
+    Each finished batch is saved under <checkpoint_dir>/<file_id>/ keyed by a
+    hash of its texts, so a retried upload of the same file (file ids are
+    content hashes) only pays for the batches that never completed.
+    Progress is written next to the checkpoints so any worker can report it.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        checkpoint_dir: str,
+        batch_size: int = 64,
+        concurrency: int = 4,
+        max_retries: int = 4,
+        retry_base_seconds: float = 1.0,
+        namespace: str = ""
+    ):
+        self.embeddings = embeddings
+        self.checkpoint_dir = checkpoint_dir
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        # Mixed into checkpoint keys (the embedding model), so a model change
+        # never reuses vectors from the old one
+        self.namespace = namespace
+
+    def embed(self, documents: List[Document]) -> List[List[float]]:
+        """Embed documents, reusing checkpointed batches; raises if any batch fails"""
+        vectors: List[Optional[List[float]]] = [None] * len(documents)
+
+        # Checkpoints are per file, so batches never straddle two files
+        by_file: Dict[str, List[int]] = {}
+        for i, doc in enumerate(documents):
+            by_file.setdefault(doc.metadata.get("file_id") or "_", []).append(i)
+
+        lock = threading.Lock()
+        jobs = []
+        for file_id, positions in by_file.items():
+            batches = [
+                positions[start:start + self.batch_size]
+                for start in range(0, len(positions), self.batch_size)
+            ]
+            progress = {"total_batches": len(batches), "done_batches": 0, "cached_batches": 0}
+            self._write_progress(file_id, "embedding", progress)
+            jobs.extend((file_id, batch, progress) for batch in batches)
+
+        def run(job):
+            file_id, positions, progress = job
+            texts = [documents[i].page_content for i in positions]
+            batch_vectors, cached = self._embed_batch(file_id, texts)
+            for i, vector in zip(positions, batch_vectors):
+                vectors[i] = vector
+            with lock:
+                progress["done_batches"] += 1
+                progress["cached_batches"] += int(cached)
+                self._write_progress(file_id, "embedding", dict(progress))
+
+        failed = None
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            for future in [pool.submit(run, job) for job in jobs]:
+                try:
+                    future.result()
+                except Exception as e:
+                    failed = failed or e
+
+        if failed is not None:
+            for file_id in by_file:
+                self._write_progress(file_id, "failed", error=str(failed))
+            raise failed
+        for file_id in by_file:
+            self._write_progress(file_id, "embedded")
+        return vectors
+
+    def _embed_batch(self, file_id: str, texts: List[str]):
+        """Returns (vectors, came_from_checkpoint)"""
+        digest = hashlib.sha1("\x00".join([self.namespace] + texts).encode("utf-8")).hexdigest()
+        path = os.path.join(self.checkpoint_dir, file_id, f"{digest}.npy")
+        if os.path.exists(path):
+            try:
+                EMBED_BATCHES.labels(result="checkpoint").inc()
+                return np.load(path, allow_pickle=False).tolist(), True
+            except Exception as e:
+                logger.error(f"Unreadable embedding checkpoint {path}: {e}")
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                vectors = self.embeddings.embed_documents(texts)
+                break
+            except Exception as e:
+                if attempt == self.max_retries:
+                    EMBED_BATCHES.labels(result="failed").inc()
+                    logger.error(f"Embedding batch for {file_id} failed after {attempt + 1} attempts: {e}")
+                    raise
+                EMBED_BATCHES.labels(result="retry").inc()
+                # Quota errors clear up with time; back off exponentially
+                time.sleep(self.retry_base_seconds * 2 ** attempt)
+
+        EMBED_BATCHES.labels(result="embedded").inc()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.tmp.npy"
+        np.save(temp_path, np.asarray(vectors, dtype=np.float32), allow_pickle=False)
+        os.replace(temp_path, path)
+        return vectors, False
+
+    def complete(self, file_ids: List[str]):
+        """Drop checkpoints once the vectors are safely committed to the index"""
+        for file_id in file_ids:
+            directory = os.path.join(self.checkpoint_dir, file_id)
+            if not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                if name.endswith(".npy"):
+                    os.remove(os.path.join(directory, name))
+            self._write_progress(file_id, "indexed")
+
+    def queued(self, file_ids: List[str]):
+        """Vectors handed to the index writer; checkpoints stay until it commits"""
+        for file_id in file_ids:
+            self._write_progress(file_id, "queued")
+
+    def progress(self, file_id: Optional[str] = None) -> List[Dict]:
+        """Progress of one file, or of every file with checkpoint state"""
+        if not os.path.isdir(self.checkpoint_dir) or file_id in (".", ".."):
+            return []
+        file_ids = [file_id] if file_id else sorted(os.listdir(self.checkpoint_dir))
+        reports = []
+        for name in file_ids:
+            path = os.path.join(self.checkpoint_dir, name, "progress.json")
+            if os.path.exists(path):
+                with open(path, "r", encoding="utf-8") as f:
+                    reports.append(json.load(f))
+        return reports
+
+    def _write_progress(self, file_id: str, status: str, progress: Optional[Dict] = None, error: str = None):
+        directory = os.path.join(self.checkpoint_dir, file_id)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "progress.json")
+        report = {"file_id": file_id, "status": status, "updated": datetime.now().isoformat()}
+        if progress is None and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    previous = json.load(f)
+                progress = {
+                    key: previous[key]
+                    for key in ("total_batches", "done_batches", "cached_batches") if key in previous
+                }
+            except (OSError, ValueError):
+                progress = None
+        report.update(progress or {})
+        if error:
+            report["error"] = error
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(report, f)
+        os.replace(temp_path, path)
\ No newline at end of file
@@ -1,19 +1,41 @@
-from langgraph.graph import StateGraph, END
-from langchain.schema import BaseMessage
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
 import logging
+from backend.config import Config
+from backend.core.admission import AdmissionRejected
+from backend.core.chunking import count_tokens
+from backend.core.metrics import registry, track_stage
+from backend.core.resilience import DeadlineExceeded, deadline_scope, run_with_deadline
 
 logger = logging.getLogger(__name__)
 
+ROUTE_DECISIONS = registry.counter(
+    "edute_route_decisions_total",
+    "Requests routed to each model tier",
+    ["tier", "agent"]
+)
+COALESCED_REQUESTS = registry.counter(
+    "edute_chat_coalesced_total",
+    "Chat requests that ran the pipeline (leader) or shared an identical in-flight run (follower)",
+    ["role"]
+)
+
 class EdTechWorkflow:
-    def __init__(self, teacher_agent, quiz_agent, revision_agent, vector_store):
+    def __init__(self, teacher_agent, quiz_agent, revision_agent, vector_store, admission=None, summaries=None):
         self.teacher_agent = teacher_agent
         self.quiz_agent = quiz_agent
         self.revision_agent = revision_agent
         self.vector_store = vector_store
+        self.admission = admission
+        # SummaryStore of per-document summary trees, read by revision requests
+        self.summaries = summaries
+        # Coalescing key -> the pipeline run identical requests are waiting on
+        self._in_flight: Dict[Tuple, asyncio.Task] = {}
     
-    def _build_graph(self) -> StateGraph:
+    def _build_graph(self) -> "StateGraph":
         """Build the workflow graph"""
+        from langgraph.graph import StateGraph, END
+        
         graph = StateGraph()
         
         # Add nodes
@@ -24,12 +46,12 @@ class EdTechWorkflow:
         graph.add_node("revision_response", self._revision_response)
         graph.add_node("format_output", self._format_output)
         
-        # Add edges
-        graph.add_edge("route_query", "retrieve_context")
+        # Add edges; routing needs retrieval confidence, so it runs second
+        graph.add_edge("retrieve_context", "route_query")
         
         # Conditional routing based on mode
         graph.add_conditional_edges(
-            "retrieve_context",
+            "route_query",
             self._decide_agent,
             {
                 "teacher": "teacher_response",
@@ -43,7 +65,7 @@ class EdTechWorkflow:
         graph.add_edge("revision_response", "format_output")
         graph.add_edge("format_output", END)
         
-        graph.set_entry_point("route_query")
+        graph.set_entry_point("retrieve_context")
         
         return graph
     
@@ -54,52 +76,160 @@ class EdTechWorkflow:
         student_id: str,
         file_ids: Optional[List[str]] = None
     ) -> Dict[str, Any]:
-        """Process student query through the workflow"""
+        """Process student query through the workflow
+
+        Identical concurrent requests (same mode, normalized query, files and
+        index version) share one pipeline run: the first starts it, the rest
+        wait for it, and every one of them gets its result.
+        """
+        # 1. Choose agent based on mode
+        agent_choice = self._decide_agent({"mode": mode})
+        
+        key = self._coalescing_key(query, mode, file_ids) if Config.CHAT_COALESCING_ENABLED else None
+        task = self._in_flight.get(key) if key else None
+        
+        # Only a request that starts a run is charged; followers ride on one
+        # already paid for. Over-limit students are rejected before spending
+        # an embedding call.
+        if task is None and self.admission:
+            self.admission.admit(student_id, Config.AGENT_COST.get(agent_choice, 1.0))
         
+        if key is None:
+            return await self._run_pipeline(query, mode, agent_choice)
+        
+        if task is None:
+            COALESCED_REQUESTS.labels(role="leader").inc()
+            # A task of its own, so the leader's client going away does not
+            # cancel the run the followers are waiting on
+            task = asyncio.ensure_future(self._run_shared(query, mode, agent_choice))
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        else:
+            COALESCED_REQUESTS.labels(role="follower").inc()
+        
+        # Each request still gives up at its own deadline
+        result = await run_with_deadline(asyncio.shield(task), "coalesced request")
+        return {**result, "mode": mode}
+    
+    def _coalescing_key(self, query: str, mode: str, file_ids: Optional[List[str]]) -> Tuple:
+        """Requests with equal keys get the same answer"""
+        return (
+            self._decide_agent({"mode": mode}),
+            " ".join(query.lower().split()),
+            tuple(sorted(file_ids or [])),
+            # A new index version may retrieve differently (sharded stores have none)
+            getattr(self.vector_store, "version", None)
+        )
+    
+    async def _run_shared(self, query: str, mode: str, agent_choice: str) -> Dict[str, Any]:
+        """A coalesced run, bounded by the server's deadline rather than the leader's
+
+        The task would otherwise inherit the leader's deadline, which its
+        client may have shortened, and fail followers that had time left.
+        """
+        with deadline_scope(Config.CHAT_DEADLINE_SECONDS):
+            return await self._run_pipeline(query, mode, agent_choice)
+    
+    async def _run_pipeline(self, query: str, mode: str, agent_choice: str) -> Dict[str, Any]:
+        """Retrieve, route and generate once for an admitted request"""
         try:
-            # 1. Retrieve context
-            search_results = self.vector_store.similarity_search(query, k=5)
+            agents = {
+                "teacher": self.teacher_agent,
+                "quiz": self.quiz_agent,
+                "revision": self.revision_agent
+            }
+            agent = agents[agent_choice]
+            
+            # 2. Retrieve context, keeping only chunks that score well; the
+            # embedding call and scan run off the loop within the deadline
+            search_results = await run_with_deadline(
+                asyncio.to_thread(self._search, query, agent_choice),
+                "retrieval"
+            )
             context_docs = [doc for doc, score in search_results]
             
-            # 2. Choose agent based on mode
-            if mode.lower() in ["learn", "explain", "teach"]:
-                agent = self.teacher_agent
-            elif mode.lower() in ["quiz", "test", "questions"]:
-                agent = self.quiz_agent
-            elif mode.lower() in ["revision", "review", "summary"]:
-                agent = self.revision_agent
-            else:
-                agent = self.teacher_agent  # Default
+            # 3. Pick a model tier from the query and retrieval confidence
+            state = await self._route_query({
+                "query": query,
+                "mode": mode,
+                "source_scores": [score for doc, score in search_results]
+            })
             
-            # 3. Process with selected agent
-            result = await agent.process(query, context_docs)
+            # 4. Process with selected agent once an LLM slot is free
+            if self.admission:
+                priority = Config.AGENT_PRIORITY.get(agent_choice, 1)
+                async with self.admission.slot(priority):
+                    result = await agent.process(query, context_docs, model_tier=state["model_tier"])
+            else:
+                result = await agent.process(query, context_docs, model_tier=state["model_tier"])
             
             return {
                 "content": result.get("content", "No response generated"),
                 "agent_type": result.get("agent_type", "unknown"),
                 "confidence": result.get("confidence", 0.0),
                 "sources": result.get("sources", []),
+                "source_scores": [score for doc, score in search_results],
+                "degraded": result.get("degraded", False),
+                "model_tier": state["model_tier"],
                 "mode": mode
             }
+        except (DeadlineExceeded, AdmissionRejected):
+            raise
         except Exception as e:
             logger.error(f"Workflow execution error: {e}")
             return {
                 "content": "I apologize, but I encountered an error processing your request.",
                 "agent_type": "error",
                 "confidence": 0.0,
-                "sources": []
+                "sources": [],
+                "source_scores": []
             }
     
+    def _search(
+        self,
+        query: str,
+        agent_choice: str,
+        filter_dict: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple[Any, float]]:
+        """Adaptive retrieval sized by the agent's (min_k, max_k) range"""
+        min_k, max_k = Config.RETRIEVAL_K_RANGE.get(agent_choice, (1, Config.TOP_K_DOCS))
+        results = self.vector_store.relevance_search(
+            query,
+            min_k=min_k,
+            max_k=max_k,
+            filter_dict=filter_dict
+        )
+        if Config.PARENT_DOCUMENT_MODE:
+            results = self.vector_store.expand_to_parents(results, Config.PARENT_MAX_SECTIONS)
+        
+        if agent_choice == "revision" and self.summaries is not None:
+            # Whole-topic revision reads summaries from the level of the tree
+            # that fits the prompt budget instead of a handful of chunks
+            with track_stage("summary_search"):
+                nodes, covered = self.summaries.search(
+                    self.vector_store.embed_query(query),
+                    self.vector_store.settings["embedding_model"],
+                    Config.SUMMARY_CONTEXT_TOKENS,
+                    file_ids=[filter_dict["file_id"]] if filter_dict and "file_id" in filter_dict else None
+                )
+            if nodes:
+                # Files whose tree is not built yet still contribute chunks
+                return nodes + [
+                    (doc, score) for doc, score in results
+                    if doc.metadata.get("file_id") not in covered
+                ]
+        return results
+    
     async def _execute_graph(self, initial_state: Dict[str, Any]) -> Dict[str, Any]:
         """Execute graph nodes sequentially (simplified execution)"""
         state = initial_state.copy()
         
-        # Route query
-        state = await self._route_query(state)
-        
         # Retrieve context
         state = await self._retrieve_context(state)
         
+        # Route query
+        state = await self._route_query(state)
+        
         # Decide and execute agent
         agent_choice = self._decide_agent(state)
         
@@ -116,8 +246,26 @@ class EdTechWorkflow:
         return state
     
     async def _route_query(self, state: Dict[str, Any]) -> Dict[str, Any]:
-        """Initial query routing and validation"""
-        # Could add query preprocessing, intent detection, etc.
+        """Choose a model tier with a cheap local classification
+
+        Short teacher questions whose best retrieved chunk is a confident
+        match are factual lookups and go to the fast tier; quiz and revision
+        generations, long questions and weak retrieval go to the full model.
+        """
+        agent_choice = self._decide_agent(state)
+        scores = state.get("source_scores") or [0.0]
+        
+        if (
+            agent_choice == "teacher"
+            and count_tokens(state["query"]) <= Config.FAST_TIER_MAX_QUERY_TOKENS
+            and max(scores) >= Config.FAST_TIER_MIN_CONFIDENCE
+        ):
+            tier = "fast"
+        else:
+            tier = "full"
+        
+        ROUTE_DECISIONS.labels(tier=tier, agent=agent_choice).inc()
+        state["model_tier"] = tier
         return state
     
     async def _retrieve_context(self, state: Dict[str, Any]) -> Dict[str, Any]:
@@ -131,15 +279,12 @@ class EdTechWorkflow:
             filter_dict = {"file_id": file_ids[0]}  # Simplified - could handle multiple files
         
         # Search for relevant documents
-        search_results = self.vector_store.similarity_search(
-            query, 
-            k=5,
-            filter_dict=filter_dict
-        )
+        search_results = self._search(query, self._decide_agent(state), filter_dict)
         
         # Extract documents from results
         context_docs = [doc for doc, score in search_results]
         state["context_docs"] = context_docs
+        state["source_scores"] = [score for doc, score in search_results]
         
         return state
     
@@ -160,7 +305,8 @@ class EdTechWorkflow:
         """Generate teacher response"""
         response = await self.teacher_agent.process(
             state["query"],
-            state["context_docs"]
+            state["context_docs"],
+            model_tier=state.get("model_tier", "full")
         )
         state["agent_response"] = response
         return state
@@ -169,7 +315,8 @@ class EdTechWorkflow:
         """Generate quiz response"""
         response = await self.quiz_agent.process(
             state["query"],
-            state["context_docs"]
+            state["context_docs"],
+            model_tier=state.get("model_tier", "full")
         )
         state["agent_response"] = response
         return state
@@ -178,7 +325,8 @@ class EdTechWorkflow:
         """Generate revision response"""
         response = await self.revision_agent.process(
             state["query"],
-            state["context_docs"]
+            state["context_docs"],
+            model_tier=state.get("model_tier", "full")
         )
         state["agent_response"] = response
         return state
@@ -192,6 +340,8 @@ class EdTechWorkflow:
             "agent_type": agent_response.get("agent_type", "unknown"),
             "confidence": agent_response.get("confidence", 0.0),
             "sources": agent_response.get("sources", []),
+            "source_scores": state.get("source_scores", []),
+            "model_tier": state.get("model_tier", "full"),
             "mode": state["mode"]
         }
         
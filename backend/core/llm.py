@@ -1,41 +1,172 @@
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain.schema import BaseMessage
-from typing import List, Optional
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+import threading
+import time
 import logging
 from backend.config import Config  # Import config directly
+from backend.core.metrics import track_stage, record_llm_tokens, registry
+from backend.core.resilience import (
+    CircuitBreaker, LatencyTracker, LLMUnavailableError, DeadlineExceeded,
+    hedged, run_with_deadline, remaining_time, deadline_set_by_client
+)
+
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage
 
 logger = logging.getLogger(__name__)
 
+LLM_CALLS = registry.counter(
+    "edute_llm_calls_total",
+    "Gemini calls by tier and outcome (ok, error, timeout, hedged, rejected)",
+    ["tier", "outcome"]
+)
+LLM_SECONDS = registry.histogram(
+    "edute_llm_seconds",
+    "Wall-clock time of successful Gemini calls by tier",
+    ["tier"]
+)
+
+class _Tier:
+    """One model configuration with its own breaker and latency history
+
+    The client is built on first use: langchain_google_genai takes about a
+    second to import, which would otherwise land on every worker's boot.
+    """
+    
+    def __init__(self, name: str, llm=None, factory: Optional[Callable] = None):
+        self.name = name
+        self._llm = llm
+        self._factory = factory
+        self._lock = threading.Lock()
+        self.breaker = CircuitBreaker(
+            failure_threshold=Config.LLM_BREAKER_FAILURES,
+            reset_timeout=Config.LLM_BREAKER_RESET_SECONDS
+        )
+        self.latency = LatencyTracker()
+    
+    @property
+    def llm(self):
+        if self._llm is None:
+            with self._lock:
+                if self._llm is None:
+                    self._llm = self._factory()
+        return self._llm
+
 class GeminiLLMWrapper:
-    def __init__(self):
-        """Initialize with config values directly"""
-        self.llm = ChatGoogleGenerativeAI(
+    def __init__(self, llm=None):
+        """Initialize with config values directly
+
+        Pass llm (e.g. backend.core.fakes.FakeChatModel) to run every tier
+        against a local fake instead of Gemini.
+        """
+        self.tiers: Dict[str, _Tier] = {
+            name: _Tier(name, llm, lambda settings=settings: self._build_llm(settings))
+            for name, settings in Config.MODEL_TIERS.items()
+        }
+        self.breaker = self.tiers["full"].breaker
+        self.latency = self.tiers["full"].latency
+    
+    @property
+    def llm(self):
+        return self.tiers["full"].llm
+    
+    def _build_llm(self, settings: Dict):
+        if Config.LLM_BACKEND == "fake":
+            from backend.core.fakes import FakeChatModel
+            return FakeChatModel(
+                latency=Config.FAKE_LLM_LATENCY_SECONDS,
+                jitter=Config.FAKE_LLM_JITTER_SECONDS
+            )
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        return ChatGoogleGenerativeAI(
             google_api_key=Config.GEMINI_API_KEY,
-            model=Config.GEMINI_MODEL,
-            temperature=0.3,
-            max_output_tokens=2048,
+            model=settings["model"],
+            temperature=settings.get("temperature", 0.3),
+            max_output_tokens=settings.get("max_output_tokens", 2048),
         )
     
     async def generate_response(
         self, 
-        messages: List[BaseMessage], 
+        messages: List["BaseMessage"], 
+        tier: str = "full",
         **kwargs
     ) -> str:
+        """Generate a reply on the given model tier within the request deadline
+
+        Raises LLMUnavailableError when the circuit is open, the call fails,
+        or the deadline leaves too little time, so callers can degrade.
+        """
+        model = self.tiers.get(tier) or self.tiers["full"]
+        calls = lambda outcome: LLM_CALLS.labels(tier=model.name, outcome=outcome)
+        
+        if not model.breaker.allow():
+            calls("rejected").inc()
+            raise LLMUnavailableError(f"Circuit breaker is open for the {model.name} tier")
+        
+        remaining = remaining_time()
+        if remaining is not None and remaining < Config.LLM_MIN_BUDGET_SECONDS:
+            calls("timeout").inc()
+            raise LLMUnavailableError("Not enough time left for generation")
+        
+        async def attempt():
+            started = time.perf_counter()
+            response = await model.llm.ainvoke(messages, **kwargs)
+            elapsed = time.perf_counter() - started
+            model.latency.observe(elapsed)
+            LLM_SECONDS.labels(tier=model.name).observe(elapsed)
+            return response
+        
         try:
-            response = await self.llm.ainvoke(messages, **kwargs)
-            return response.content
+            with track_stage("llm_generate"):
+                response = await run_with_deadline(
+                    hedged(
+                        attempt,
+                        self._hedge_delay(model),
+                        on_hedge=calls("hedged").inc
+                    ),
+                    "generation"
+                )
+        except DeadlineExceeded as e:
+            # A client asking for a short deadline must not open the shared
+            # circuit for everyone; only the server's own budget counts
+            if deadline_set_by_client():
+                model.breaker.record_abandoned()
+            else:
+                model.breaker.record_failure()
+            calls("timeout").inc()
+            logger.error(f"LLM generation timed out on {model.name} tier: {e}")
+            raise LLMUnavailableError(str(e)) from e
         except Exception as e:
-            logger.error(f"LLM generation error: {e}")
-            return "I apologize, but I'm having trouble generating a response right now."
+            model.breaker.record_failure()
+            calls("error").inc()
+            logger.error(f"LLM generation error on {model.name} tier: {e}")
+            raise LLMUnavailableError(str(e)) from e
+        
+        model.breaker.record_success()
+        calls("ok").inc()
+        self._record_usage(response, model.name)
+        return response.content
+    
+    def _hedge_delay(self, model: _Tier) -> Optional[float]:
+        """Fire a duplicate request once the first is slower than the tier's usual p95"""
+        if not Config.LLM_HEDGE_ENABLED:
+            return None
+        observed = model.latency.percentile(Config.LLM_HEDGE_PERCENTILE)
+        return observed if observed is not None else Config.LLM_HEDGE_DELAY_SECONDS
     
     def generate_response_sync(
         self, 
-        messages: List[BaseMessage], 
+        messages: List["BaseMessage"], 
         **kwargs
     ) -> str:
         try:
-            response = self.llm.invoke(messages, **kwargs)
+            with track_stage("llm_generate"):
+                response = self.llm.invoke(messages, **kwargs)
+            self._record_usage(response)
             return response.content
         except Exception as e:
             logger.error(f"LLM generation error: {e}")
-            return "I apologize, but I'm having trouble generating a response right now."
\ No newline at end of file
+            return "I apologize, but I'm having trouble generating a response right now."
+    
+    def _record_usage(self, response, tier: str = "full"):
+        usage = getattr(response, "usage_metadata", None) or {}
+        record_llm_tokens(usage.get("input_tokens", 0), usage.get("output_tokens", 0), tier)
\ No newline at end of file
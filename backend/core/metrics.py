@@ -0,0 +1,235 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+import bisect
+import threading
+import time
+
+# Latency buckets in seconds, from sub-millisecond searches to slow LLM calls
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0
+)
+
+class _Metric:
+    """A metric family; each distinct label combination gets its own child"""
+    kind = ""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+    
+    def labels(self, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+    
+    def _new_child(self):
+        raise NotImplementedError
+    
+    def _label_text(self, key: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labelnames, key)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for key, child in sorted(self._children.items()):
+            lines.extend(self._render_child(key, child))
+        return lines
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+    
+    def set(self, value: float):
+        self.value = value
+
+class Counter(_Metric):
+    kind = "counter"
+    
+    def _new_child(self):
+        return _Value()
+    
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+    
+    def _render_child(self, key, child):
+        return [f"{self.name}{self._label_text(key)} {child.value}"]
+
+class Gauge(Counter):
+    kind = "gauge"
+    
+    def set(self, value: float):
+        self.labels().set(value)
+
+class _HistogramValue:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+            self.count += 1
+    
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started)
+
+class Histogram(_Metric):
+    kind = "histogram"
+    
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+    
+    def _new_child(self):
+        return _HistogramValue(self.buckets)
+    
+    def observe(self, value: float):
+        self.labels().observe(value)
+    
+    def _render_child(self, key, child):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(list(self.buckets) + ["+Inf"], child.counts):
+            cumulative += count
+            le = 'le="%s"' % bound
+            lines.append(f"{self.name}_bucket{self._label_text(key, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{self._label_text(key)} {child.sum}")
+        lines.append(f"{self.name}_count{self._label_text(key)} {child.count}")
+        return lines
+
+class MetricsRegistry:
+    """In-process metrics rendered in the Prometheus text exposition format"""
+    
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+    
+    def _register(self, cls, name: str, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args, **kwargs)
+            return self._metrics[name]
+    
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, documentation, labelnames)
+    
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, documentation, labelnames)
+    
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram, name, documentation, labelnames, buckets)
+    
+    def render(self) -> str:
+        lines = []
+        for name in sorted(self._metrics):
+            lines.extend(self._metrics[name].render())
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "edute_stage_duration_seconds",
+    "Time spent in each pipeline stage",
+    ["stage"]
+)
+REQUEST_SECONDS = registry.histogram(
+    "edute_request_duration_seconds",
+    "End-to-end API request latency",
+    ["endpoint"]
+)
+LLM_TOKENS = registry.counter(
+    "edute_llm_tokens_total",
+    "Tokens consumed by Gemini calls",
+    ["tier", "direction"]
+)
+CACHE_REQUESTS = registry.counter(
+    "edute_cache_requests_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"]
+)
+INDEX_VECTORS = registry.gauge(
+    "edute_index_vectors",
+    "Vectors in the published index, including tombstoned ones"
+)
+INDEX_TOMBSTONES = registry.gauge(
+    "edute_index_tombstones",
+    "Deleted chunks awaiting compaction"
+)
+INDEX_VERSION = registry.gauge(
+    "edute_index_version",
+    "Version number of the published index"
+)
+
+# Per-request stage breakdown (milliseconds), filled in by track_stage
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+@contextmanager
+def request_timings() -> Iterator[Dict[str, float]]:
+    """Collect the stage timings of everything run inside this block"""
+    timings: Dict[str, float] = {}
+    token = _request_timings.set(timings)
+    started = time.perf_counter()
+    try:
+        yield timings
+    finally:
+        timings["total"] = round((time.perf_counter() - started) * 1000, 2)
+        _request_timings.reset(token)
+
+@contextmanager
+def track_stage(stage: str) -> Iterator[None]:
+    """Time a pipeline stage into the stage histogram and request breakdown"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.labels(stage=stage).observe(elapsed)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = round(timings.get(stage, 0.0) + elapsed * 1000, 2)
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache=cache, result="hit" if hit else "miss").inc()
+
+def record_llm_tokens(input_tokens: int, output_tokens: int, tier: str = "full"):
+    if input_tokens:
+        LLM_TOKENS.labels(tier=tier, direction="input").inc(input_tokens)
+    if output_tokens:
+        LLM_TOKENS.labels(tier=tier, direction="output").inc(output_tokens)
\ No newline at end of file
@@ -0,0 +1,96 @@
+from langchain.docstore.document import Document
+from typing import Dict, Iterable, List, Optional
+import json
+import os
+import sqlite3
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ParentStore:
+    """Parent sections for small-to-big retrieval, keyed by parent_id
+
+    Only the small child chunks are embedded; the larger sections they were
+    cut from live here, in SQLite so every worker process can read what any
+    of them wrote without loading the whole corpus. Parent ids look like
+    "<batch>-<n>", where batch is unique to one chunking run of a file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS parents ("
+                "parent_id TEXT PRIMARY KEY, file_id TEXT, batch TEXT, text TEXT, metadata TEXT)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS parents_file_id ON parents (file_id)")
+            self._local.conn = conn
+        return conn
+
+    def put_many(self, parents: Iterable[Document]):
+        rows = [
+            (
+                doc.metadata["parent_id"],
+                doc.metadata.get("file_id"),
+                doc.metadata["parent_id"].rsplit("-", 1)[0],
+                doc.page_content,
+                json.dumps(doc.metadata, ensure_ascii=False)
+            )
+            for doc in parents
+        ]
+        conn = self._connection()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO parents VALUES (?, ?, ?, ?, ?)", rows)
+
+    def get_many(self, parent_ids: Iterable[str]) -> Dict[str, Document]:
+        parent_ids = list(dict.fromkeys(parent_ids))
+        if not parent_ids:
+            return {}
+        placeholders = ",".join("?" * len(parent_ids))
+        rows = self._connection().execute(
+            f"SELECT parent_id, text, metadata FROM parents WHERE parent_id IN ({placeholders})",
+            parent_ids
+        )
+        return {
+            parent_id: Document(page_content=text, metadata=json.loads(metadata))
+            for parent_id, text, metadata in rows
+        }
+
+    def delete_file(self, file_id: str, keep_batch: Optional[str] = None) -> int:
+        """Drop a file's parents, except those of keep_batch (a replacement's own)"""
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute(
+                "DELETE FROM parents WHERE file_id = ? AND batch IS NOT ?",
+                (file_id, keep_batch)
+            )
+        return cursor.rowcount
+
+    def delete_batch(self, batch: str) -> int:
+        """Drop every parent of one chunking run (an abandoned re-index)"""
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute("DELETE FROM parents WHERE batch = ?", (batch,))
+        return cursor.rowcount
+
+def parent_batches_of(documents: List[Document]) -> List[str]:
+    """Every chunking batch among child documents (a multi-file upload has several)"""
+    return list(dict.fromkeys(
+        doc.metadata["parent_id"].rsplit("-", 1)[0]
+        for doc in documents if "parent_id" in doc.metadata
+    ))
+
+def parent_batch_of(documents: List[Document]) -> Optional[str]:
+    """The chunking batch child documents belong to, if they have parents"""
+    for doc in documents:
+        if "parent_id" in doc.metadata:
+            return doc.metadata["parent_id"].rsplit("-", 1)[0]
+    return None
\ No newline at end of file
@@ -0,0 +1,182 @@
+from collections import Counter
+from datetime import datetime
+from typing import Dict, List, Optional
+import os
+import sys
+import threading
+import time
+import uuid
+import logging
+
+from backend.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Leaf frames of threads that are parked rather than doing work
+_IDLE_LEAVES = {
+    ("selectors", "select"),
+    ("selectors", "EpollSelector.select"),
+    ("threading", "Condition.wait"),
+    ("threading", "Event.wait"),
+    ("queue", "Queue.get"),
+    ("concurrent.futures.thread", "_worker"),
+}
+
+def _frame_name(frame) -> str:
+    module = frame.f_globals.get("__name__", "?")
+    return f"{module}:{frame.f_code.co_qualname}"
+
+class Profiler:
+    """Wall-clock sampling profiler producing folded stacks
+
+    While at least one profiled request is in flight a daemon thread samples
+    every thread's stack; each sample is added to every open collection.
+    Stacks keep qualified names, so EdTechWorkflow and VectorStoreManager
+    stages show up as their own frames. Samples from other requests running
+    at the same time are included too.
+    """
+
+    def __init__(self, interval: float, output_dir: str, keep: int = 50):
+        self.interval = interval
+        self.output_dir = output_dir
+        self.keep = keep
+        self._armed = 0
+        self._collections: Dict[str, Counter] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def arm(self, requests: int):
+        """Profile the next N matching requests"""
+        with self._lock:
+            self._armed = requests
+
+    @property
+    def armed(self) -> int:
+        return self._armed
+
+    def take_armed(self) -> bool:
+        with self._lock:
+            if self._armed <= 0:
+                return False
+            self._armed -= 1
+            return True
+
+    def start(self) -> str:
+        profile_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+        with self._lock:
+            self._collections[profile_id] = Counter()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+                self._thread.start()
+        return profile_id
+
+    def stop(self, profile_id: str, label: str) -> str:
+        """Finish a collection and write it as <profile_id>.folded"""
+        with self._lock:
+            samples = self._collections.pop(profile_id, Counter())
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"{profile_id}.folded")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"# {label} interval={self.interval}s samples={sum(samples.values())}\n")
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        self._prune()
+        return path
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while True:
+            with self._lock:
+                if not self._collections:
+                    self._thread = None
+                    return
+            stacks = self._sample(own)
+            with self._lock:
+                for samples in self._collections.values():
+                    samples.update(stacks)
+            time.sleep(self.interval)
+
+    def _sample(self, own: int) -> List[str]:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            leaf = (frame.f_globals.get("__name__"), frame.f_code.co_qualname)
+            if leaf in _IDLE_LEAVES:
+                continue
+            frames = []
+            while frame is not None:
+                frames.append(_frame_name(frame))
+                frame = frame.f_back
+            frames.append(names.get(ident, str(ident)))
+            stacks.append(";".join(reversed(frames)))
+        return stacks
+
+    def list_profiles(self) -> List[Dict[str, object]]:
+        if not os.path.isdir(self.output_dir):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(self.output_dir), reverse=True):
+            if name.endswith(".folded"):
+                path = os.path.join(self.output_dir, name)
+                profiles.append({
+                    "profile_id": name[:-len(".folded")],
+                    "size": os.path.getsize(path),
+                    "created": datetime.fromtimestamp(os.path.getmtime(path)).isoformat()
+                })
+        return profiles
+
+    def profile_path(self, profile_id: str) -> Optional[str]:
+        path = os.path.join(self.output_dir, f"{os.path.basename(profile_id)}.folded")
+        return path if os.path.exists(path) else None
+
+    def _prune(self):
+        for stale in self.list_profiles()[self.keep:]:
+            try:
+                os.remove(os.path.join(self.output_dir, f"{stale['profile_id']}.folded"))
+            except OSError as e:
+                logger.error(f"Error removing old profile {stale['profile_id']}: {e}")
+
+profiler = Profiler(Config.PROFILE_SAMPLE_INTERVAL, Config.PROFILE_DIR, Config.PROFILES_TO_KEEP)
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling requests that opt in
+
+    A request is profiled when the admin endpoint armed the next N requests
+    or it carries an X-Profile header equal to the admin token. The profile
+    id comes back in the X-Profile-Id response header. Only installed when
+    Config.ADMIN_TOKEN is set, so it costs nothing otherwise.
+    """
+
+    def __init__(self, app, paths=("/api/chat", "/api/upload")):
+        self.app = app
+        self.paths = tuple(paths)
+        self.token = Config.ADMIN_TOKEN.encode()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.paths):
+            return await self.app(scope, receive, send)
+        if not (self._requested(scope) or profiler.take_armed()):
+            return await self.app(scope, receive, send)
+
+        profile_id = profiler.start()
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            path = profiler.stop(profile_id, f"{scope['method']} {scope['path']}")
+            logger.info(f"Stored request profile {path}")
+
+    def _requested(self, scope) -> bool:
+        for name, value in scope["headers"]:
+            if name == b"x-profile":
+                return value == self.token
+        return False
\ No newline at end of file
@@ -0,0 +1,129 @@
+from typing import Dict, Iterable, List, Optional, Sequence
+import json
+import os
+import shutil
+import logging
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rows copied per step when rewriting the full-precision file
+_COPY_BLOCK = 4096
+
+def index_factory_for(mode: str, pq_m: int = 96, pq_bits: int = 8) -> Optional[str]:
+    """FAISS factory string for a quantization mode, or None for exact float32
+
+    sq8 stores one byte per dimension (4x smaller than float32), sq4 half a
+    byte (8x) and pq pq_m codes of pq_bits each.
+    """
+    if mode in ("", "none", None):
+        return None
+    if mode == "sq8":
+        return "SQ8"
+    if mode == "sq4":
+        return "SQ4"
+    if mode == "pq":
+        return f"PQ{pq_m}x{pq_bits}"
+    raise ValueError(f"Unknown quantization mode: {mode}")
+
+def is_exact(index) -> bool:
+    return isinstance(index, faiss.IndexFlat)
+
+def quantize(vectors: np.ndarray, factory: str) -> faiss.Index:
+    """Train a compressed index on vectors and add them to it"""
+    vectors = np.ascontiguousarray(vectors, dtype="float32")
+    index = faiss.index_factory(vectors.shape[1], factory, faiss.METRIC_L2)
+    if not index.is_trained:
+        index.train(vectors)
+    index.add(vectors)
+    return index
+
+class FullPrecisionVectors:
+    """Float32 vectors kept on disk for exact re-ranking, keyed by docstore id
+
+    vectors.npy is memory-mapped, so only the rows of the candidates being
+    re-ranked are paged in; ids.json gives the docstore id of each row.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, "ids.json"), "r", encoding="utf-8") as f:
+            self.ids: List[str] = json.load(f)
+        self.rows: Dict[str, int] = {doc_id: row for row, doc_id in enumerate(self.ids)}
+        self.matrix = np.load(os.path.join(directory, "vectors.npy"), mmap_mode="r")
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def lookup(self, doc_ids: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Vectors of the ids that are present; missing ids are left out"""
+        found = [(doc_id, self.rows[doc_id]) for doc_id in doc_ids if doc_id in self.rows]
+        if not found:
+            return {}
+        # Reading rows in file order keeps page faults sequential
+        order = sorted(found, key=lambda item: item[1])
+        block = self.matrix[[row for _, row in order]]
+        return {doc_id: block[i] for i, (doc_id, _) in enumerate(order)}
+
+    @classmethod
+    def write(
+        cls,
+        directory: str,
+        dimension: int,
+        base: Optional["FullPrecisionVectors"] = None,
+        keep_ids: Optional[Iterable[str]] = None,
+        new_ids: Sequence[str] = (),
+        new_vectors: Optional[np.ndarray] = None
+    ) -> "FullPrecisionVectors":
+        """Write base's rows for keep_ids (all when None) plus the new rows"""
+        kept: List[str] = []
+        if base is not None:
+            if keep_ids is None:
+                kept = list(base.ids)
+            else:
+                keep_ids = set(keep_ids)
+                kept = [doc_id for doc_id in base.ids if doc_id in keep_ids]
+        new_ids = list(new_ids)
+
+        temp_dir = f"{directory}.tmp"
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        os.makedirs(temp_dir)
+        out = np.lib.format.open_memmap(
+            os.path.join(temp_dir, "vectors.npy"),
+            mode="w+",
+            dtype="float32",
+            shape=(len(kept) + len(new_ids), dimension)
+        )
+        for start in range(0, len(kept), _COPY_BLOCK):
+            rows = [base.rows[doc_id] for doc_id in kept[start:start + _COPY_BLOCK]]
+            out[start:start + len(rows)] = base.matrix[rows]
+        if new_ids:
+            out[len(kept):] = np.asarray(new_vectors, dtype="float32")
+        out.flush()
+        del out
+
+        with open(os.path.join(temp_dir, "ids.json"), "w", encoding="utf-8") as f:
+            json.dump(kept + new_ids, f)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(temp_dir, directory)
+        return cls(directory)
+
+def exact_rerank(
+    full: FullPrecisionVectors,
+    query: np.ndarray,
+    hits: List[tuple]
+) -> List[tuple]:
+    """Re-score (doc_id, doc, distance) hits with exact squared L2 distances
+
+    Hits whose vectors are not on disk keep their approximate distance.
+    """
+    vectors = full.lookup([doc_id for doc_id, _, _ in hits])
+    rescored = []
+    for doc_id, doc, distance in hits:
+        vector = vectors.get(doc_id)
+        if vector is not None:
+            distance = float(np.sum((vector - query) ** 2))
+        rescored.append((doc_id, doc, distance))
+    rescored.sort(key=lambda hit: hit[2])
+    return rescored
\ No newline at end of file
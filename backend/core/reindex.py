@@ -0,0 +1,311 @@
+"""Zero-downtime re-index of the vector store under the current settings
+
+    python -m backend.core.reindex            # with the index writer stopped
+    python -m backend.core.reindex --enqueue  # hand it to the running writer
+
+Changing the embedding model, chunk sizes or index type only affects new
+uploads until the index is rebuilt. This builds a shadow index next to the
+live one (<VECTOR_STORE_PATH>.shadow) from the stored uploads in
+Config.UPLOAD_DIR, or the extraction cache for bulk-ingested files, while
+the live index keeps serving and taking uploads. The shadow is checked
+against sample queries, caught up with files added or deleted meanwhile,
+and published as the next live version in one step; reader workers remap
+it like any other version. Progress is written to Config.REINDEX_STATUS_PATH.
+"""
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+import logging
+from backend.config import Config
+from backend.core.metrics import registry
+from backend.core.parents import parent_batch_of
+from backend.core.vectorstore import VectorStoreManager
+
+logger = logging.getLogger(__name__)
+
+REINDEX_FILES = registry.gauge(
+    "edute_reindex_files",
+    "Files in the running re-index (total, done)",
+    ["state"]
+)
+REINDEX_CHUNKS_PER_SECOND = registry.gauge(
+    "edute_reindex_chunks_per_second",
+    "Chunks embedded per second by the running re-index"
+)
+
+ACTIVE_PHASES = ("starting", "indexing", "verifying", "cutover")
+
+def read_status() -> Dict[str, Any]:
+    """The last re-index status written by any process"""
+    if not os.path.exists(Config.REINDEX_STATUS_PATH):
+        return {"phase": "idle"}
+    try:
+        with open(Config.REINDEX_STATUS_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Unreadable re-index status: {e}")
+        return {"phase": "unknown"}
+
+def in_progress(status: Dict[str, Any]) -> bool:
+    """Whether a status belongs to a re-index that is still running on this host"""
+    if status.get("phase") not in ACTIVE_PHASES:
+        return False
+    try:
+        os.kill(status["pid"], 0)
+    except (KeyError, TypeError, ProcessLookupError):
+        return False  # its process died mid-run
+    except PermissionError:
+        pass
+    return True
+
+class Reindexer:
+    """Rebuilds a live VectorStoreManager's index in a shadow and swaps it in
+
+    Must run where the live store is writable (standalone server or the
+    index writer); the cutover takes its write lock so no commit lands
+    between the final catch-up and the swap.
+    """
+
+    def __init__(self, live: VectorStoreManager):
+        self.live = live
+        self.shadow_path = f"{live.store_path}.shadow"
+        self.status: Dict[str, Any] = {"phase": "idle"}
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> bool:
+        """Re-index in a background thread; False if one is already running"""
+        if self.running:
+            return False
+        self._thread = threading.Thread(target=self.run, name="reindex", daemon=True)
+        self._thread.start()
+        return True
+
+    def run(self) -> Dict[str, Any]:
+        """Build, verify and swap in the shadow index; returns the final status"""
+        self._started = time.time()
+        self.status = {
+            "phase": "starting",
+            "pid": os.getpid(),
+            "started": datetime.now().isoformat(),
+            "settings": None,
+            "files_total": 0,
+            "files_done": 0,
+            "chunks": 0,
+        }
+        self._write_status()
+        # file_id -> parent batch of its rebuilt chunks, dropped if we abort
+        self._batches: Dict[str, Optional[str]] = {}
+        shadow = None
+        try:
+            from backend.core.embeddings import EmbeddingManager
+
+            shutil.rmtree(self.shadow_path, ignore_errors=True)
+            shadow = VectorStoreManager(store_path=self.shadow_path)
+            # Own checkpoints: a crashed re-index resumes, upload progress stays untouched
+            shadow.embedder.checkpoint_dir = os.path.join(Config.EMBED_CHECKPOINT_DIR, "_reindex")
+            embedding_manager = EmbeddingManager()
+            self.status["settings"] = shadow.settings
+
+            file_ids = sorted(self.live.file_ids())
+            self.status.update(phase="indexing", files_total=len(file_ids))
+            self._index_files(shadow, embedding_manager, file_ids)
+
+            self._set(phase="verifying")
+            verification = self.verify(shadow, file_ids)
+            self.status["verification"] = verification
+            if not verification["passed"]:
+                raise ValueError(f"Shadow index failed verification: {verification}")
+
+            self._set(phase="cutover")
+            # Catch up outside the lock first so writes pause only for the remainder
+            self._catch_up(shadow, embedding_manager)
+            with self.live._write_lock:
+                self._catch_up(shadow, embedding_manager)
+                self.live.adopt_index(shadow)
+                for file_id, batch in self._batches.items():
+                    # Parent sections of the replaced chunks
+                    self.live.parents.delete_file(file_id, keep_batch=batch)
+            shutil.rmtree(self.shadow_path, ignore_errors=True)
+            shutil.rmtree(shadow.embedder.checkpoint_dir, ignore_errors=True)
+            self._set(phase="done", version=self.live.version, finished=datetime.now().isoformat())
+            logger.info(f"Re-index complete: {self.status['files_done']} files, {self.status['chunks']} chunks")
+        except Exception as e:
+            logger.error(f"Re-index failed: {e}")
+            for batch in self._batches.values():
+                if batch:
+                    self.live.parents.delete_batch(batch)
+            shutil.rmtree(self.shadow_path, ignore_errors=True)
+            self._set(phase="failed", error=str(e), finished=datetime.now().isoformat())
+        finally:
+            REINDEX_CHUNKS_PER_SECOND.set(0)
+            self.live._update_index_gauges()
+        return self.status
+
+    def _sources(self, file_ids: Iterable[str]) -> Dict[str, Dict[str, Optional[str]]]:
+        """file_id -> {"source", "path"}; path is None when only the extraction cache has it"""
+        file_ids = set(file_ids)
+        sources = {
+            doc.metadata.get("file_id"): {"source": doc.metadata.get("source"), "path": None}
+            for doc in self.live.vector_store.docstore._dict.values()
+            if doc.metadata.get("file_id") in file_ids
+        }
+        if os.path.isdir(Config.UPLOAD_DIR):
+            for name in os.listdir(Config.UPLOAD_DIR):
+                file_id, _, filename = name.partition("_")
+                if file_id in sources and filename:
+                    sources[file_id] = {"source": filename, "path": os.path.join(Config.UPLOAD_DIR, name)}
+
+        missing = [
+            file_id for file_id, source in sources.items()
+            if source["path"] is None
+            and not os.path.exists(os.path.join(Config.EXTRACTION_CACHE_DIR, f"{file_id}.json"))
+        ]
+        if missing:
+            raise ValueError(
+                f"No stored upload or extracted text for {len(missing)} indexed files "
+                f"({', '.join(sorted(missing)[:5])}); upload them again before re-indexing"
+            )
+        return sources
+
+    def _index_files(self, shadow: VectorStoreManager, embedding_manager, file_ids: List[str]):
+        """Extract, chunk, embed and commit files into the shadow, a group at a time"""
+        from backend.core.bulk_ingest import extract_pages
+
+        sources = self._sources(file_ids)
+        step = Config.REINDEX_FILES_PER_COMMIT
+        for start in range(0, len(file_ids), step):
+            group = file_ids[start:start + step]
+            documents = []
+            for file_id in group:
+                source = sources[file_id]
+                pages = extract_pages(source["path"], file_id)
+                chunks = embedding_manager.create_chunks_from_pages(
+                    pages, {"source": source["source"], "file_id": file_id}
+                )
+                if not chunks:
+                    raise ValueError(f"Could not extract text from {source['source']} ({file_id})")
+                self._batches[file_id] = parent_batch_of(chunks)
+                documents.extend(chunks)
+
+            vectors = shadow.embedder.embed(documents)
+            if not shadow.apply_changes([{"documents": documents, "vectors": vectors}]):
+                raise RuntimeError("Could not commit to the shadow index")
+            shadow.embedder.complete(group)
+            self.status["files_done"] += len(group)
+            self.status["chunks"] += len(documents)
+            self._report_throughput()
+
+    def _catch_up(self, shadow: VectorStoreManager, embedding_manager):
+        """Mirror files uploaded or deleted on the live index since the rebuild began"""
+        current, rebuilt = self.live.file_ids(), shadow.file_ids()
+        added = sorted(current - rebuilt)
+        removed = sorted(rebuilt - current)
+        if added:
+            self.status["files_total"] += len(added)
+            self._index_files(shadow, embedding_manager, added)
+        if removed:
+            if not shadow.apply_changes([{"delete_file_ids": removed}]):
+                raise RuntimeError("Could not commit to the shadow index")
+            for file_id in removed:
+                batch = self._batches.pop(file_id, None)
+                if batch:
+                    self.live.parents.delete_batch(batch)
+        if added or removed:
+            logger.info(f"Re-index caught up: {len(added)} files added, {len(removed)} removed")
+
+    def verify(self, shadow: VectorStoreManager, file_ids: List[str]) -> Dict[str, Any]:
+        """Compare shadow and live on sample queries cut from live chunks
+
+        A query hits when a chunk of the file it was cut from comes back in
+        the top REINDEX_VERIFY_K, which holds whatever the chunk sizes are.
+        """
+        store, tombstones = self.live.vector_store, self.live.tombstones
+        candidates = [
+            doc for doc_id, doc in store.docstore._dict.items()
+            if doc_id not in tombstones and doc.metadata.get("source") != "init"
+        ]
+        sample = random.sample(candidates, min(Config.REINDEX_VERIFY_QUERIES, len(candidates)))
+        queries = [(" ".join(doc.page_content.split()[:40]), doc.metadata.get("file_id")) for doc in sample]
+
+        live_rate = self._hit_rate(self.live, queries)
+        shadow_rate = self._hit_rate(shadow, queries)
+        missing = sorted(set(file_ids) - shadow.file_ids())
+        return {
+            "queries": len(queries),
+            "live_hit_rate": live_rate,
+            "shadow_hit_rate": shadow_rate,
+            "missing_files": missing,
+            "passed": (
+                not missing
+                and shadow_rate >= Config.REINDEX_MIN_HIT_RATE
+                and shadow_rate >= live_rate - Config.REINDEX_MAX_REGRESSION
+            ),
+        }
+
+    @staticmethod
+    def _hit_rate(store: VectorStoreManager, queries: List[tuple]) -> float:
+        if not queries:
+            return 1.0
+        hits = 0
+        for query, file_id in queries:
+            results = store.similarity_search(query, k=Config.REINDEX_VERIFY_K)
+            hits += any(doc.metadata.get("file_id") == file_id for doc, _ in results)
+        return hits / len(queries)
+
+    def _report_throughput(self):
+        elapsed = max(time.time() - self._started, 1e-6)
+        done, total = self.status["files_done"], self.status["files_total"]
+        files_per_second = done / elapsed
+        self.status.update(
+            elapsed_seconds=round(elapsed, 1),
+            files_per_second=round(files_per_second, 3),
+            chunks_per_second=round(self.status["chunks"] / elapsed, 1),
+            eta_seconds=round((total - done) / files_per_second, 1) if files_per_second else None,
+        )
+        REINDEX_FILES.labels(state="total").set(total)
+        REINDEX_FILES.labels(state="done").set(done)
+        REINDEX_CHUNKS_PER_SECOND.set(self.status["chunks_per_second"])
+        # The shadow's commits overwrote the live index gauges
+        self.live._update_index_gauges()
+        self._write_status()
+
+    def _set(self, **fields):
+        self.status.update(fields)
+        self._write_status()
+
+    def _write_status(self):
+        self.status["updated"] = datetime.now().isoformat()
+        os.makedirs(os.path.dirname(Config.REINDEX_STATUS_PATH) or ".", exist_ok=True)
+        temp_path = f"{Config.REINDEX_STATUS_PATH}.{os.getpid()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(self.status, f, indent=2)
+        os.replace(temp_path, Config.REINDEX_STATUS_PATH)
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the vector store under the current settings")
+    parser.add_argument("--enqueue", action="store_true", help="Hand the job to the running index writer")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.enqueue:
+        VectorStoreManager.enqueue_job({"op": "reindex"})
+        print(f"Queued a re-index; follow it in {Config.REINDEX_STATUS_PATH}")
+        return
+
+    status = Reindexer(VectorStoreManager()).run()
+    print(json.dumps(status, indent=2))
+    sys.exit(0 if status["phase"] == "done" else 1)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
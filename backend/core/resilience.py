@@ -0,0 +1,171 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import deque
+from typing import Any, Awaitable, Callable, Iterator, Optional
+import asyncio
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+class DeadlineExceeded(Exception):
+    """The request ran out of time before this stage could finish"""
+
+class LLMUnavailableError(Exception):
+    """The LLM call failed, timed out, or the circuit breaker is open"""
+
+class Deadline:
+    """An absolute point in time (monotonic clock) a request must finish by
+
+    client_set marks a deadline the caller shortened below the server's own;
+    running out of it says nothing about the upstream's health.
+    """
+    
+    def __init__(self, seconds: float, client_set: bool = False):
+        self.expires_at = time.monotonic() + seconds
+        self.client_set = client_set
+    
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+    
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+_current_deadline: ContextVar[Optional[Deadline]] = ContextVar("deadline", default=None)
+
+@contextmanager
+def deadline_scope(seconds: float, client_set: bool = False) -> Iterator[Deadline]:
+    """Give everything run inside this block (including threads) a deadline"""
+    deadline = Deadline(seconds, client_set)
+    token = _current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current_deadline.reset(token)
+
+def remaining_time() -> Optional[float]:
+    """Seconds left on the current request's deadline, or None if unbounded"""
+    deadline = _current_deadline.get()
+    return deadline.remaining() if deadline else None
+
+def deadline_set_by_client() -> bool:
+    """Whether the current deadline is a client's, shorter than the server's"""
+    deadline = _current_deadline.get()
+    return bool(deadline and deadline.client_set)
+
+async def run_with_deadline(awaitable: Awaitable, stage: str) -> Any:
+    """Await something, giving up when the current deadline passes"""
+    remaining = remaining_time()
+    if remaining is None:
+        return await awaitable
+    if remaining <= 0:
+        if asyncio.iscoroutine(awaitable):
+            awaitable.close()
+        raise DeadlineExceeded(f"No time left for {stage}")
+    try:
+        return await asyncio.wait_for(awaitable, timeout=remaining)
+    except asyncio.TimeoutError:
+        raise DeadlineExceeded(f"Deadline exceeded during {stage}")
+
+class CircuitBreaker:
+    """Fail fast after repeated upstream failures, probing again after a pause
+
+    closed -> open after failure_threshold consecutive failures; open ->
+    half-open once reset_timeout has passed, letting one probe through; the
+    probe's outcome closes or re-opens the circuit.
+    """
+    
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+    
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self._failures = 0
+            self._probing = False
+    
+    def record_abandoned(self):
+        """A call ended without saying anything about the upstream; free the probe slot"""
+        with self._lock:
+            self._probing = False
+    
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == "half_open" or self._failures >= self.failure_threshold:
+                if self.state != "open":
+                    logger.warning("Circuit breaker opened")
+                self.state = "open"
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+class LatencyTracker:
+    """Rolling window of recent latencies for picking a hedge delay"""
+    
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+    
+    def observe(self, seconds: float):
+        self._samples.append(seconds)
+    
+    def percentile(self, fraction: float, min_samples: int = 20) -> Optional[float]:
+        if len(self._samples) < min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+async def hedged(
+    call: Callable[[], Awaitable[Any]],
+    hedge_delay: Optional[float],
+    on_hedge: Optional[Callable[[], None]] = None
+) -> Any:
+    """Run call(); if it is still pending after hedge_delay, race a duplicate
+
+    The first successful result wins and the loser is cancelled. A failure
+    only propagates once no attempt is left running.
+    """
+    first = asyncio.ensure_future(call())
+    if hedge_delay is None:
+        return await first
+    
+    pending = {first}
+    hedge_started = False
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            timeout = None if hedge_started else hedge_delay
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                error = task.exception()
+            if not hedge_started and (not done or error):
+                # Slow or failed first attempt: fire the duplicate now
+                hedge_started = True
+                if on_hedge:
+                    on_hedge()
+                pending.add(asyncio.ensure_future(call()))
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
\ No newline at end of file
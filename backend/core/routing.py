@@ -0,0 +1,160 @@
+from typing import Dict, Iterable, List, Optional
+import os
+import logging
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Index type -> whether its search takes an IDSelector, probed on first use
+_SELECTOR_SUPPORT: Dict[type, bool] = {}
+
+def accepts_selector(index) -> bool:
+    """Whether index.search honours SearchParameters.sel
+
+    IndexPQ rejects any search parameters and IVF indexes want their own
+    subclass, so each index type is probed once with an empty search.
+    """
+    kind = type(index)
+    if kind not in _SELECTOR_SUPPORT:
+        selector = faiss.IDSelectorBatch(np.zeros(0, dtype=np.int64))
+        params = faiss.SearchParameters()
+        params.sel = selector
+        try:
+            index.search(np.zeros((1, index.d), dtype=np.float32), 1, params=params)
+            _SELECTOR_SUPPORT[kind] = True
+        except RuntimeError:
+            logger.info(f"{kind.__name__} cannot restrict searches to rows; routing is skipped for it")
+            _SELECTOR_SUPPORT[kind] = False
+    return _SELECTOR_SUPPORT[kind]
+
+class FileRouter:
+    """Coarse index of one mean vector per file, for two-stage retrieval
+
+    A query is first compared with every file's centroid, and the fine
+    chunk search then only scores chunks of the closest files. Centroids
+    are kept as running sums, so a commit only touches the files it adds
+    or deletes; positions (file -> index rows) are rebuilt per snapshot
+    because compaction renumbers rows.
+    """
+
+    def __init__(self, sums: Dict[str, np.ndarray], counts: Dict[str, int]):
+        self.sums = sums
+        self.counts = counts
+        self.positions: Dict[str, np.ndarray] = {}
+        self.store = None  # the snapshot positions refer to
+        self._file_ids: List[str] = []
+        self._centroids: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.sums)
+
+    @classmethod
+    def from_store(cls, store, tombstones: Iterable[str] = ()) -> "FileRouter":
+        """Build centroids from the vectors already in an index (one-off, on load)"""
+        tombstones = set(tombstones)
+        sums: Dict[str, np.ndarray] = {}
+        counts: Dict[str, int] = {}
+        for position, doc_id in store.index_to_docstore_id.items():
+            doc = store.docstore._dict.get(doc_id)
+            if doc is None or doc_id in tombstones or doc.metadata.get("source") == "init":
+                continue
+            file_id = doc.metadata.get("file_id", "")
+            vector = store.index.reconstruct(int(position)).astype(np.float64)
+            if file_id in sums:
+                sums[file_id] += vector
+            else:
+                sums[file_id] = vector
+            counts[file_id] = counts.get(file_id, 0) + 1
+        return cls(sums, counts)
+
+    def updated(
+        self,
+        delete_file_ids: Iterable[str],
+        documents: List,
+        vectors: List[List[float]]
+    ) -> "FileRouter":
+        """A copy with deleted files dropped and new chunks folded in"""
+        sums = dict(self.sums)
+        counts = dict(self.counts)
+        for file_id in delete_file_ids:
+            sums.pop(file_id, None)
+            counts.pop(file_id, None)
+        for doc, vector in zip(documents, vectors):
+            file_id = doc.metadata.get("file_id", "")
+            vector = np.asarray(vector, dtype=np.float64)
+            # Never add in place: the array may be shared with the old snapshot
+            sums[file_id] = sums[file_id] + vector if file_id in sums else vector
+            counts[file_id] = counts.get(file_id, 0) + 1
+        return FileRouter(sums, counts)
+
+    def bind(self, store, tombstones: Iterable[str] = ()) -> "FileRouter":
+        """Record which index rows belong to each file in this snapshot"""
+        tombstones = set(tombstones)
+        rows: Dict[str, List[int]] = {}
+        for position, doc_id in store.index_to_docstore_id.items():
+            if doc_id in tombstones:
+                continue
+            doc = store.docstore._dict.get(doc_id)
+            if doc is None or doc.metadata.get("source") == "init":
+                continue
+            rows.setdefault(doc.metadata.get("file_id", ""), []).append(position)
+        self.positions = {file_id: np.array(p, dtype=np.int64) for file_id, p in rows.items()}
+        self.store = store
+
+        self._file_ids = list(self.sums)
+        if self._file_ids:
+            centroids = np.vstack([self.sums[f] / self.counts[f] for f in self._file_ids])
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            self._centroids = (centroids / np.maximum(norms, 1e-12)).astype(np.float32)
+        return self
+
+    def route(
+        self,
+        embedding: List[float],
+        top_files: int,
+        allowed: Optional[Iterable[str]] = None
+    ) -> List[str]:
+        """The top_files files whose centroids are most similar to the query"""
+        if allowed is not None:
+            allowed = set(allowed)
+            return [file_id for file_id in self._file_ids if file_id in allowed][:top_files]
+        if self._centroids is None:
+            return []
+        query = np.asarray(embedding, dtype=np.float32)
+        scores = self._centroids @ (query / max(float(np.linalg.norm(query)), 1e-12))
+        top = np.argsort(-scores)[:top_files]
+        return [self._file_ids[i] for i in top]
+
+    def search_params(self, file_ids: List[str]) -> Optional[faiss.SearchParameters]:
+        """FAISS search parameters restricted to the rows of file_ids"""
+        rows = [self.positions[f] for f in file_ids if f in self.positions]
+        if not rows:
+            return None
+        selector = faiss.IDSelectorBatch(np.concatenate(rows))
+        params = faiss.SearchParameters()
+        params.sel = selector
+        # params only holds a raw pointer; keep the selector alive alongside it
+        params.selector = selector
+        return params
+
+    def save(self, directory: str):
+        file_ids = list(self.sums)
+        np.savez(
+            os.path.join(directory, "routing.npz"),
+            file_ids=np.array(file_ids, dtype=str),
+            sums=np.vstack([self.sums[f] for f in file_ids]) if file_ids else np.zeros((0, 0)),
+            counts=np.array([self.counts[f] for f in file_ids], dtype=np.int64)
+        )
+
+    @classmethod
+    def load(cls, directory: str) -> Optional["FileRouter"]:
+        path = os.path.join(directory, "routing.npz")
+        if not os.path.exists(path):
+            return None
+        with np.load(path, allow_pickle=False) as data:
+            file_ids = [str(f) for f in data["file_ids"]]
+            return cls(
+                {f: data["sums"][i].copy() for i, f in enumerate(file_ids)},
+                {f: int(data["counts"][i]) for i, f in enumerate(file_ids)}
+            )
\ No newline at end of file
@@ -0,0 +1,347 @@
+"""Sharded vector search: N shard processes behind a scatter-gather coordinator
+
+Every file's chunks live on one shard, picked by a stable hash of its
+file_id, so deletes and replacements touch a single shard and file filters
+are answered by the owner alone. Each shard is a plain VectorStoreManager
+over its own directory, served over multiprocessing connections (local
+sockets by default, TCP across machines). The coordinator embeds the query
+once, asks every shard for its top k in parallel and merges by distance;
+a shard that misses SHARD_TIMEOUT_SECONDS is left out of that answer
+rather than holding it up.
+
+    python -m backend.core.sharding serve --shard 0
+    python -m backend.core.sharding rebalance --shards 4 exported_archive [more ...]
+"""
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.connection import Client, Listener
+from langchain.docstore.document import Document
+from typing import Any, Dict, List, Optional, Tuple
+import argparse
+import hashlib
+import heapq
+import multiprocessing
+import os
+import queue
+import secrets
+import threading
+import logging
+import numpy as np
+from backend.config import Config
+from backend.core.embeddings import make_embeddings
+from backend.core.metrics import registry, track_stage
+from backend.core.parents import ParentStore
+from backend.core.vectorstore import VectorStoreManager, _PendingBatch, index_settings
+
+logger = logging.getLogger(__name__)
+
+SHARD_ERRORS = registry.counter(
+    "edute_shard_errors_total",
+    "Shard calls that failed or timed out, by shard and reason",
+    ["shard", "reason"]
+)
+
+def shard_for(file_id: str, shard_count: int) -> int:
+    """Stable shard of a file (Python's hash() is salted per process)"""
+    digest = hashlib.md5((file_id or "").encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+def shard_addresses() -> List[Tuple[str, int]]:
+    if Config.SHARD_ADDRESSES:
+        addresses = []
+        for item in Config.SHARD_ADDRESSES.split(","):
+            host, _, port = item.strip().rpartition(":")
+            addresses.append((host, int(port)))
+        return addresses
+    return [("127.0.0.1", Config.SHARD_BASE_PORT + i) for i in range(Config.SHARD_COUNT)]
+
+def shard_authkey() -> bytes:
+    # Connections exchange pickles, so an unauthenticated shard is never served
+    if not Config.SHARD_AUTHKEY:
+        raise ValueError("SHARD_AUTHKEY is required in sharded mode")
+    return Config.SHARD_AUTHKEY.encode("utf-8")
+
+def shard_store_path(shard: int) -> str:
+    return os.path.join(Config.SHARD_STORE_ROOT, f"shard-{shard:03d}")
+
+class ShardServer:
+    """Serves one shard's VectorStoreManager to coordinators"""
+
+    def __init__(self, shard: int, address: Tuple[str, int], authkey: bytes):
+        self.shard = shard
+        self.address = address
+        self.authkey = authkey
+        self.vector_store = VectorStoreManager(store_path=shard_store_path(shard))
+
+    def serve_forever(self):
+        with Listener(self.address, authkey=self.authkey) as listener:
+            logger.info(f"Shard {self.shard} serving {shard_store_path(self.shard)} on {self.address}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except Exception as e:
+                    logger.error(f"Shard {self.shard} rejected a connection: {e}")
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        """One coordinator connection; requests on it are answered in order"""
+        with conn:
+            while True:
+                try:
+                    op, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send(("ok", self._dispatch(op, args)))
+                except Exception as e:
+                    logger.error(f"Shard {self.shard} {op} error: {e}")
+                    conn.send(("error", str(e)))
+
+    def _dispatch(self, op: str, args: tuple) -> Any:
+        vs = self.vector_store
+        if op == "search":
+            embedding, k, filter_dict = args
+            # Drop this shard's init placeholder here; merged across N shards
+            # they would crowd real chunks out of the coordinator's top k
+            hits = vs.similarity_search_by_vector(embedding, k + 1, filter_dict)
+            return [hit for hit in hits if hit[0].metadata.get("source") != "init"][:k]
+        if op == "apply":
+            if not vs.apply_changes(*args):
+                raise RuntimeError("index commit failed")
+            return True
+        if op == "delete_file":
+            return vs.delete_file(*args)
+        if op == "export":
+            return vs.export_archive(*args)
+        if op == "stats":
+            return {"shard": self.shard, "version": vs.version, "vectors": vs.vector_store.index.ntotal}
+        raise ValueError(f"Unknown shard operation {op!r}")
+
+class ShardClient:
+    """Pooled connections to one shard; each connection carries one call at a time"""
+
+    def __init__(self, shard: int, address: Tuple[str, int], authkey: bytes):
+        self.shard = shard
+        self.address = address
+        self.authkey = authkey
+        self._idle: "queue.LifoQueue" = queue.LifoQueue()
+
+    def call(self, op: str, *args, timeout: Optional[float] = None) -> Any:
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = Client(self.address, authkey=self.authkey)
+        try:
+            conn.send((op, args))
+            if timeout is not None and not conn.poll(timeout):
+                # The late reply would desync this connection; drop it
+                conn.close()
+                SHARD_ERRORS.labels(shard=str(self.shard), reason="timeout").inc()
+                raise TimeoutError(f"Shard {self.shard} did not answer {op} within {timeout}s")
+            status, value = conn.recv()
+        except (EOFError, OSError):
+            conn.close()
+            SHARD_ERRORS.labels(shard=str(self.shard), reason="connection").inc()
+            raise
+        self._idle.put(conn)
+        if status != "ok":
+            SHARD_ERRORS.labels(shard=str(self.shard), reason="error").inc()
+            raise RuntimeError(f"Shard {self.shard} {op} failed: {value}")
+        return value
+
+class ShardedVectorStore(VectorStoreManager):
+    """Coordinator with the VectorStoreManager interface, backed by shard processes
+
+    Query embedding (and its cache), relevance cut-offs, parent expansion
+    and upload embedding happen here as before; only index reads and writes
+    go to the shards.
+    """
+
+    def __init__(self, addresses: List[Tuple[str, int]] = None, authkey: bytes = None):
+        addresses = addresses or shard_addresses()
+        authkey = authkey or shard_authkey()
+        self.clients = [ShardClient(i, address, authkey) for i, address in enumerate(addresses)]
+        self._pool = ThreadPoolExecutor(max_workers=len(self.clients), thread_name_prefix="shard")
+        # Only what the shared search and upload paths need; there is no local index
+        self.read_only = False
+        self.settings = index_settings()
+        self.adopted_at = 0.0
+        self.embeddings = make_embeddings()
+        self.embedder = self._make_embedder()
+        self._query_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self.parents = ParentStore(Config.PARENT_STORE_PATH)
+        logger.info(f"Coordinating {len(self.clients)} vector store shards")
+
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = None,
+        filter_dict: Optional[dict] = None
+    ) -> List[Tuple[Document, float]]:
+        """Scatter the query to the shards and merge their top k by distance"""
+        if k is None:
+            k = Config.TOP_K_DOCS
+        shards = self.clients
+        if filter_dict and "file_id" in filter_dict:
+            shards = [self.clients[shard_for(filter_dict["file_id"], len(self.clients))]]
+
+        with track_stage("shard_search"):
+            futures = [
+                self._pool.submit(
+                    client.call, "search", embedding, k, filter_dict,
+                    timeout=Config.SHARD_TIMEOUT_SECONDS
+                )
+                for client in shards
+            ]
+            results = []
+            for client, future in zip(shards, futures):
+                try:
+                    results.append(future.result())
+                except Exception as e:
+                    logger.error(f"Shard {client.shard} search skipped: {type(e).__name__}: {e}")
+        return heapq.nsmallest(k, (hit for hits in results for hit in hits), key=lambda hit: hit[1])
+
+    def _submit(self, batches: List[_PendingBatch]):
+        """Split each change by owning shard and commit the parts in parallel"""
+        changes: Dict[int, List[dict]] = {}
+        for batch in batches:
+            parts: Dict[int, dict] = {}
+            for file_id in batch.delete_file_ids:
+                part = parts.setdefault(self._shard_of(file_id), _empty_change())
+                part["delete_file_ids"].append(file_id)
+            for doc, vector in zip(batch.documents, batch.vectors):
+                part = parts.setdefault(self._shard_of(doc.metadata.get("file_id")), _empty_change())
+                part["documents"].append(doc)
+                part["vectors"].append(np.asarray(vector, dtype=np.float32).tolist())
+            for shard, part in parts.items():
+                changes.setdefault(shard, []).append(part)
+
+        futures = [
+            self._pool.submit(self.clients[shard].call, "apply", shard_changes)
+            for shard, shard_changes in changes.items()
+        ]
+        # Shards commit independently; report the first failure after all finish
+        errors = []
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+    def _shard_of(self, file_id: Optional[str]) -> int:
+        return shard_for(file_id, len(self.clients))
+
+    def delete_file(self, file_id: str) -> int:
+        removed = self.clients[self._shard_of(file_id)].call("delete_file", file_id)
+        logger.info(f"Deleted {removed} chunks of file {file_id}")
+        return removed
+
+    def export_archive(self, path: str) -> int:
+        """One archive per shard under path; rebalance() reads them back"""
+        futures = [
+            self._pool.submit(client.call, "export", os.path.join(os.path.abspath(path), f"shard-{client.shard:03d}"))
+            for client in self.clients
+        ]
+        return sum(future.result() for future in futures)
+
+    def import_archive(self, path: str, index_factory: Optional[str] = None) -> int:
+        raise ValueError("Stop the shards and use `python -m backend.core.sharding rebalance` instead")
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [client.call("stats", timeout=Config.SHARD_TIMEOUT_SECONDS) for client in self.clients]
+
+def _empty_change() -> dict:
+    return {"documents": [], "vectors": [], "delete_file_ids": []}
+
+def rebalance(archive_paths: List[str], shard_count: int, index_factory: Optional[str] = None) -> List[int]:
+    """Re-partition exported archives across shard_count shard directories
+
+    Takes any mix of single-index and per-shard exports (a directory of
+    shard-NNN archives), so the same command splits a single index into
+    shards and moves between shard counts. Run it with the shards stopped;
+    returns the chunk count written to each shard.
+    """
+    from backend.core.archive import EmbeddingArchive
+
+    archives = []
+    for path in archive_paths:
+        if os.path.exists(os.path.join(path, "manifest.json")):
+            archives.append(EmbeddingArchive.load(path, mmap=True))
+        else:
+            for name in sorted(os.listdir(path)):
+                if os.path.exists(os.path.join(path, name, "manifest.json")):
+                    archives.append(EmbeddingArchive.load(os.path.join(path, name), mmap=True))
+    if not archives:
+        raise ValueError(f"No archives found in {archive_paths}")
+    models = {archive.model for archive in archives}
+    if len(models) > 1:
+        raise ValueError(f"Archives mix embedding models: {sorted(models)}")
+
+    counts = []
+    staging_root = os.path.join(Config.SHARD_STORE_ROOT, ".rebalance")
+    for shard in range(shard_count):
+        vectors, ids, texts, metadatas = [], [], [], []
+        for archive in archives:
+            rows = [
+                row for row, metadata in enumerate(archive.metadatas)
+                if shard_for(metadata.get("file_id"), shard_count) == shard
+            ]
+            if rows:
+                vectors.append(np.asarray(archive.vectors[rows]))
+                ids.extend(archive.ids[row] for row in rows)
+                texts.extend(archive.texts[row] for row in rows)
+                metadatas.extend(archive.metadatas[row] for row in rows)
+        dimension = archives[0].dimension
+        part = EmbeddingArchive(
+            archives[0].model,
+            np.vstack(vectors) if vectors else np.zeros((0, dimension), dtype="float16"),
+            ids, texts, metadatas
+        )
+        staging = os.path.join(staging_root, f"shard-{shard:03d}")
+        part.save(staging)
+        store = VectorStoreManager(store_path=shard_store_path(shard))
+        counts.append(store.import_archive(staging, index_factory=index_factory))
+    return counts
+
+def run_shard(shard: int):
+    """Process entry point for one local shard server"""
+    logging.basicConfig(level=logging.INFO)
+    ShardServer(shard, shard_addresses()[shard], shard_authkey()).serve_forever()
+
+def start_local_shards() -> List[multiprocessing.Process]:
+    """Spawn one server process per shard on this machine"""
+    if not Config.SHARD_AUTHKEY:
+        # Children and API workers inherit the key through the environment
+        Config.SHARD_AUTHKEY = os.environ["SHARD_AUTHKEY"] = secrets.token_hex(16)
+    processes = []
+    for shard in range(Config.SHARD_COUNT):
+        process = multiprocessing.Process(target=run_shard, args=(shard,), name=f"shard-{shard}", daemon=True)
+        process.start()
+        processes.append(process)
+    return processes
+
+def main():
+    parser = argparse.ArgumentParser(description="Vector store shard server and rebalancing")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="Serve one shard")
+    serve.add_argument("--shard", type=int, required=True)
+    move = commands.add_parser("rebalance", help="Split exported archives across shards")
+    move.add_argument("archives", nargs="+", help="Archive directories (from export_archive)")
+    move.add_argument("--shards", type=int, default=Config.SHARD_COUNT)
+    move.add_argument("--index-factory", default=None)
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        run_shard(args.shard)
+        return
+    logging.basicConfig(level=logging.INFO)
+    counts = rebalance(args.archives, args.shards, args.index_factory)
+    for shard, count in enumerate(counts):
+        print(f"shard-{shard:03d}: {count} chunks")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
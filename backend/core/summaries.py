@@ -0,0 +1,388 @@
+"""Hierarchical summary tree over each document, for broad revision queries
+
+    python -m backend.core.summaries              # build trees for files without one
+    python -m backend.core.summaries --stale      # also rebuild trees from another embedding model
+    python -m backend.core.summaries FILE_ID ...  # (re)build specific files
+
+At ingest a file's chunks are cut into contiguous groups of up to
+SUMMARY_GROUP_TOKENS, breaking where neighbouring chunks are least alike,
+and each group is summarized by the fast model tier. The summaries are
+grouped and summarized the same way, level after level, until one node
+covers the whole document. Every node is embedded and kept in SQLite
+next to the chunk index.
+
+A revision query then reads from the lowest level whose matching nodes
+fit in SUMMARY_CONTEXT_TOKENS: section summaries for a narrow topic,
+chapter or document summaries for "revise everything", so the prompt
+stays the same size however much material the topic spans.
+"""
+from langchain.docstore.document import Document
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import logging
+import numpy as np
+from backend.config import Config
+from backend.core.chunking import count_tokens
+from backend.core.metrics import registry, track_stage
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_BUILDS = registry.counter(
+    "edute_summary_builds_total",
+    "Summary tree builds by result (built, skipped, failed)",
+    ["result"]
+)
+
+SUMMARY_PROMPT = """Summarize these consecutive passages from {source} for a student's revision notes.
+
+Cover every concept, definition, fact and figure they contain, in the order they appear.
+Keep it under {max_tokens} tokens. Do not add anything that is not in the passages.
+
+{passages}
+
+Summary:"""
+
+def segment(vectors: np.ndarray, tokens: List[int], max_tokens: int) -> List[Tuple[int, int]]:
+    """Cut a sequence into contiguous [start, end) groups of at most max_tokens
+
+    Each group is at least half full (bar the last), and the cut goes where
+    two neighbouring items are least similar, so groups follow topic shifts.
+    """
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.maximum(norms, 1e-12)
+    groups, start, n = [], 0, len(tokens)
+    while start < n:
+        end, total = start + 1, tokens[start]
+        while end < n and total + tokens[end] <= max_tokens:
+            total += tokens[end]
+            end += 1
+        if end == n:
+            groups.append((start, n))
+            break
+        cut, weakest, running = end, None, 0
+        for i in range(start, end):
+            running += tokens[i]
+            if running >= max_tokens / 2:
+                similarity = float(unit[i] @ unit[i + 1])
+                if weakest is None or similarity < weakest:
+                    cut, weakest = i + 1, similarity
+        groups.append((start, cut))
+        start = cut
+    return groups
+
+class SummaryStore:
+    """Summary tree nodes and their embeddings, in SQLite
+
+    Shared by every worker like the parent store. Searches use an
+    in-memory matrix per embedding model, reloaded when the generation
+    counter shows another process changed the trees.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._cache_lock = threading.Lock()
+        self._cache: Dict[str, Any] = {"generation": None}
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS summary_nodes ("
+                "node_id TEXT PRIMARY KEY, file_id TEXT, level INTEGER, span_start INTEGER, "
+                "span_end INTEGER, model TEXT, text TEXT, metadata TEXT, vector BLOB)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS summary_nodes_file_id ON summary_nodes (file_id)")
+            conn.execute("CREATE TABLE IF NOT EXISTS summary_generation (id INTEGER PRIMARY KEY, value INTEGER)")
+            conn.execute("INSERT OR IGNORE INTO summary_generation VALUES (0, 0)")
+            conn.commit()
+            self._local.conn = conn
+        return conn
+
+    def put_tree(self, file_id: str, nodes: List[Document], vectors: np.ndarray, model: str):
+        """Replace a file's tree with nodes (metadata: node_id, level, span_start, span_end)"""
+        rows = [
+            (
+                node.metadata["node_id"],
+                file_id,
+                node.metadata["level"],
+                node.metadata["span_start"],
+                node.metadata["span_end"],
+                model,
+                node.page_content,
+                json.dumps(node.metadata, ensure_ascii=False),
+                np.asarray(vector, dtype=np.float32).tobytes()
+            )
+            for node, vector in zip(nodes, vectors)
+        ]
+        conn = self._connection()
+        with conn:
+            conn.execute("DELETE FROM summary_nodes WHERE file_id = ?", (file_id,))
+            conn.executemany("INSERT INTO summary_nodes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            conn.execute("UPDATE summary_generation SET value = value + 1 WHERE id = 0")
+
+    def delete_file(self, file_id: str) -> int:
+        conn = self._connection()
+        with conn:
+            cursor = conn.execute("DELETE FROM summary_nodes WHERE file_id = ?", (file_id,))
+            if cursor.rowcount:
+                conn.execute("UPDATE summary_generation SET value = value + 1 WHERE id = 0")
+        return cursor.rowcount
+
+    def file_models(self) -> Dict[str, str]:
+        """file_id -> embedding model of its tree"""
+        rows = self._connection().execute("SELECT DISTINCT file_id, model FROM summary_nodes")
+        return dict(rows.fetchall())
+
+    def _nodes(self, model: str) -> Dict[str, Any]:
+        """Every node embedded with model, as a matrix plus its documents"""
+        generation = self._connection().execute(
+            "SELECT value FROM summary_generation WHERE id = 0"
+        ).fetchone()[0]
+        with self._cache_lock:
+            if self._cache["generation"] == generation and self._cache.get("model") == model:
+                return self._cache
+        rows = self._connection().execute(
+            "SELECT text, metadata, vector FROM summary_nodes WHERE model = ?", (model,)
+        ).fetchall()
+        matrix = np.zeros((0, 0), dtype=np.float32)
+        if rows:
+            matrix = np.stack([np.frombuffer(vector, dtype=np.float32) for _, _, vector in rows])
+            matrix = matrix / np.maximum(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12)
+        cache = {
+            "generation": generation,
+            "model": model,
+            "documents": [Document(page_content=text, metadata=json.loads(metadata)) for text, metadata, _ in rows],
+            "matrix": matrix,
+        }
+        with self._cache_lock:
+            self._cache = cache
+        return cache
+
+    def search(
+        self,
+        embedding: List[float],
+        model: str,
+        max_tokens: int,
+        file_ids: Optional[Iterable[str]] = None
+    ) -> Tuple[List[Tuple[Document, float]], set]:
+        """Nodes from the most detailed level whose matches fit in max_tokens
+
+        At each level, from the section summaries up, the matches are the
+        nodes within Config.SCORE_DROPOFF of that level's best relevance.
+        A narrow topic matches a few sections; a broad one matches so many
+        that only their chapter or document summaries fit. Returns the
+        chosen (node, relevance) pairs in document order, plus the files
+        that have a tree, so callers can fall back to chunks for the rest.
+        """
+        nodes = self._nodes(model)
+        documents, matrix = nodes["documents"], nodes["matrix"]
+        if not documents:
+            return [], set()
+        file_ids = set(file_ids) if file_ids else None
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / max(float(np.linalg.norm(query)), 1e-12)
+        relevance = np.clip(matrix @ query, 0.0, 1.0)
+
+        by_level: Dict[int, List[Tuple[Document, float]]] = {}
+        roots: Dict[str, Tuple[Document, float]] = {}
+        for doc, score in zip(documents, relevance):
+            file_id = doc.metadata.get("file_id")
+            if file_ids is None or file_id in file_ids:
+                by_level.setdefault(doc.metadata["level"], []).append((doc, float(score)))
+                if file_id not in roots or doc.metadata["level"] > roots[file_id][0].metadata["level"]:
+                    roots[file_id] = (doc, float(score))
+        covered = set(roots)
+        if not by_level:
+            return [], covered
+
+        for level in sorted(by_level):
+            # Shorter documents take part with their root once their tree has ended
+            hits = by_level[level] + [root for root in roots.values() if root[0].metadata["level"] < level]
+            hits = sorted(hits, key=lambda hit: -hit[1])
+            best = hits[0][1]
+            matches = [hit for hit in hits if best - hit[1] <= Config.SCORE_DROPOFF]
+            if sum(doc.metadata.get("tokens", 0) for doc, _ in matches) <= max_tokens:
+                break
+        else:
+            # Even the top level is too broad: keep its best nodes that fit
+            matches, used = [], 0
+            for doc, score in hits:
+                if matches and used + doc.metadata.get("tokens", 0) > max_tokens:
+                    break
+                matches.append((doc, score))
+                used += doc.metadata.get("tokens", 0)
+        return sorted(
+            matches, key=lambda hit: (hit[0].metadata.get("file_id"), hit[0].metadata["span_start"])
+        ), covered
+
+class SummaryTreeBuilder:
+    """Builds and stores a file's summary tree from its indexed chunks"""
+
+    def __init__(self, llm_wrapper, vector_store, store: SummaryStore, admission=None):
+        self.llm = llm_wrapper
+        self.vector_store = vector_store
+        self.store = store
+        self.admission = admission
+        self._semaphore = None
+        self._tasks = set()
+
+    def schedule(self, file_ids: Iterable[str]):
+        """Build trees in the background after an upload; failures are only logged"""
+        for file_id in dict.fromkeys(file_ids):
+            task = asyncio.ensure_future(self._build_when_indexed(file_id))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _build_when_indexed(self, file_id: str):
+        # Reader workers queue chunks for the index writer; wait until it has committed them
+        waited = 0.0
+        while True:
+            try:
+                if await self.build(file_id):
+                    return
+            except Exception as e:
+                SUMMARY_BUILDS.labels(result="failed").inc()
+                logger.error(f"Summary tree build failed for {file_id}: {e}")
+                return
+            if not self.vector_store.read_only or waited >= Config.SUMMARY_WAIT_SECONDS:
+                SUMMARY_BUILDS.labels(result="skipped").inc()
+                logger.warning(f"No indexed chunks for {file_id}; summary tree not built")
+                return
+            await asyncio.sleep(Config.INDEX_POLL_SECONDS)
+            waited += Config.INDEX_POLL_SECONDS
+
+    async def build(self, file_id: str) -> int:
+        """Summarize a file's chunks level by level; returns the nodes stored (0 if unindexed)"""
+        documents, vectors = await asyncio.to_thread(self.vector_store.file_chunks, file_id)
+        if not documents:
+            return 0
+        model = self.vector_store.settings["embedding_model"]
+        source = documents[0].metadata.get("source", "the document")
+        started = time.perf_counter()
+
+        # Level 0 is the chunks themselves; spans are positions in that order
+        items = [
+            {"text": doc.page_content, "tokens": count_tokens(doc.page_content), "span": (i, i + 1),
+             "pages": (doc.metadata.get("page"), doc.metadata.get("page_end", doc.metadata.get("page")))}
+            for i, doc in enumerate(documents)
+        ]
+        nodes: List[Document] = []
+        node_vectors: List[np.ndarray] = []
+        level = 0
+        while level == 0 or len(items) > 1:
+            level += 1
+            max_tokens = Config.SUMMARY_GROUP_TOKENS
+            if level >= Config.SUMMARY_MAX_LEVELS:
+                max_tokens = sum(item["tokens"] for item in items)  # force a single root
+            groups = segment(vectors, [item["tokens"] for item in items], max_tokens)
+            texts = await asyncio.gather(*(
+                self._summarize(source, [item["text"] for item in items[start:end]])
+                for start, end in groups
+            ))
+            with track_stage("embed_documents"):
+                vectors = np.asarray(
+                    await asyncio.to_thread(self.vector_store.embeddings.embed_documents, texts),
+                    dtype=np.float32
+                )
+            next_items = []
+            for n, ((start, end), text) in enumerate(zip(groups, texts)):
+                span = (items[start]["span"][0], items[end - 1]["span"][1])
+                pages = [p for item in items[start:end] for p in item["pages"] if p is not None]
+                metadata = {
+                    "source": source,
+                    "file_id": file_id,
+                    "node_id": f"{file_id}-L{level}-{n}",
+                    "level": level,
+                    "span_start": span[0],
+                    "span_end": span[1],
+                    "tokens": count_tokens(text),
+                    "summary": True,
+                }
+                if pages:
+                    metadata.update(page=min(pages), page_end=max(pages))
+                nodes.append(Document(page_content=text, metadata=metadata))
+                next_items.append({
+                    "text": text, "tokens": metadata["tokens"], "span": span,
+                    "pages": (metadata.get("page"), metadata.get("page_end"))
+                })
+            node_vectors.extend(vectors)
+            items = next_items
+
+        await asyncio.to_thread(self.store.put_tree, file_id, nodes, np.stack(node_vectors), model)
+        SUMMARY_BUILDS.labels(result="built").inc()
+        logger.info(
+            f"Built summary tree for {file_id}: {len(nodes)} nodes over {len(documents)} chunks, "
+            f"{level} levels in {time.perf_counter() - started:.1f}s"
+        )
+        return len(nodes)
+
+    async def _summarize(self, source: str, passages: List[str]) -> str:
+        from langchain_core.messages import HumanMessage
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(Config.SUMMARY_CONCURRENCY)
+        prompt = SUMMARY_PROMPT.format(
+            source=source,
+            max_tokens=Config.SUMMARY_TOKENS,
+            passages="\n\n".join(passages)
+        )
+        async with self._semaphore:
+            if self.admission:
+                # Behind every interactive request for an LLM slot
+                async with self.admission.slot(max(Config.AGENT_PRIORITY.values()) + 1):
+                    return await self.llm.generate_response([HumanMessage(content=prompt)], tier="fast")
+            return await self.llm.generate_response([HumanMessage(content=prompt)], tier="fast")
+
+async def backfill(file_ids: Optional[List[str]] = None, stale: bool = False) -> Dict[str, int]:
+    """Build trees for the given files, or every indexed file without a current one"""
+    from backend.core.llm import GeminiLLMWrapper
+    from backend.core.vectorstore import VectorStoreManager
+
+    vector_store = VectorStoreManager(read_only=True)
+    store = SummaryStore(Config.SUMMARY_STORE_PATH)
+    builder = SummaryTreeBuilder(GeminiLLMWrapper(), vector_store, store)
+    if not file_ids:
+        model = vector_store.settings["embedding_model"]
+        existing = store.file_models()
+        file_ids = sorted(
+            file_id for file_id in vector_store.file_ids()
+            if file_id not in existing or (stale and existing[file_id] != model)
+        )
+    counts = {"files": len(file_ids), "built": 0, "failed": 0, "nodes": 0}
+    for file_id in file_ids:
+        try:
+            nodes = await builder.build(file_id)
+        except Exception as e:
+            logger.error(f"Summary tree build failed for {file_id}: {e}")
+            counts["failed"] += 1
+            continue
+        counts["built"] += int(nodes > 0)
+        counts["nodes"] += nodes
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Build summary trees for indexed files")
+    parser.add_argument("file_ids", nargs="*", help="Files to (re)build (default: every file without a tree)")
+    parser.add_argument("--stale", action="store_true", help="Also rebuild trees embedded with another model")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+    counts = asyncio.run(backfill(args.file_ids, args.stale))
+    print(
+        f"Built {counts['built']} of {counts['files']} summary trees ({counts['nodes']} nodes), "
+        f"failed {counts['failed']} in {time.perf_counter() - started:.1f}s"
+    )
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,35 +1,207 @@
 from langchain_community.vectorstores import FAISS
+from langchain_community.docstore.in_memory import InMemoryDocstore
 from langchain.docstore.document import Document
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from typing import List, Tuple, Optional
+from typing import Any, Dict, Iterable, List, Tuple, Optional
+from collections import OrderedDict
+import faiss
+import json
 import os
 import pickle
+import shutil
+import threading
+import time
+import uuid
 import logging
+import numpy as np
 from backend.config import Config
+from backend.core.metrics import (
+    track_stage, record_cache, INDEX_VECTORS, INDEX_TOMBSTONES, INDEX_VERSION
+)
+from backend.core.embeddings import embedding_model_name, make_embeddings
+from backend.core.ingest import BatchedEmbedder
+from backend.core.parents import ParentStore, parent_batch_of, parent_batches_of
+from backend.core.quantization import (
+    FullPrecisionVectors, exact_rerank, index_factory_for, is_exact, quantize
+)
+from backend.core.routing import FileRouter, accepts_selector
 
 logger = logging.getLogger(__name__)
 
+class _PendingBatch:
+    """An index change waiting for the writer to commit it
+
+    Chunks of delete_file_ids are tombstoned before the batch's own documents
+    are added, so a batch can replace a file with a re-chunked copy of itself.
+    model and created (when embedding started) let a commit recognise
+    vectors made before a re-index cutover.
+    """
+    def __init__(
+        self,
+        documents: List[Document],
+        vectors: List[List[float]],
+        delete_file_ids: Iterable[str] = (),
+        model: Optional[str] = None,
+        created: Optional[float] = None
+    ):
+        self.documents = documents
+        self.vectors = vectors
+        self.delete_file_ids = list(delete_file_ids)
+        self.model = model
+        self.created = created or time.time()
+        self.done = False
+        self.error: Optional[Exception] = None
+
+def index_settings() -> Dict[str, Any]:
+    """The configured settings an index is built with; changing any needs a re-index"""
+    parent_mode = Config.PARENT_DOCUMENT_MODE
+    return {
+        "embedding_model": embedding_model_name(),
+        "chunk_tokens": Config.CHILD_CHUNK_TOKENS if parent_mode else Config.CHUNK_TOKENS,
+        "overlap_tokens": Config.CHILD_OVERLAP_TOKENS if parent_mode else Config.CHUNK_OVERLAP_TOKENS,
+        "parent_mode": parent_mode,
+        "parent_tokens": Config.PARENT_CHUNK_TOKENS if parent_mode else None,
+        "quantization": Config.INDEX_QUANTIZATION,
+    }
+
 class VectorStoreManager:
-    def __init__(self):
-        """Initialize with config values directly"""
-        self.store_path = Config.VECTOR_STORE_PATH
-        self.embeddings = GoogleGenerativeAIEmbeddings(
-            google_api_key=Config.GEMINI_API_KEY,
-            model=Config.EMBEDDING_MODEL
-        )
+    def __init__(self, read_only: bool = False, store_path: Optional[str] = None):
+        """Initialize with config values directly
+
+        With read_only=True (multi-worker serving) the index is memory-mapped
+        from disk, writes are queued for the writer process, and newer
+        versions are picked up as the writer publishes them. store_path
+        overrides Config.VECTOR_STORE_PATH (each shard has its own).
+        """
+        self.read_only = read_only
+        self.store_path = store_path or Config.VECTOR_STORE_PATH
+        # What the loaded index was built with (settings.json of its version);
+        # queries must use its embedding model even if the config moved on
+        self.settings: Dict[str, Any] = index_settings()
+        self.embeddings = make_embeddings()
+        self.embedder = self._make_embedder()
+        # When a re-index was last swapped in; older pending batches are rebased
+        self.adopted_at = 0.0
+        # Readers only ever see a published snapshot; it is never mutated
+        # after the swap, so searches need no locking.
         self.vector_store: Optional[FAISS] = None
+        # Docstore ids of deleted chunks, masked at query time until the
+        # background compaction physically drops them from the index
+        self.tombstones: frozenset = frozenset()
+        # Float32 copies of the vectors when the index itself is quantized
+        self.full_vectors: Optional[FullPrecisionVectors] = None
+        # Per-file centroids for two-stage retrieval
+        self.router: Optional[FileRouter] = None
+        self.quantization_factory = index_factory_for(
+            Config.INDEX_QUANTIZATION, Config.PQ_M, Config.PQ_BITS
+        )
+        self.version = 0
+        self._write_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending: List[_PendingBatch] = []
+        self._reload_lock = threading.Lock()
+        self._last_reload_check = 0.0
+        self._compacting = False
+        # Repeated questions (a whole class asking the same thing) skip the
+        # embedding round trip
+        self._query_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        self.parents = ParentStore(Config.PARENT_STORE_PATH)
         self.load_or_create_store()
+        if self.router is None and Config.ROUTING_ENABLED:
+            self.router = FileRouter({}, {}).bind(self.vector_store)
+        self._update_index_gauges()
+        stale = self.stale_settings()
+        if stale:
+            logger.warning(f"Index settings differ from the configuration ({', '.join(stale)}); re-index to apply them")
+    
+    def _make_embedder(self) -> BatchedEmbedder:
+        return BatchedEmbedder(
+            self.embeddings,
+            Config.EMBED_CHECKPOINT_DIR,
+            batch_size=Config.EMBED_BATCH_SIZE,
+            concurrency=Config.EMBED_CONCURRENCY,
+            max_retries=Config.EMBED_MAX_RETRIES,
+            namespace=self.settings["embedding_model"]
+        )
+    
+    def _apply_settings(self, settings: Dict[str, Any]):
+        """Serve with the settings a loaded or adopted index was built with"""
+        if settings.get("embedding_model") != self.settings.get("embedding_model"):
+            self.embeddings = make_embeddings(settings.get("embedding_model"))
+            self.settings = settings
+            self.embedder = self._make_embedder()
+            with self._query_cache_lock:
+                self._query_cache.clear()
+        if settings.get("quantization") != self.settings.get("quantization"):
+            self.quantization_factory = index_factory_for(
+                settings.get("quantization"), Config.PQ_M, Config.PQ_BITS
+            )
+        self.settings = settings
+    
+    def _read_settings(self, version_dir: str) -> Dict[str, Any]:
+        path = os.path.join(version_dir, "settings.json")
+        if not os.path.exists(path):
+            # Saved before settings were recorded: assume the configuration
+            return index_settings()
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    
+    def stale_settings(self) -> Dict[str, Tuple[Any, Any]]:
+        """Settings where the index differs from the configuration: {key: (index, config)}"""
+        configured = index_settings()
+        return {
+            key: (self.settings.get(key), value)
+            for key, value in configured.items()
+            if self.settings.get(key) != value
+        }
+    
+    def file_ids(self) -> set:
+        """IDs of the files with live chunks in the current snapshot"""
+        store, tombstones = self.vector_store, self.tombstones
+        return {
+            doc.metadata.get("file_id")
+            for doc_id, doc in store.docstore._dict.items()
+            if doc_id not in tombstones and doc.metadata.get("source") != "init"
+        }
+    
+    def file_chunks(self, file_id: str) -> Tuple[List[Document], np.ndarray]:
+        """A file's live chunks in document order, with their vectors"""
+        if self.read_only:
+            self.maybe_reload()
+        store, tombstones, full_vectors = self.vector_store, self.tombstones, self.full_vectors
+        rows = {doc_id: row for row, doc_id in store.index_to_docstore_id.items()}
+        chunks = sorted(
+            (
+                (doc_id, doc) for doc_id, doc in store.docstore._dict.items()
+                if doc.metadata.get("file_id") == file_id and doc_id not in tombstones
+            ),
+            key=lambda item: (item[1].metadata.get("chunk_id", 0), item[0])
+        )
+        if not chunks:
+            return [], np.zeros((0, store.index.d), dtype=np.float32)
+        
+        exact = full_vectors.lookup([doc_id for doc_id, _ in chunks]) if full_vectors is not None else {}
+        vectors = np.stack([
+            exact[doc_id] if doc_id in exact else store.index.reconstruct(rows[doc_id])
+            for doc_id, _ in chunks
+        ]).astype(np.float32)
+        return [doc for _, doc in chunks], vectors
+    
+    def embed_query(self, query: str) -> List[float]:
+        """A query embedding from the index's model, cached"""
+        return self._embed_query(query)
     
     def load_or_create_store(self):
         """Load existing vector store or create new one"""
         try:
-            if os.path.exists(f"{self.store_path}.pkl"):
-                self.vector_store = FAISS.load_local(
-                    self.store_path, 
-                    self.embeddings,
-                    allow_dangerous_deserialization=True
-                )
-                logger.info("Loaded existing vector store")
+            version_dir = self._current_version_dir()
+            if version_dir:
+                self._apply_settings(self._read_settings(version_dir))
+                self.vector_store = self._load_version(version_dir)
+                self.tombstones = self._read_tombstones(version_dir)
+                self.full_vectors = self._load_full_vectors(self.vector_store, self.version)
+                self.router = self._load_router(version_dir, self.vector_store, self.tombstones)
+                logger.info(f"Loaded existing vector store from {version_dir}")
             else:
                 # Create empty store
                 dummy_doc = Document(page_content="dummy", metadata={"source": "init"})
@@ -40,20 +212,480 @@ class VectorStoreManager:
             dummy_doc = Document(page_content="dummy", metadata={"source": "init"})
             self.vector_store = FAISS.from_documents([dummy_doc], self.embeddings)
     
+    def _load_version(self, version_dir: str) -> FAISS:
+        """Load a saved version, memory-mapping the index when read-only"""
+        if not self.read_only:
+            return FAISS.load_local(
+                version_dir,
+                self.embeddings,
+                allow_dangerous_deserialization=True
+            )
+        
+        # Every worker maps the same pages, so N workers share one copy
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        index = faiss.read_index(os.path.join(version_dir, "index.faiss"), flags)
+        with open(os.path.join(version_dir, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return FAISS(self.embeddings, index, docstore, index_to_docstore_id)
+    
+    def _full_vectors_dir(self, version: int) -> str:
+        return os.path.join(self.store_path, "fullvec", f"v{version:06d}")
+    
+    def _load_full_vectors(self, store: FAISS, version: int) -> Optional[FullPrecisionVectors]:
+        directory = self._full_vectors_dir(version)
+        if is_exact(store.index) or not os.path.exists(directory):
+            return None
+        return FullPrecisionVectors(directory)
+    
+    def _load_router(self, version_dir: str, store: FAISS, tombstones: frozenset) -> Optional[FileRouter]:
+        if not Config.ROUTING_ENABLED:
+            return None
+        # Versions saved before routing existed get their centroids built once
+        router = FileRouter.load(version_dir) or FileRouter.from_store(store, tombstones)
+        return router.bind(store, tombstones)
+    
+    def _read_tombstones(self, version_dir: str) -> frozenset:
+        path = os.path.join(version_dir, "tombstones.json")
+        if not os.path.exists(path):
+            return frozenset()
+        with open(path, "r", encoding="utf-8") as f:
+            return frozenset(json.load(f))
+    
     def add_documents(self, documents: List[Document]) -> bool:
         """Add documents to vector store"""
         try:
             if not documents:
                 return False
             
-            self.vector_store.add_documents(documents)
-            self.save_store()
+            # Embed outside any lock so concurrent uploads overlap on the API
+            embedder, model, started = self.embedder, self.settings["embedding_model"], time.time()
+            with track_stage("embed_documents"):
+                vectors = embedder.embed(documents)
+            
+            if self.read_only:
+                self._enqueue_ingest(documents, vectors, model=model, created=started)
+                logger.info(f"Queued {len(documents)} documents for the index writer")
+                # The writer drops the checkpoints once it has committed
+                self.embedder.queued(self._file_ids_of(documents))
+                return True
+            
+            success = self.add_embedded_documents(documents, vectors, model=model, created=started)
+            if success:
+                self.embedder.complete(self._file_ids_of(documents))
+            else:
+                self._discard_parents(documents)
+            return success
+        except Exception as e:
+            logger.error(f"Error adding documents: {e}")
+            self._discard_parents(documents)
+            return False
+    
+    def add_embedded_documents(
+        self,
+        documents: List[Document],
+        vectors: List[List[float]],
+        model: Optional[str] = None,
+        created: Optional[float] = None
+    ) -> bool:
+        """Commit documents whose embeddings have already been computed"""
+        try:
+            self._submit([_PendingBatch(documents, vectors, model=model, created=created)])
             logger.info(f"Added {len(documents)} documents to vector store")
             return True
         except Exception as e:
             logger.error(f"Error adding documents: {e}")
             return False
     
+    def delete_file(self, file_id: str) -> int:
+        """Tombstone every chunk of a file; returns the number of chunks masked"""
+        removed = len(self._live_ids_for_files(self.vector_store, self.tombstones, [file_id]))
+        if not removed:
+            return 0
+        
+        if self.read_only:
+            # The writer drops the parents after committing the tombstones;
+            # until readers reload, the children still expand to them
+            self._enqueue_ingest([], [], delete_file_ids=[file_id])
+        else:
+            self._submit([_PendingBatch([], [], delete_file_ids=[file_id])])
+            self.parents.delete_file(file_id)
+        logger.info(f"Deleted {removed} chunks of file {file_id}")
+        return removed
+    
+    def replace_file(self, file_id: str, documents: List[Document]) -> bool:
+        """Swap a file's chunks for new documents in a single index version"""
+        try:
+            if not documents:
+                return False
+            
+            embedder, model, started = self.embedder, self.settings["embedding_model"], time.time()
+            with track_stage("embed_documents"):
+                vectors = embedder.embed(documents)
+            
+            if self.read_only:
+                self._enqueue_ingest(
+                    documents, vectors, delete_file_ids=[file_id], model=model, created=started
+                )
+                self.embedder.queued(self._file_ids_of(documents))
+            else:
+                self._submit([
+                    _PendingBatch(documents, vectors, [file_id], model=model, created=started)
+                ])
+                self.embedder.complete(self._file_ids_of(documents))
+                self.parents.delete_file(file_id, keep_batch=parent_batch_of(documents))
+            logger.info(f"Replaced file {file_id} with {len(documents)} documents")
+            return True
+        except Exception as e:
+            logger.error(f"Error replacing file {file_id}: {e}")
+            self._discard_parents(documents)
+            return False
+    
+    def _discard_parents(self, documents: List[Document]):
+        """Drop the parent sections chunked for documents that never reached the index"""
+        for batch in parent_batches_of(documents):
+            self.parents.delete_batch(batch)
+    
+    @staticmethod
+    def _file_ids_of(documents: List[Document]) -> List[str]:
+        return list(dict.fromkeys(doc.metadata.get("file_id") or "_" for doc in documents))
+    
+    def apply_changes(self, changes: List[dict]) -> bool:
+        """Commit several queued changes as one version (used by the index writer)
+
+        Each change holds "documents", "vectors" and "delete_file_ids", and
+        optionally the "model" and "created" time of its embeddings.
+        """
+        try:
+            self._submit([
+                _PendingBatch(
+                    change.get("documents", []),
+                    change.get("vectors", []),
+                    change.get("delete_file_ids", []),
+                    model=change.get("model"),
+                    created=change.get("created")
+                )
+                for change in changes
+            ])
+            return True
+        except Exception as e:
+            logger.error(f"Error applying index changes: {e}")
+            return False
+    
+    def _submit(self, batches: List[_PendingBatch]):
+        """Queue batches and make sure they are committed before returning"""
+        with self._pending_lock:
+            self._pending.extend(batches)
+        
+        # Single writer: whoever holds the lock commits every batch
+        # queued so far, so upload bursts collapse into one new version.
+        with self._write_lock:
+            if not all(batch.done for batch in batches):
+                with track_stage("index_commit"):
+                    self._commit_pending()
+        
+        for batch in batches:
+            if batch.error:
+                raise batch.error
+        
+        self.maybe_compact()
+    
+    def _enqueue_ingest(
+        self,
+        documents: List[Document],
+        vectors: List[List[float]],
+        delete_file_ids: Iterable[str] = (),
+        model: Optional[str] = None,
+        created: Optional[float] = None
+    ):
+        """Hand an index change to the writer process via the ingest queue"""
+        delete_file_ids = list(delete_file_ids)
+        self.enqueue_job({
+            "op": "replace" if documents and delete_file_ids else "delete" if delete_file_ids else "add",
+            "documents": [
+                {"page_content": doc.page_content, "metadata": doc.metadata}
+                for doc in documents
+            ],
+            "vectors": vectors,
+            "delete_file_ids": delete_file_ids,
+            "model": model,
+            "created": created or time.time()
+        })
+    
+    @staticmethod
+    def enqueue_job(job: Dict[str, Any]):
+        """Drop a job into the writer's ingest queue"""
+        os.makedirs(Config.INGEST_QUEUE_DIR, exist_ok=True)
+        name = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.json"
+        temp_path = os.path.join(Config.INGEST_QUEUE_DIR, f".{name}.tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(temp_path, os.path.join(Config.INGEST_QUEUE_DIR, name))
+    
+    def maybe_reload(self):
+        """Swap in the writer's latest published version, if it changed"""
+        now = time.monotonic()
+        if now - self._last_reload_check < Config.INDEX_POLL_SECONDS:
+            return
+        # One searcher does the reload; the rest keep using the old snapshot
+        if not self._reload_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_reload_check = now
+            pointer = os.path.join(self.store_path, "CURRENT")
+            if not os.path.exists(pointer):
+                return
+            with open(pointer, "r", encoding="utf-8") as f:
+                name = f.read().strip()
+            version = int(name.lstrip("v"))
+            if version != self.version:
+                version_dir = os.path.join(self.store_path, name)
+                self._apply_settings(self._read_settings(version_dir))
+                store = self._load_version(version_dir)
+                tombstones = self._read_tombstones(version_dir)
+                self.full_vectors = self._load_full_vectors(store, version)
+                self.router = self._load_router(version_dir, store, tombstones)
+                self.vector_store = store
+                self.tombstones = tombstones
+                self.version = version
+                self._update_index_gauges()
+                logger.info(f"Reloaded vector store at version {name}")
+        except Exception as e:
+            logger.error(f"Vector store reload error: {e}")
+        finally:
+            self._reload_lock.release()
+    
+    def _commit_pending(self):
+        """Apply all queued batches to a copy of the snapshot and publish it
+
+        All or nothing: if any batch fails, no version is published and
+        every batch gets the error.
+        """
+        with self._pending_lock:
+            batches, self._pending = self._pending, []
+        if not batches:
+            return
+        
+        try:
+            snapshot = self._clone(self.vector_store)
+            tombstones = set(self.tombstones)
+            router = self.router
+            new_ids, new_vectors = [], []
+            for batch in batches:
+                if batch.documents and batch.created < self.adopted_at:
+                    # Embedded before a re-index cutover
+                    if batch.model and batch.model != self.settings["embedding_model"]:
+                        # Old-model vectors mean nothing in the rebuilt index. If
+                        # re-embedding fails the whole commit fails: the writer
+                        # retries its jobs together, so none may be published.
+                        batch.vectors = self.embedder.embed(batch.documents)
+                    # Its file may already be in the rebuilt index; replace, don't duplicate
+                    batch.delete_file_ids = list(dict.fromkeys(
+                        batch.delete_file_ids + self._file_ids_of(batch.documents)
+                    ))
+                if batch.delete_file_ids:
+                    tombstones.update(
+                        self._live_ids_for_files(snapshot, tombstones, batch.delete_file_ids)
+                    )
+                if batch.documents:
+                    new_ids.extend(snapshot.add_embeddings(
+                        zip([doc.page_content for doc in batch.documents], batch.vectors),
+                        metadatas=[doc.metadata for doc in batch.documents]
+                    ))
+                    new_vectors.extend(batch.vectors)
+                if router is not None:
+                    router = router.updated(batch.delete_file_ids, batch.documents, batch.vectors)
+            full_vectors = self._next_full_vectors(snapshot, new_ids, new_vectors)
+            if router is not None:
+                router = router.bind(snapshot, tombstones)
+            self._publish(snapshot, frozenset(tombstones), full_vectors, router)
+        except Exception as e:
+            for batch in batches:
+                batch.error = e
+        finally:
+            for batch in batches:
+                batch.done = True
+    
+    def _clone(self, store: FAISS) -> FAISS:
+        """Copy a snapshot so the writer can mutate it privately"""
+        return FAISS(
+            embedding_function=self.embeddings,
+            index=faiss.clone_index(store.index),
+            docstore=InMemoryDocstore(dict(store.docstore._dict)),
+            index_to_docstore_id=dict(store.index_to_docstore_id)
+        )
+    
+    def _next_full_vectors(
+        self,
+        snapshot: FAISS,
+        new_ids: List[str],
+        new_vectors: List[List[float]]
+    ) -> Optional[FullPrecisionVectors]:
+        """Quantize the snapshot once it is big enough and keep its float32 copy in step"""
+        if not self.quantization_factory:
+            return None
+        
+        index = snapshot.index
+        directory = self._full_vectors_dir(self.version + 1)
+        if is_exact(index):
+            if index.ntotal < Config.QUANTIZE_MIN_VECTORS:
+                return None
+            vectors = index.reconstruct_n(0, index.ntotal)
+            ids = [snapshot.index_to_docstore_id[i] for i in range(index.ntotal)]
+            with track_stage("index_quantize"):
+                snapshot.index = quantize(vectors, self.quantization_factory)
+            logger.info(f"Quantized vector store to {self.quantization_factory} at {index.ntotal} vectors")
+            return FullPrecisionVectors.write(directory, index.d, new_ids=ids, new_vectors=vectors)
+        
+        return FullPrecisionVectors.write(
+            directory,
+            index.d,
+            base=self.full_vectors,
+            keep_ids=set(snapshot.index_to_docstore_id.values()),
+            new_ids=new_ids,
+            new_vectors=np.array(new_vectors, dtype=np.float32)
+        )
+    
+    def _publish(
+        self,
+        snapshot: FAISS,
+        tombstones: frozenset,
+        full_vectors: Optional[FullPrecisionVectors] = None,
+        router: Optional[FileRouter] = None
+    ):
+        """Atomically swap in a new snapshot and persist it (writer lock held)"""
+        self.full_vectors = full_vectors
+        self.router = router
+        self.vector_store = snapshot
+        self.tombstones = tombstones
+        self.version += 1
+        self._update_index_gauges()
+        with track_stage("index_save"):
+            self.save_store()
+    
+    def adopt_index(self, shadow: "VectorStoreManager"):
+        """Swap in a fully built shadow index as the next version (writer lock held)
+
+        Readers pick it up like any other version, and with it the embedding
+        model and index type it was built with.
+        """
+        if self.read_only:
+            raise ValueError("Only the index writer can adopt a rebuilt index")
+        full_vectors = None
+        if shadow.full_vectors is not None:
+            directory = self._full_vectors_dir(self.version + 1)
+            shutil.rmtree(directory, ignore_errors=True)
+            shutil.copytree(shadow.full_vectors.directory, directory)
+            full_vectors = FullPrecisionVectors(directory)
+        self._apply_settings(dict(shadow.settings))
+        self.adopted_at = time.time()
+        self._publish(shadow.vector_store, shadow.tombstones, full_vectors, shadow.router)
+        logger.info(f"Adopted rebuilt index from {shadow.store_path} as version {self.version}")
+    
+    def _update_index_gauges(self):
+        INDEX_VECTORS.set(self.vector_store.index.ntotal)
+        INDEX_TOMBSTONES.set(len(self.tombstones))
+        INDEX_VERSION.set(self.version)
+    
+    def _live_ids_for_files(
+        self,
+        store: FAISS,
+        tombstones: Iterable[str],
+        file_ids: Iterable[str]
+    ) -> List[str]:
+        """Docstore ids of the not-yet-deleted chunks belonging to file_ids"""
+        file_ids = set(file_ids)
+        tombstones = set(tombstones)
+        return [
+            doc_id for doc_id, doc in store.docstore._dict.items()
+            if doc.metadata.get("file_id") in file_ids and doc_id not in tombstones
+        ]
+    
+    def maybe_compact(self):
+        """Start a background compaction once enough chunks are tombstoned"""
+        if self.read_only or self._compacting:
+            return
+        dead = len(self.tombstones)
+        total = self.vector_store.index.ntotal
+        if dead < Config.COMPACTION_MIN_TOMBSTONES or dead < Config.COMPACTION_RATIO * total:
+            return
+        
+        self._compacting = True
+        threading.Thread(target=self.compact, name="index-compaction", daemon=True).start()
+    
+    def compact(self):
+        """Rebuild the index without tombstoned chunks and publish it"""
+        try:
+            with self._write_lock:
+                dead = [
+                    doc_id for doc_id in self.tombstones
+                    if doc_id in self.vector_store.docstore._dict
+                ]
+                if not dead:
+                    return
+                snapshot = self._clone(self.vector_store)
+                snapshot.delete(dead)
+                router = None
+                if self.router is not None:
+                    # Compaction renumbers rows but leaves every live file's centroid alone
+                    router = FileRouter(self.router.sums, self.router.counts).bind(snapshot)
+                self._publish(
+                    snapshot, frozenset(), self._next_full_vectors(snapshot, [], []), router
+                )
+            logger.info(f"Compacted vector store, reclaimed {len(dead)} chunks")
+        except Exception as e:
+            logger.error(f"Compaction error: {e}")
+        finally:
+            self._compacting = False
+    
+    def export_archive(self, path: str) -> int:
+        """Write the live chunks and their vectors to a portable archive"""
+        from backend.core.archive import EmbeddingArchive
+        
+        store, tombstones, full_vectors = self.vector_store, self.tombstones, self.full_vectors
+        archive = EmbeddingArchive.from_store(
+            store, embedding_model_name(), skip_ids=tombstones, full_vectors=full_vectors
+        )
+        archive.save(path)
+        logger.info(f"Exported {len(archive)} chunks to {path}")
+        return len(archive)
+    
+    def import_archive(self, path: str, index_factory: Optional[str] = None) -> int:
+        """Replace the index with one rebuilt from an archive, without re-embedding
+
+        index_factory defaults to the configured quantization, else Flat.
+        """
+        from backend.core.archive import EmbeddingArchive
+        
+        if self.read_only:
+            raise ValueError("Archives can only be imported by the index writer")
+        
+        archive = EmbeddingArchive.load(path)
+        if archive.model != embedding_model_name():
+            raise ValueError(
+                f"Archive was embedded with {archive.model}, index uses {embedding_model_name()}"
+            )
+        
+        index_factory = index_factory or self.quantization_factory or "Flat"
+        with track_stage("index_rebuild"):
+            snapshot = archive.build_store(self.embeddings, index_factory)
+        with self._write_lock:
+            full_vectors = None
+            if not is_exact(snapshot.index):
+                full_vectors = FullPrecisionVectors.write(
+                    self._full_vectors_dir(self.version + 1),
+                    archive.dimension,
+                    new_ids=archive.ids,
+                    new_vectors=archive.vectors
+                )
+            router = None
+            if Config.ROUTING_ENABLED:
+                router = FileRouter({}, {}).updated(
+                    [], [Document(page_content="", metadata=m) for m in archive.metadatas], archive.vectors
+                ).bind(snapshot)
+            self._publish(snapshot, frozenset(), full_vectors, router)
+        logger.info(f"Imported {len(archive)} chunks from {path} into a {index_factory} index")
+        return len(archive)
+    
     def similarity_search(
         self, 
         query: str, 
@@ -61,29 +693,216 @@ class VectorStoreManager:
         filter_dict: Optional[dict] = None
     ) -> List[Tuple[Document, float]]:
         """Search for similar documents"""
+        try:
+            embedding = self._embed_query(query)
+        except Exception as e:
+            logger.error(f"Search error: {e}")
+            return []
+        return self.similarity_search_by_vector(embedding, k, filter_dict)
+    
+    def similarity_search_by_vector(
+        self,
+        embedding: List[float],
+        k: int = None,
+        filter_dict: Optional[dict] = None
+    ) -> List[Tuple[Document, float]]:
+        """Search with an already embedded query, returning (doc, distance) pairs"""
         if k is None:
             k = Config.TOP_K_DOCS  # Use config value
-            
+        
+        if self.read_only:
+            self.maybe_reload()
+        
+        # Pin the current snapshot for the duration of this search
+        full_vectors = self.full_vectors
+        router = self.router
+        store = self.vector_store
+        tombstones = self.tombstones
+        
         try:
-            if filter_dict:
-                # FAISS doesn't support metadata filtering directly
-                # We'll implement post-filtering
-                results = self.vector_store.similarity_search_with_score(query, k=k*2)
-                filtered_results = []
-                
-                for doc, score in results:
-                    if self._matches_filter(doc.metadata, filter_dict):
-                        filtered_results.append((doc, score))
-                        if len(filtered_results) >= k:
-                            break
-                
-                return filtered_results[:k]
-            else:
-                return self.vector_store.similarity_search_with_score(query, k=k)
+            # FAISS doesn't support metadata filtering or deletion masks
+            # directly, so over-fetch and post-filter
+            fetch_k = (k * 2 if filter_dict else k) + len(tombstones)
+            
+            params = self._routing_params(router, store, embedding, filter_dict)
+            with track_stage("vector_search"):
+                hits = self._search_vector(store, embedding, fetch_k, full_vectors, params)
+            results = self._filter_hits(hits, tombstones, filter_dict, k)
+            
+            # The chosen files didn't hold enough live matches; scan everything
+            if params is not None and len(results) < k and not (filter_dict and "file_id" in filter_dict):
+                with track_stage("vector_search"):
+                    hits = self._search_vector(store, embedding, fetch_k, full_vectors)
+                results = self._filter_hits(hits, tombstones, filter_dict, k)
+            
+            return results
         except Exception as e:
             logger.error(f"Search error: {e}")
             return []
     
+    def _filter_hits(
+        self,
+        hits: List[Tuple[str, Document, float]],
+        tombstones: frozenset,
+        filter_dict: Optional[dict],
+        k: int
+    ) -> List[Tuple[Document, float]]:
+        results = []
+        for doc_id, doc, score in hits:
+            if doc_id in tombstones:
+                continue
+            if filter_dict and not self._matches_filter(doc.metadata, filter_dict):
+                continue
+            results.append((doc, score))
+            if len(results) >= k:
+                break
+        return results
+    
+    def _routing_params(
+        self,
+        router: Optional[FileRouter],
+        store: FAISS,
+        embedding: List[float],
+        filter_dict: Optional[dict]
+    ):
+        """Restrict the fine search to the most relevant files, when worthwhile"""
+        # Positions are only valid for the snapshot the router was bound to
+        if router is None or router.store is not store:
+            return None
+        # Indexes that can't take a selector scan everything; a file filter
+        # is then applied to the hits like any other filter
+        if not accepts_selector(store.index):
+            return None
+        
+        allowed = None
+        if filter_dict and "file_id" in filter_dict:
+            allowed = [filter_dict["file_id"]]
+        elif len(router) < Config.ROUTING_MIN_FILES:
+            return None
+        
+        with track_stage("route_files"):
+            files = router.route(embedding, Config.ROUTING_TOP_FILES, allowed)
+            return router.search_params(files)
+    
+    def _embed_query(self, query: str) -> List[float]:
+        """Embed a query, served from a small LRU cache when possible"""
+        with self._query_cache_lock:
+            embedding = self._query_cache.get(query)
+            if embedding is not None:
+                self._query_cache.move_to_end(query)
+        record_cache("query_embedding", embedding is not None)
+        if embedding is not None:
+            return embedding
+        
+        with track_stage("embed_query"):
+            embedding = self.embeddings.embed_query(query)
+        with self._query_cache_lock:
+            self._query_cache[query] = embedding
+            while len(self._query_cache) > Config.QUERY_EMBEDDING_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
+        return embedding
+    
+    def _search_vector(
+        self,
+        store: FAISS,
+        embedding: List[float],
+        k: int,
+        full_vectors: Optional[FullPrecisionVectors] = None,
+        params=None
+    ) -> List[Tuple[str, Document, float]]:
+        """Raw nearest-neighbour search returning (docstore id, doc, distance)
+
+        On a quantized index, k * RERANK_FACTOR candidates are fetched and
+        re-ranked with exact distances from the float32 vectors on disk.
+        params (from the file router) limits the search to selected rows.
+        """
+        rerank = full_vectors is not None and not is_exact(store.index)
+        fetch_k = min(k * Config.RERANK_FACTOR if rerank else k, store.index.ntotal)
+        if fetch_k <= 0:
+            return []
+        
+        vector = np.array([embedding], dtype=np.float32)
+        distances, indices = store.index.search(vector, fetch_k, params=params)
+        
+        hits = []
+        for distance, i in zip(distances[0], indices[0]):
+            if i == -1:
+                continue
+            doc_id = store.index_to_docstore_id[i]
+            hits.append((doc_id, store.docstore.search(doc_id), float(distance)))
+        
+        if rerank:
+            with track_stage("exact_rerank"):
+                hits = exact_rerank(full_vectors, vector[0], hits)
+        return hits[:k]
+    
+    def relevance_search(
+        self,
+        query: str,
+        min_k: int,
+        max_k: int,
+        threshold: Optional[float] = None,
+        filter_dict: Optional[dict] = None
+    ) -> List[Tuple[Document, float]]:
+        """Search with an adaptive cutoff, returning (doc, relevance) pairs
+
+        Always keeps the best min_k hits, then keeps adding hits while they
+        clear the threshold and stay within Config.SCORE_DROPOFF of the best
+        one, up to max_k. Relevance is in [0, 1], higher is better.
+        """
+        if threshold is None:
+            threshold = Config.SIMILARITY_THRESHOLD
+        
+        # Over-fetch by one to make room for the placeholder init document
+        results = self.similarity_search(query, k=max_k + 1, filter_dict=filter_dict)
+        scored = [
+            (doc, self.relevance_score(distance))
+            for doc, distance in results
+            if doc.metadata.get("source") != "init"
+        ]
+        
+        selected = []
+        for doc, relevance in scored[:max_k]:
+            if len(selected) >= min_k:
+                best = selected[0][1]
+                if relevance < threshold or best - relevance > Config.SCORE_DROPOFF:
+                    break
+            selected.append((doc, relevance))
+        
+        return selected
+    
+    def expand_to_parents(
+        self,
+        results: List[Tuple[Document, float]],
+        max_sections: int
+    ) -> List[Tuple[Document, float]]:
+        """Swap child chunks for their parent sections, one entry per parent
+
+        Each parent keeps the relevance of its best child; chunks without a
+        parent (indexed before parent mode) are passed through as they are.
+        """
+        parents = self.parents.get_many(
+            doc.metadata["parent_id"] for doc, _ in results if "parent_id" in doc.metadata
+        )
+        expanded, seen = [], set()
+        for doc, relevance in results:
+            parent_id = doc.metadata.get("parent_id")
+            if parent_id in seen:
+                continue
+            if parent_id:
+                seen.add(parent_id)
+            expanded.append((parents.get(parent_id, doc), relevance))
+            if len(expanded) >= max_sections:
+                break
+        return expanded
+    
+    @staticmethod
+    def relevance_score(distance: float) -> float:
+        """Convert a FAISS distance into a [0, 1] relevance score"""
+        # IndexFlatL2 returns squared L2 distances; for unit-length
+        # embeddings that is 2 - 2*cos, so this recovers cosine similarity.
+        return max(0.0, min(1.0, 1.0 - float(distance) / 2.0))
+    
     def _matches_filter(self, metadata: dict, filter_dict: dict) -> bool:
         """Check if document metadata matches filter criteria"""
         for key, value in filter_dict.items():
@@ -94,8 +913,54 @@ class VectorStoreManager:
     def save_store(self):
         """Save vector store to disk"""
         try:
-            os.makedirs(os.path.dirname(self.store_path), exist_ok=True)
-            self.vector_store.save_local(self.store_path)
-            logger.info("Vector store saved successfully")
+            # Write a complete version directory, then atomically repoint
+            # CURRENT at it so a crash mid-save never leaves a torn index.
+            name = f"v{self.version:06d}"
+            version_dir = os.path.join(self.store_path, name)
+            temp_dir = f"{version_dir}.tmp"
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            self.vector_store.save_local(temp_dir)
+            if self.router is not None:
+                self.router.save(temp_dir)
+            with open(os.path.join(temp_dir, "tombstones.json"), "w", encoding="utf-8") as f:
+                json.dump(sorted(self.tombstones), f)
+            with open(os.path.join(temp_dir, "settings.json"), "w", encoding="utf-8") as f:
+                json.dump(self.settings, f, indent=2)
+            shutil.rmtree(version_dir, ignore_errors=True)
+            os.replace(temp_dir, version_dir)
+            
+            pointer = os.path.join(self.store_path, "CURRENT")
+            with open(f"{pointer}.tmp", "w", encoding="utf-8") as f:
+                f.write(name)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(f"{pointer}.tmp", pointer)
+            
+            self._prune_versions()
+            logger.info(f"Vector store saved successfully ({name})")
         except Exception as e:
-            logger.error(f"Error saving vector store: {e}")
\ No newline at end of file
+            logger.error(f"Error saving vector store: {e}")
+    
+    def _current_version_dir(self) -> Optional[str]:
+        """Resolve the on-disk directory of the latest committed version"""
+        pointer = os.path.join(self.store_path, "CURRENT")
+        if os.path.exists(pointer):
+            with open(pointer, "r", encoding="utf-8") as f:
+                name = f.read().strip()
+            self.version = int(name.lstrip("v"))
+            return os.path.join(self.store_path, name)
+        
+        # Layout written by older releases: save_local straight into store_path
+        if os.path.exists(os.path.join(self.store_path, "index.faiss")):
+            return self.store_path
+        return None
+    
+    def _prune_versions(self):
+        """Remove superseded version directories, keeping a few for readers"""
+        versions = sorted(
+            name for name in os.listdir(self.store_path)
+            if name.startswith("v") and name[1:].isdigit()
+        )
+        for name in versions[:-Config.INDEX_VERSIONS_TO_KEEP]:
+            shutil.rmtree(os.path.join(self.store_path, name), ignore_errors=True)
+            shutil.rmtree(os.path.join(self.store_path, "fullvec", name), ignore_errors=True)
\ No newline at end of file
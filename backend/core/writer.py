@@ -0,0 +1,151 @@
+from langchain.docstore.document import Document
+from typing import Any, Dict, Optional
+import json
+import os
+import time
+import logging
+from backend.config import Config
+from backend.core.parents import parent_batch_of
+from backend.core.vectorstore import VectorStoreManager
+
+logger = logging.getLogger(__name__)
+
+class IndexWriter:
+    """Single writer that applies queued ingestion jobs to the shared index
+
+    API workers run VectorStoreManager in read-only mode and drop embedded
+    documents into Config.INGEST_QUEUE_DIR. This process is the only one that
+    mutates and saves the index (additions, deletions and replacements);
+    workers notice the new CURRENT version and remap it.
+    """
+    
+    def __init__(self, vector_store: VectorStoreManager = None):
+        self.queue_dir = Config.INGEST_QUEUE_DIR
+        self.vector_store = vector_store or VectorStoreManager()
+        self.reindexer = None
+        self.attempts: Dict[str, int] = {}  # failed attempts by job path
+    
+    def run_forever(self):
+        """Poll the ingest queue and commit jobs as they arrive"""
+        os.makedirs(self.queue_dir, exist_ok=True)
+        logger.info(f"Index writer watching {self.queue_dir}")
+        while True:
+            try:
+                if not self.process_pending():
+                    time.sleep(Config.INDEX_POLL_SECONDS)
+            except Exception as e:
+                logger.error(f"Index writer error: {e}")
+                time.sleep(Config.INDEX_POLL_SECONDS)
+    
+    def process_pending(self) -> int:
+        """Commit every queued job in one index version; returns jobs applied"""
+        names = sorted(
+            name for name in os.listdir(self.queue_dir)
+            if name.endswith(".json")
+        )[:Config.INGEST_MAX_JOBS_PER_COMMIT]
+        if not names:
+            return 0
+        
+        changes = []
+        applied = []
+        for name in names:
+            path = os.path.join(self.queue_dir, name)
+            try:
+                change = self._read_job(path)
+            except Exception as e:
+                logger.error(f"Discarding unreadable ingest job {name}: {e}")
+                os.replace(path, f"{path}.failed")
+                continue
+            if change is None:
+                # Control job, already handled
+                os.remove(path)
+                continue
+            changes.append(change)
+            applied.append(path)
+        
+        if changes and not self.vector_store.apply_changes(changes):
+            # Commit the jobs one by one so a bad job cannot hold back the rest
+            results = [False]
+            if len(changes) > 1:
+                results = [self.vector_store.apply_changes([change]) for change in changes]
+                if not any(results):
+                    # More likely an outage than bad jobs; leave them all
+                    # queued for the next poll without counting an attempt
+                    return 0
+            for path, ok in zip(applied, results):
+                if not ok:
+                    self._record_failure(path)
+            changes = [change for change, ok in zip(changes, results) if ok]
+            applied = [path for path, ok in zip(applied, results) if ok]
+        
+        for change in changes:
+            self._finish(change)
+        for path in applied:
+            os.remove(path)
+            self.attempts.pop(path, None)
+        chunks = sum(len(change["documents"]) for change in changes)
+        logger.info(f"Applied {len(applied)} ingest jobs ({chunks} chunks added)")
+        return len(applied)
+    
+    def _record_failure(self, path: str):
+        """Count a failed attempt; after INGEST_MAX_ATTEMPTS move the job aside"""
+        attempts = self.attempts.get(path, 0) + 1
+        if attempts < Config.INGEST_MAX_ATTEMPTS:
+            self.attempts[path] = attempts
+            return
+        
+        self.attempts.pop(path, None)
+        logger.error(f"Giving up on ingest job {os.path.basename(path)} after {attempts} failed attempts")
+        with open(path, "r", encoding="utf-8") as f:
+            job = json.load(f)
+        job["attempts"] = attempts
+        with open(f"{path}.failed", "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.remove(path)
+    
+    def _finish(self, change: Dict[str, Any]):
+        """Cleanup the API worker leaves until a change is committed"""
+        documents = change["documents"]
+        if documents:
+            self.vector_store.embedder.complete(VectorStoreManager._file_ids_of(documents))
+        # Parents of deleted or replaced chunks (a replacement keeps its own)
+        keep_batch = parent_batch_of(documents)
+        for file_id in change["delete_file_ids"]:
+            self.vector_store.parents.delete_file(file_id, keep_batch=keep_batch)
+    
+    def _read_job(self, path: str) -> Optional[Dict[str, Any]]:
+        with open(path, "r", encoding="utf-8") as f:
+            job = json.load(f)
+        if job.get("op") == "reindex":
+            self.start_reindex()
+            return None
+        if job.get("op") not in ("add", "delete", "replace"):
+            raise ValueError(f"Unknown ingest operation {job.get('op')!r}")
+        return {
+            "documents": [
+                Document(page_content=item["page_content"], metadata=item["metadata"])
+                for item in job.get("documents", [])
+            ],
+            "vectors": job.get("vectors", []),
+            "delete_file_ids": job.get("delete_file_ids", []),
+            "model": job.get("model"),
+            "created": job.get("created")
+        }
+    
+    def start_reindex(self):
+        """Rebuild the index in the background; queued jobs keep committing meanwhile"""
+        from backend.core.reindex import Reindexer
+        
+        self.reindexer = self.reindexer or Reindexer(self.vector_store)
+        if self.reindexer.start():
+            logger.info("Re-index started")
+        else:
+            logger.info("Re-index already running; request ignored")
+
+def run_writer():
+    """Process entry point for the dedicated index writer"""
+    logging.basicConfig(level=logging.INFO)
+    IndexWriter().run_forever()
+
+if __name__ == "__main__":
+    run_writer()
\ No newline at end of file
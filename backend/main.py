@@ -1,7 +1,11 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 import uvicorn
+import argparse
 import logging
+import multiprocessing
+import os
 from contextlib import asynccontextmanager
 
 from backend.config import Config
@@ -10,7 +14,10 @@ from backend.core.embeddings import EmbeddingManager
 from backend.core.vectorstore import VectorStoreManager
 from backend.core.agents import TeacherAgent, QuizAgent, RevisionAgent
 from backend.core.langgraph import EdTechWorkflow
-from backend.api import upload, chat
+from backend.core.admission import AdmissionController
+from backend.api import upload, chat, files, admin
+from backend.core.metrics import registry
+from backend.core.profiling import ProfilingMiddleware
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -21,11 +28,12 @@ llm_wrapper = None
 embedding_manager = None
 vector_store = None
 workflow = None
+admission = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize components on startup"""
-    global llm_wrapper, embedding_manager, vector_store, workflow
+    global llm_wrapper, embedding_manager, vector_store, workflow, admission
     
     try:
         # Validate configuration
@@ -34,19 +42,43 @@ async def lifespan(app: FastAPI):
         # Initialize components - NO MORE PARAMETER PASSING!
         llm_wrapper = GeminiLLMWrapper()  # ← Clean!
         embedding_manager = EmbeddingManager()  # ← Clean!
-        vector_store = VectorStoreManager()  # ← Clean!
+        if Config.SHARD_COUNT:
+            from backend.core.sharding import ShardedVectorStore
+            vector_store = ShardedVectorStore()
+        else:
+            vector_store = VectorStoreManager(read_only=Config.SERVE_ROLE == "reader")
         
         # Initialize agents
         teacher_agent = TeacherAgent(llm_wrapper)
         quiz_agent = QuizAgent(llm_wrapper)
         revision_agent = RevisionAgent(llm_wrapper)
         
-        # Initialize workflow
-        workflow = EdTechWorkflow(teacher_agent, quiz_agent, revision_agent, vector_store)
+        # Initialize admission control and workflow
+        admission = AdmissionController(
+            max_concurrent=Config.LLM_MAX_CONCURRENT,
+            max_queue=Config.ADMISSION_MAX_QUEUE,
+            student_rate=Config.STUDENT_RATE_PER_MINUTE / 60,
+            student_burst=Config.STUDENT_BURST
+        )
+        # Summary trees need each file's chunk vectors, which shards keep to themselves
+        summaries = summary_builder = None
+        if Config.SUMMARY_TREE_ENABLED and not Config.SHARD_COUNT:
+            from backend.core.summaries import SummaryStore, SummaryTreeBuilder
+            summaries = SummaryStore(Config.SUMMARY_STORE_PATH)
+            summary_builder = SummaryTreeBuilder(llm_wrapper, vector_store, summaries, admission=admission)
+        workflow = EdTechWorkflow(
+            teacher_agent, quiz_agent, revision_agent, vector_store,
+            admission=admission, summaries=summaries
+        )
         
         # Set dependencies for routers
-        upload.set_dependencies(vector_store, embedding_manager)
+        upload.set_dependencies(vector_store, embedding_manager, summary_builder)
+        files.set_dependencies(vector_store, summary_builder)
+        admin.set_dependencies(vector_store)
         chat.set_workflow(workflow)
+        # SQLAlchemy loads here, not at import, to keep worker startup lean
+        from backend.core.history import ChatHistoryStore
+        chat.set_history(ChatHistoryStore(Config.CHAT_HISTORY_URL))
         
         logger.info("Application initialized successfully")
         
@@ -79,6 +111,12 @@ app.add_middleware(
 # Include routers
 app.include_router(upload.router, prefix="/api", tags=["upload"])
 app.include_router(chat.router, prefix="/api", tags=["chat"])
+app.include_router(files.router, prefix="/api", tags=["files"])
+
+# Opt-in request profiling; without an admin token nothing is installed
+if Config.ADMIN_TOKEN:
+    app.add_middleware(ProfilingMiddleware)
+    app.include_router(admin.router, tags=["admin"])
 
 @app.get("/")
 async def root():
@@ -88,10 +126,63 @@ async def root():
 async def health_check():
     return {"status": "healthy", "version": "1.0.0"}
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe; 503 while starting up or when the LLM queue is full"""
+    if not workflow or not admission:
+        return JSONResponse(status_code=503, content={"status": "starting"})
+    
+    stats = admission.stats()
+    if admission.saturated:
+        return JSONResponse(status_code=503, content={"status": "overloaded", **stats})
+    return {"status": "ready", **stats}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
+
+def serve():
+    """Run the API, either as a single dev process or N read-only workers"""
+    parser = argparse.ArgumentParser(description="RAG EdTech Chatbot API")
+    parser.add_argument("--workers", type=int, default=Config.WORKERS)
+    args = parser.parse_args()
+    
+    # Sharded mode: shard processes own the index, so no separate writer
+    shards = []
+    if Config.SHARD_COUNT and not Config.SHARD_ADDRESSES:
+        from backend.core.sharding import start_local_shards
+        shards = start_local_shards()
+    
+    if args.workers <= 1:
+        uvicorn.run(
+            "backend.main:app",
+            host=Config.HOST,
+            port=Config.PORT,
+            reload=True
+        )
+        return
+    
+    # Production mode: one writer process owns the index, workers map it
+    processes = shards
+    if not Config.SHARD_COUNT:
+        from backend.core.writer import run_writer
+        writer = multiprocessing.Process(target=run_writer, name="index-writer", daemon=True)
+        writer.start()
+        processes = [writer]
+    
+    # Workers re-import backend.main and read the role from the environment
+    os.environ["SERVE_ROLE"] = "reader"
+    try:
+        uvicorn.run(
+            "backend.main:app",
+            host=Config.HOST,
+            port=Config.PORT,
+            workers=args.workers
+        )
+    finally:
+        for process in processes:
+            process.terminate()
+
 if __name__ == "__main__":
-    uvicorn.run(
-        "backend.main:app",
-        host=Config.HOST,
-        port=Config.PORT,
-        reload=True
-    )
\ No newline at end of file
+    serve()
\ No newline at end of file
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
 from datetime import datetime
 
@@ -6,19 +6,62 @@ class UploadResponse(BaseModel):
     success: bool
     message: str
     file_id: Optional[str] = None
+    filename: Optional[str] = None
     chunks_created: Optional[int] = None
 
+class BatchUploadResponse(BaseModel):
+    success: bool
+    message: str
+    results: List[UploadResponse]
+    chunks_created: int = 0
+
+class IngestProgress(BaseModel):
+    file_id: str
+    status: str  # embedding, embedded, failed, queued, indexed
+    total_batches: int = 0
+    done_batches: int = 0
+    cached_batches: int = 0  # restored from checkpoints instead of re-embedded
+    updated: Optional[str] = None
+    error: Optional[str] = None
+
+class DeleteResponse(BaseModel):
+    success: bool
+    message: str
+    file_id: str
+    chunks_removed: int = 0
+
+class ProfileRequest(BaseModel):
+    requests: int = Field(1, ge=1, le=100)
+
 class ChatRequest(BaseModel):
     query: str
     student_id: str
     mode: str = "learn"  # learn, revision, quiz
     file_ids: Optional[List[str]] = None
+    include_timings: bool = False
+    timeout_seconds: Optional[float] = None  # can only shorten the server deadline
 
 class ChatResponse(BaseModel):
     response: str
     sources: List[Dict[str, Any]]
     mode: str
     timestamp: datetime
+    timings: Optional[Dict[str, float]] = None  # per-stage milliseconds
+    degraded: bool = False  # True when the answer fell back to raw context
+    model_tier: Optional[str] = None  # "fast" or "full"
+    message_ids: Optional[List[int]] = None  # stored ids of the question and answer
+
+class ChatMessage(BaseModel):
+    id: int
+    role: str  # user, assistant
+    content: str
+    mode: Optional[str] = None
+    sources: List[Dict[str, Any]] = []
+    timestamp: datetime
+
+class ChatHistoryPage(BaseModel):
+    messages: List[ChatMessage]  # oldest first
+    has_more: bool  # earlier messages exist; pass before=messages[0].id
 
 class AgentResponse(BaseModel):
     content: str
@@ -0,0 +1,100 @@
+"""Recall vs memory report for the quantized index modes
+
+Builds each index type on synthetic clustered vectors shaped like our
+embeddings (768 dimensions), then measures recall@k against exact search,
+with and without exact re-ranking from float32 vectors, alongside the
+in-memory index size per vector.
+
+    python -m benchmarks.bench_quantization --vectors 20000 --queries 200
+    python -m benchmarks.bench_quantization --modes sq8,sq4,pq:192,pq:96
+
+PQ training runs k-means per sub-quantizer and can take minutes on one core.
+"""
+import argparse
+import os
+import tempfile
+import time
+import faiss
+import numpy as np
+from backend.core.quantization import FullPrecisionVectors, exact_rerank, index_factory_for, quantize
+
+def parse_modes(spec: str):
+    """'sq8,pq:96' -> [("sq8", {}), ("pq", {"pq_m": 96})]"""
+    modes = []
+    for item in spec.split(","):
+        mode, _, pq_m = item.partition(":")
+        modes.append((mode, {"pq_m": int(pq_m)} if pq_m else {}))
+    return modes
+
+def make_vectors(count: int, dimension: int, clusters: int = 200, seed: int = 7) -> np.ndarray:
+    """Unit vectors scattered around cluster centres, like topical chunks"""
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dimension))
+    vectors = centres[rng.integers(0, clusters, count)] + 0.6 * rng.normal(size=(count, dimension))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype("float32")
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+def search(index, full, queries: np.ndarray, k: int, rerank_factor: int):
+    started = time.perf_counter()
+    results = []
+    for query in queries:
+        fetch = k * rerank_factor
+        distances, ids = index.search(query[None, :], fetch)
+        hits = [(str(i), None, float(d)) for d, i in zip(distances[0], ids[0]) if i != -1]
+        if rerank_factor > 1:
+            hits = exact_rerank(full, query, hits)
+        results.append([int(doc_id) for doc_id, _, _ in hits[:k]])
+    elapsed = (time.perf_counter() - started) * 1000 / len(queries)
+    return np.array(results), elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--dimension", type=int, default=768)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    parser.add_argument("--modes", default="sq8,sq4,pq:192,pq:96")
+    args = parser.parse_args()
+
+    vectors = make_vectors(args.vectors, args.dimension)
+    rng = np.random.default_rng(11)
+    queries = vectors[rng.integers(0, args.vectors, args.queries)]
+    queries = queries + 0.3 * rng.normal(size=queries.shape).astype("float32") / np.sqrt(args.dimension)
+
+    flat = faiss.IndexFlatL2(args.dimension)
+    flat.add(vectors)
+    _, truth = flat.search(queries, args.k)
+    flat_bytes = len(faiss.serialize_index(flat)) / args.vectors
+
+    with tempfile.TemporaryDirectory() as tmp:
+        full = FullPrecisionVectors.write(
+            os.path.join(tmp, "fullvec"),
+            args.dimension,
+            new_ids=[str(i) for i in range(args.vectors)],
+            new_vectors=vectors
+        )
+
+        print(f"{args.vectors} vectors x {args.dimension} dims, recall@{args.k}, {args.queries} queries")
+        print(f"{'index':<12}{'bytes/vec':>10}{'smaller':>9}{'recall':>9}{'ms/q':>8}"
+              f"{'recall+rr':>11}{'ms/q+rr':>9}")
+        _, flat_ms = search(flat, full, queries, args.k, 1)
+        print(f"{'Flat':<12}{flat_bytes:>10.0f}{1:>8.1f}x{1:>9.3f}{flat_ms:>8.2f}{'-':>11}{'-':>9}")
+
+        for mode, options in parse_modes(args.modes):
+            factory = index_factory_for(mode, **options)
+            index = quantize(vectors, factory)
+            size = len(faiss.serialize_index(index)) / args.vectors
+            plain, plain_ms = search(index, full, queries, args.k, 1)
+            reranked, rerank_ms = search(index, full, queries, args.k, args.rerank_factor)
+            print(f"{factory:<12}{size:>10.0f}{flat_bytes / size:>8.1f}x{recall(plain, truth):>9.3f}"
+                  f"{plain_ms:>8.2f}{recall(reranked, truth):>11.3f}{rerank_ms:>9.2f}")
+
+        print(f"re-ranking reads {args.k * args.rerank_factor} float32 rows per query from a memory-mapped file")
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
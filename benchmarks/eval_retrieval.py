@@ -0,0 +1,269 @@
+"""Retrieval quality vs latency across chunking, k and index settings
+
+Builds a fresh index per configuration through EmbeddingManager and
+VectorStoreManager, with deterministic local embeddings
+(EMBEDDING_BACKEND=fake), then asks every labeled question and reports
+recall@k (share of questions with a relevant chunk in the top k), MRR@k,
+p50/p99 search latency, in-memory index size and build time.
+
+A chunk is relevant when it belongs to the labeled file and contains the
+labeled evidence sentence, so labels survive any chunk size. Without
+--corpus/--questions a seeded synthetic textbook corpus is generated:
+invented entities with facts buried in filler, asked about both with the
+fact's own words and with paraphrases.
+
+    python -m benchmarks.eval_retrieval
+    python -m benchmarks.eval_retrieval --chunk-tokens 128,256,512 --overlap 0,48 --k 3,5,10
+    python -m benchmarks.eval_retrieval --index none,sq8,sq4 --routing off,on --docs 200
+    python -m benchmarks.eval_retrieval --index pq --routing on --chunk-tokens 256 --k 5 --docs 20
+    python -m benchmarks.eval_retrieval --write-sample data/eval   # dump the sample to edit
+
+Corpus files are JSONL: {"file_id", "source", "pages": [...]} per document
+and {"question", "file_id", "evidence"} per question.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import statistics
+import tempfile
+import time
+from typing import Dict, List, Tuple
+import faiss
+from backend.config import Config
+
+# Config.PQ_M is sized for the production embeddings; pq runs take the
+# largest divisor of the fake dimension below it
+PQ_M = Config.PQ_M
+
+SUBJECTS = {
+    "biology": (
+        ["habitat", "diet", "lifespan", "predator"],
+        "cell organism species tissue growth energy membrane population evolution nutrient "
+        "students observe sample field record structure function system process adapt"
+    ),
+    "history": (
+        ["founder", "capital", "founding year", "rival"],
+        "empire treaty reign dynasty trade border council army record archive chronicle "
+        "students compare source period century region ruler reform conflict alliance"
+    ),
+    "physics": (
+        ["unit", "discoverer", "symbol", "measured value"],
+        "force energy motion field charge wave mass velocity pressure experiment model "
+        "students calculate apparatus measure constant law quantity vector circuit heat"
+    ),
+    "geography": (
+        ["highest peak", "longest river", "climate", "main export"],
+        "region plateau coast basin rainfall valley delta settlement terrain latitude map "
+        "students locate border landform resource population trade route season soil"
+    ),
+}
+PARAPHRASES = {
+    "habitat": "Where does the {e} live?",
+    "diet": "What does the {e} eat?",
+    "lifespan": "How long does the {e} live?",
+    "predator": "Which animal hunts the {e}?",
+    "founder": "Who established {e}?",
+    "capital": "Which city governed {e}?",
+    "founding year": "When was {e} established?",
+    "rival": "Who opposed {e}?",
+    "unit": "How is the {e} expressed?",
+    "discoverer": "Who first described the {e}?",
+    "symbol": "How is the {e} written in equations?",
+    "measured value": "How large is the {e}?",
+    "highest peak": "Which mountain tops {e}?",
+    "longest river": "Which river runs furthest through {e}?",
+    "climate": "What is the weather like in {e}?",
+    "main export": "What does {e} mainly sell abroad?",
+}
+SYLLABLES = "var nor quel ix tam bro sel dun ka rith mo zen pal ost ur vey lan cor thi ema".split()
+
+def _name(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 3))).capitalize()
+
+def make_sample(docs: int, pages: int = 8, entities: int = 6, seed: int = 7) -> Tuple[List[Dict], List[Dict]]:
+    """A synthetic textbook corpus and its labeled questions"""
+    rng = random.Random(seed)
+    corpus, questions = [], []
+    names = set()
+    for d in range(docs):
+        subject = list(SUBJECTS)[d % len(SUBJECTS)]
+        attributes, filler = SUBJECTS[subject]
+        filler = filler.split()
+        doc_entities = []
+        while len(doc_entities) < entities:
+            name = _name(rng)
+            if name not in names:
+                names.add(name)
+                doc_entities.append(name)
+
+        facts = []
+        for entity in doc_entities:
+            for attribute in rng.sample(attributes, 3):
+                value = f"{_name(rng)} {rng.choice(['valley', 'grove', 'point', 'seven', 'ridge', 'field'])}"
+                evidence = f"The {attribute} of {entity} is {value}"
+                facts.append(evidence)
+                file_id = f"doc{d:04d}"
+                questions.append({"question": f"What is the {attribute} of {entity}?", "file_id": file_id, "evidence": evidence})
+                questions.append({"question": PARAPHRASES[attribute].format(e=entity), "file_id": file_id, "evidence": evidence})
+
+        page_texts = []
+        for _ in range(pages):
+            sentences = []
+            for _ in range(rng.randint(22, 30)):
+                words = [rng.choice(filler) for _ in range(rng.randint(8, 14))]
+                if rng.random() < 0.3:
+                    words.insert(rng.randrange(len(words)), rng.choice(doc_entities))  # distractor mention
+                sentences.append(" ".join(words).capitalize() + ".")
+            page_texts.append(sentences)
+        for evidence in facts:
+            page = rng.choice(page_texts)
+            page.insert(rng.randrange(len(page) + 1), evidence + ".")
+        corpus.append({
+            "file_id": f"doc{d:04d}",
+            "source": f"{subject}-{d:04d}.pdf",
+            "pages": [" ".join(sentences) for sentences in page_texts]
+        })
+    rng.shuffle(questions)
+    return corpus, questions
+
+def read_jsonl(path: str) -> List[Dict]:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def write_jsonl(path: str, rows: List[Dict]):
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+def evaluate(config: Dict, corpus: List[Dict], questions: List[Dict], ks: List[int]) -> List[Dict]:
+    """Build one index for config and score it at every k"""
+    from backend.core.embeddings import EmbeddingManager
+    from backend.core.vectorstore import VectorStoreManager
+
+    with tempfile.TemporaryDirectory() as tmp:
+        Config.VECTOR_STORE_PATH = os.path.join(tmp, "index")
+        Config.PARENT_STORE_PATH = os.path.join(tmp, "parents.sqlite3")
+        Config.EMBED_CHECKPOINT_DIR = os.path.join(tmp, "checkpoints")
+        Config.PARENT_DOCUMENT_MODE = config["parent"] == "on"
+        Config.CHUNK_TOKENS = Config.CHILD_CHUNK_TOKENS = config["chunk_tokens"]
+        Config.CHUNK_OVERLAP_TOKENS = Config.CHILD_OVERLAP_TOKENS = config["overlap"]
+        Config.INDEX_QUANTIZATION = config["index"]
+        Config.PQ_M = max(m for m in range(1, PQ_M + 1) if Config.FAKE_EMBEDDING_DIMENSION % m == 0)
+        Config.QUANTIZE_MIN_VECTORS = 0
+        Config.ROUTING_ENABLED = config["routing"] == "on"
+        Config.ROUTING_MIN_FILES = 0
+
+        started = time.perf_counter()
+        embedding_manager = EmbeddingManager()
+        vector_store = VectorStoreManager()
+        documents = []
+        for doc in corpus:
+            documents.extend(embedding_manager.create_chunks_from_pages(
+                doc["pages"], {"source": doc["source"], "file_id": doc["file_id"]}
+            ))
+        if not vector_store.add_documents(documents):
+            raise RuntimeError(f"Index build failed for {config}")
+        build_seconds = time.perf_counter() - started
+        index_bytes = len(faiss.serialize_index(vector_store.vector_store.index))
+
+        rows = []
+        for k in ks:
+            latencies, ranks = [], []
+            for item in questions:
+                evidence = _normalize(item["evidence"])
+                searched = time.perf_counter()
+                results = vector_store.similarity_search(item["question"], k=k)
+                latencies.append((time.perf_counter() - searched) * 1000)
+                # Searches swallow index errors, so a broken mode shows up as missing hits
+                if len(results) < min(k, len(documents)):
+                    raise RuntimeError(f"Search returned {len(results)} of {k} hits for {config}")
+                rank = next(
+                    (
+                        position for position, (doc, _) in enumerate(results, 1)
+                        if doc.metadata.get("file_id") == item["file_id"]
+                        and evidence in _normalize(doc.page_content)
+                    ),
+                    None
+                )
+                ranks.append(rank)
+            rows.append({
+                **config,
+                "k": k,
+                "chunks": len(documents),
+                "recall": sum(rank is not None for rank in ranks) / len(ranks),
+                "mrr": statistics.mean(1 / rank if rank else 0.0 for rank in ranks),
+                "p50_ms": percentile(latencies, 50),
+                "p99_ms": percentile(latencies, 99),
+                "index_kb": index_bytes / 1024,
+                "build_s": build_seconds,
+            })
+        return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--corpus", help="JSONL documents (default: generated sample)")
+    parser.add_argument("--questions", help="JSONL labeled questions (default: generated sample)")
+    parser.add_argument("--docs", type=int, default=40, help="Generated sample size")
+    parser.add_argument("--max-questions", type=int, default=300)
+    parser.add_argument("--chunk-tokens", default=f"128,{Config.CHUNK_TOKENS},512")
+    parser.add_argument("--overlap", default=str(Config.CHUNK_OVERLAP_TOKENS))
+    parser.add_argument("--k", default=f"3,{Config.TOP_K_DOCS},10")
+    parser.add_argument("--index", default="none,sq8", help="Quantization modes (none, sq8, sq4, pq)")
+    parser.add_argument("--routing", default="off", help="File-centroid routing: off, on or off,on")
+    parser.add_argument("--parent", default="off", help="Parent-document mode: off, on or off,on")
+    parser.add_argument("--json", help="Also write every result row to this JSONL file")
+    parser.add_argument("--write-sample", help="Write the generated corpus and questions to a directory and exit")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    Config.EMBEDDING_BACKEND = "fake"
+
+    if args.corpus and args.questions:
+        corpus, questions = read_jsonl(args.corpus), read_jsonl(args.questions)
+    else:
+        corpus, questions = make_sample(args.docs)
+    if args.write_sample:
+        os.makedirs(args.write_sample, exist_ok=True)
+        write_jsonl(os.path.join(args.write_sample, "corpus.jsonl"), corpus)
+        write_jsonl(os.path.join(args.write_sample, "questions.jsonl"), questions)
+        print(f"Wrote {len(corpus)} documents and {len(questions)} questions to {args.write_sample}")
+        return
+    questions = questions[:args.max_questions]
+
+    ints = lambda spec: [int(value) for value in spec.split(",")]
+    strings = lambda spec: [value.strip() for value in spec.split(",")]
+    ks = ints(args.k)
+    grid = itertools.product(
+        ints(args.chunk_tokens), ints(args.overlap), strings(args.index),
+        strings(args.routing), strings(args.parent)
+    )
+
+    print(f"{len(corpus)} documents, {len(questions)} questions, fake {Config.FAKE_EMBEDDING_DIMENSION}-dim embeddings")
+    print(f"{'chunk':>6}{'overlap':>8}{'index':>6}{'route':>6}{'parent':>7}{'k':>4}{'chunks':>7}"
+          f"{'recall':>8}{'mrr':>7}{'p50 ms':>8}{'p99 ms':>8}{'index KB':>10}{'build s':>8}")
+    all_rows = []
+    for chunk_tokens, overlap, index, routing, parent in grid:
+        if overlap >= chunk_tokens:
+            continue
+        config = {"chunk_tokens": chunk_tokens, "overlap": overlap, "index": index, "routing": routing, "parent": parent}
+        for row in evaluate(config, corpus, questions, ks):
+            all_rows.append(row)
+            print(f"{chunk_tokens:>6}{overlap:>8}{index:>6}{routing:>6}{parent:>7}{row['k']:>4}{row['chunks']:>7}"
+                  f"{row['recall']:>8.3f}{row['mrr']:>7.3f}{row['p50_ms']:>8.2f}{row['p99_ms']:>8.2f}"
+                  f"{row['index_kb']:>10.0f}{row['build_s']:>8.2f}")
+    if args.json:
+        write_jsonl(args.json, all_rows)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
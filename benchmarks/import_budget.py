@@ -0,0 +1,88 @@
+"""Import-time budget for API workers and CLIs, driven by python -X importtime
+
+Imports each entry-point module in a fresh interpreter a few times, each
+run paired with an import of BASELINE, and fails if the median ratio of the
+two is over the module's budget or the module pulls in a dependency that
+should only load on first use (the Gemini client, PyPDF2, langgraph).
+Absolute import times swing by a third between runs on a busy box; the
+ratio to a dependency we can't avoid swings far less.
+
+    python -m benchmarks.import_budget
+    python -m benchmarks.import_budget --runs 9 --scale 1.2   # noisier CI boxes
+
+Exits non-zero when any budget is broken, so it can gate CI.
+"""
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# Every entry point needs it, and it is most of their import time
+BASELINE = "langchain_core.documents"
+
+# Module -> budget as a multiple of the BASELINE import time: the measured
+# median ratio (main 1.8-1.9, writer 1.2-1.5, bulk_ingest 1.1, archive
+# 1.2-1.3) plus ~35% headroom for run-to-run variation
+BUDGETS: Dict[str, float] = {
+    "backend.main": 2.6,
+    "backend.core.writer": 2.0,
+    "backend.core.bulk_ingest": 1.6,
+    "backend.core.archive": 1.7,
+}
+
+# Loaded on first use only; importing any of these at startup is a regression
+DEFERRED = ["langchain_google_genai", "google.generativeai", "PyPDF2", "langgraph"]
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def measure(module: str) -> Tuple[float, List[Tuple[str, float]], set]:
+    """(total ms, top-level imports by cumulative ms, every module imported)"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, check=True
+    )
+    total, children, imported = 0.0, [], set()
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        imported.add(name)
+        if name == module:
+            total = int(cumulative) / 1000
+        elif len(indent) == 3:
+            children.append((name, int(cumulative) / 1000))
+    return total, sorted(children, key=lambda item: -item[1]), imported
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Paired runs per module (median is gated)")
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiply every budget")
+    parser.add_argument("--top", type=int, default=5, help="Heaviest direct imports to show")
+    args = parser.parse_args()
+
+    failures = 0
+    for module, budget in BUDGETS.items():
+        budget *= args.scale
+        runs, ratios = [], []
+        for _ in range(args.runs):
+            # Back to back, so both see the same cache and load
+            baseline = measure(BASELINE)[0]
+            runs.append(measure(module))
+            ratios.append(runs[-1][0] / baseline)
+        ratio = statistics.median(ratios)
+        total, children, imported = sorted(runs, key=lambda run: run[0])[len(runs) // 2]
+        leaked = [name for name in DEFERRED if any(m == name or m.startswith(name + ".") for m in imported)]
+        ok = ratio <= budget and not leaked
+        failures += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {module:<28}{total:>8.0f} ms {ratio:>6.2f}x {BASELINE}  (budget {budget:.1f}x)")
+        for name, ms in children[:args.top]:
+            print(f"       {name:<40}{ms:>8.0f} ms")
+        if leaked:
+            print(f"       imported eagerly: {', '.join(leaked)}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -3,6 +3,7 @@ import requests
 import json
 from datetime import datetime
 import os
+from chat_history import load_window, load_earlier, jump_to_latest, append_message, set_ids, source_names
 
 # Page configuration
 st.set_page_config(
@@ -16,8 +17,6 @@ st.set_page_config(
 API_BASE_URL = "http://localhost:8000/api"
 
 # Initialize session state
-if "messages" not in st.session_state:
-    st.session_state.messages = []
 if "student_id" not in st.session_state:
     st.session_state.student_id = "student_001"  # Would be from authentication
 if "uploaded_files" not in st.session_state:
@@ -69,19 +68,31 @@ def main():
     # Main chat interface
     st.header(f"💬 Chat - {mode.title()} Mode")
     
+    # History lives on the server; only a bounded recent window is rendered
+    student_id = st.session_state.student_id
+    window = load_window(st.session_state, student_id)
+    if window["has_more"] and st.button("⬆️ Load earlier messages"):
+        load_earlier(window, student_id)
+        st.rerun()
+    
     # Display chat messages
-    for message in st.session_state.messages:
+    for message in window["messages"]:
         with st.chat_message(message["role"]):
             st.write(message["content"])
-            if message["role"] == "assistant" and "sources" in message:
+            if message["role"] == "assistant" and message.get("sources"):
                 with st.expander("📚 Sources"):
-                    for source in message["sources"]:
+                    for source in source_names(message):
                         st.write(f"• {source}")
     
+    if window["newer_hidden"] and st.button("⬇️ Back to latest"):
+        jump_to_latest(window, student_id)
+        st.rerun()
+    
     # Chat input
     if prompt := st.chat_input("Ask me anything about your study materials..."):
         # Add user message
-        st.session_state.messages.append({"role": "user", "content": prompt})
+        user_message = {"role": "user", "content": prompt}
+        append_message(window, user_message, student_id)
         
         # Display user message
         with st.chat_message("user"):
@@ -101,7 +112,8 @@ def main():
                         "content": response["content"],
                         "sources": response.get("sources", [])
                     }
-                    st.session_state.messages.append(assistant_message)
+                    set_ids(user_message, assistant_message, response.get("message_ids"))
+                    append_message(window, assistant_message, student_id)
                     
                     # Show sources
                     if response.get("sources"):
@@ -111,7 +123,7 @@ def main():
                 else:
                     error_msg = "Sorry, I encountered an error. Please try again."
                     st.error(error_msg)
-                    st.session_state.messages.append({"role": "assistant", "content": error_msg})
+                    append_message(window, {"role": "assistant", "content": error_msg}, student_id)
 
 def upload_file(uploaded_file):
     """Upload file to backend"""
@@ -147,7 +159,8 @@ def get_chat_response(query, mode):
             result = response.json()
             return {
                 "content": result["response"],
-                "sources": [source["source"] for source in result.get("sources", [])]
+                "sources": [source["source"] for source in result.get("sources", [])],
+                "message_ids": result.get("message_ids")
             }
         else:
             st.error(f"Chat error: {response.json().get('detail', 'Unknown error')}")
@@ -0,0 +1,77 @@
+import requests
+
+API_BASE_URL = "http://localhost:8000/api"
+PAGE_SIZE = 20
+# Most messages kept (and re-rendered on every rerun), however long the session
+WINDOW = 40
+
+def fetch_page(student_id, before=None):
+    """One page of server-side history, oldest first"""
+    params = {"limit": PAGE_SIZE}
+    if before is not None:
+        params["before"] = before
+    response = requests.get(f"{API_BASE_URL}/chat/history/{student_id}", params=params, timeout=10)
+    response.raise_for_status()
+    return response.json()
+
+def load_window(state, student_id):
+    """The rendered window of recent messages, loaded from the server once per session"""
+    if "chat_window" not in state:
+        try:
+            page = fetch_page(student_id)
+        except Exception:
+            page = {"messages": [], "has_more": False}
+        state.chat_window = {
+            "messages": page["messages"],
+            "has_more": page["has_more"],  # earlier messages on the server
+            "newer_hidden": False  # paged back far enough to drop the newest
+        }
+    return state.chat_window
+
+def load_earlier(window, student_id):
+    """Prepend the previous page, dropping the newest messages past WINDOW"""
+    ids = _ids(window)
+    if not ids:
+        # Nothing in view has a server id yet; start again from the stored history
+        jump_to_latest(window, student_id)
+        ids = _ids(window)
+        if not ids or not window["has_more"]:
+            return
+    page = fetch_page(student_id, before=ids[0])
+    window["messages"] = page["messages"] + window["messages"]
+    window["has_more"] = page["has_more"]
+    if len(window["messages"]) > WINDOW:
+        window["messages"] = window["messages"][:WINDOW]
+        window["newer_hidden"] = True
+
+def _ids(window):
+    return [message["id"] for message in window["messages"] if message.get("id")]
+
+def jump_to_latest(window, student_id):
+    page = fetch_page(student_id)
+    window.update(messages=page["messages"], has_more=page["has_more"], newer_hidden=False)
+
+def append_message(window, message, student_id):
+    """Add a message at the live end, dropping the oldest past WINDOW"""
+    if window["newer_hidden"]:
+        jump_to_latest(window, student_id)
+    window["messages"].append(message)
+    if len(window["messages"]) > WINDOW:
+        del window["messages"][:-WINDOW]
+        window["has_more"] = True
+
+def clear_history(state, student_id):
+    requests.delete(f"{API_BASE_URL}/chat/history/{student_id}", timeout=10)
+    state.chat_window = {"messages": [], "has_more": False, "newer_hidden": False}
+
+def set_ids(user_message, assistant_message, message_ids):
+    """Attach the ids the server stored a turn under, so paging back can start from them"""
+    if message_ids and len(message_ids) == 2:
+        user_message["id"], assistant_message["id"] = message_ids
+
+def source_names(message):
+    """Source labels of a stored or freshly returned message"""
+    return [
+        source["source"] if isinstance(source, dict) else source
+        for source in message.get("sources", [])
+    ]
\ No newline at end of file
@@ -1,6 +1,9 @@
 import streamlit as st
 import requests
 from datetime import datetime
+from chat_history import load_window, load_earlier, jump_to_latest, append_message, clear_history, set_ids, source_names
+
+STUDENT_ID = "student_001"  # Would come from authentication
 
 def chat_page():
     st.title("💬 Chat with Your Materials")
@@ -32,38 +35,46 @@ def chat_page():
     # Chat interface
     chat_container = st.container()
     
-    # Initialize chat history
-    if "chat_history" not in st.session_state:
-        st.session_state.chat_history = []
+    # Chat history is kept server-side; render only a bounded recent window
+    window = load_window(st.session_state, STUDENT_ID)
     
     # Display chat history
     with chat_container:
-        for message in st.session_state.chat_history:
+        if window["has_more"] and st.button("⬆️ Load earlier messages"):
+            load_earlier(window, STUDENT_ID)
+            st.rerun()
+        
+        for message in window["messages"]:
             with st.chat_message(message["role"]):
                 st.write(message["content"])
                 
-                if message["role"] == "assistant" and "metadata" in message:
-                    metadata = message["metadata"]
+                if message["role"] == "assistant" and "sources" in message:
+                    sources = source_names(message)
                     
                     # Show confidence and sources
                     col1, col2 = st.columns(2)
                     with col1:
-                        confidence = metadata.get("confidence", 0) * 100
-                        st.metric("Confidence", f"{confidence:.0f}%")
+                        # Stored history has no confidence; don't show a made-up one
+                        if "confidence" in message:
+                            st.metric("Confidence", f"{message['confidence'] * 100:.0f}%")
                     with col2:
-                        st.metric("Sources", len(metadata.get("sources", [])))
+                        st.metric("Sources", len(sources))
                     
                     # Expandable sources
-                    if metadata.get("sources"):
+                    if sources:
                         with st.expander("📚 View Sources"):
-                            for source in metadata["sources"]:
+                            for source in sources:
                                 st.write(f"• {source}")
+        
+        if window["newer_hidden"] and st.button("⬇️ Back to latest"):
+            jump_to_latest(window, STUDENT_ID)
+            st.rerun()
     
     # Chat input
     if prompt := st.chat_input("Ask me anything about your study materials..."):
         # Add user message
         user_message = {"role": "user", "content": prompt}
-        st.session_state.chat_history.append(user_message)
+        append_message(window, user_message, STUDENT_ID)
         
         # Display user message
         with st.chat_message("user"):
@@ -91,26 +102,25 @@ def chat_page():
                             for source in response["sources"]:
                                 st.write(f"• {source}")
                     
-                    # Add to chat history
+                    # Add to the rendered window (the server already stored the turn)
                     assistant_message = {
                         "role": "assistant",
                         "content": response["content"],
-                        "metadata": {
-                            "confidence": response.get("confidence", 0),
-                            "sources": response.get("sources", []),
-                            "mode": mode,
-                            "timestamp": datetime.now().isoformat()
-                        }
+                        "confidence": response.get("confidence", 0),
+                        "sources": response.get("sources", []),
+                        "mode": mode,
+                        "timestamp": datetime.now().isoformat()
                     }
-                    st.session_state.chat_history.append(assistant_message)
+                    set_ids(user_message, assistant_message, response.get("message_ids"))
+                    append_message(window, assistant_message, STUDENT_ID)
                 else:
                     error_msg = "Sorry, I encountered an error. Please try again."
                     st.error(error_msg)
-                    st.session_state.chat_history.append({"role": "assistant", "content": error_msg})
+                    append_message(window, {"role": "assistant", "content": error_msg}, STUDENT_ID)
     
     # Clear chat button
     if st.button("🗑️ Clear Chat History"):
-        st.session_state.chat_history = []
+        clear_history(st.session_state, STUDENT_ID)
         st.rerun()
 
 def get_chat_response(query: str, mode: str):
@@ -118,7 +128,7 @@ def get_chat_response(query: str, mode: str):
     try:
         data = {
             "query": query,
-            "student_id": "student_001",  # Would come from authentication
+            "student_id": STUDENT_ID,
             "mode": mode,
             "file_ids": []  # Would track uploaded file IDs
         }
@@ -131,7 +141,8 @@ def get_chat_response(query: str, mode: str):
                 "content": result["response"],
                 "sources": [source["source"] for source in result.get("sources", [])],
                 "confidence": 0.85,  # Would come from actual response
-                "mode": mode
+                "mode": mode,
+                "message_ids": result.get("message_ids")
             }
         else:
             st.error(f"API Error: {response.json().get('detail', 'Unknown error')}")
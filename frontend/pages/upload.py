@@ -52,13 +52,24 @@ def upload_single_file(file):
         st.error(f"❌ Error uploading {file.name}: {str(e)}")
 
 def upload_multiple_files(files: List):
-    """Upload multiple files"""
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    for i, file in enumerate(files):
-        status_text.text(f"Uploading {file.name}...")
-        upload_single_file(file)
-        progress_bar.progress((i + 1) / len(files))
-    
-    status_text.text("✅ All uploads completed!")
\ No newline at end of file
+    """Upload multiple files in a single batch request"""
+    try:
+        with st.spinner(f"Uploading {len(files)} files..."):
+            payload = [
+                ("files", (file.name, file.getvalue(), "application/pdf"))
+                for file in files
+            ]
+            response = requests.post("http://localhost:8000/api/upload/batch", files=payload)
+        
+        if response.status_code == 200:
+            result = response.json()
+            for file_result in result["results"]:
+                if file_result["success"]:
+                    st.success(f"✅ {file_result['filename']}: {file_result['chunks_created']} text chunks created")
+                else:
+                    st.error(f"❌ {file_result['filename']}: {file_result['message']}")
+            st.info(result["message"])
+        else:
+            st.error(f"❌ Batch upload failed: {response.json().get('detail', 'Unknown error')}")
+    except Exception as e:
+        st.error(f"❌ Error uploading files: {str(e)}")
\ No newline at end of file